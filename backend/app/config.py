@@ -33,6 +33,26 @@ def _load_frontend_origins() -> List[str]:
     return origins or ["http://localhost:5173"]
 
 DATABASE_URL = _build_database_url()
+# Pool de conexiones de los engines síncronos (principal y réplica).
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# ``pool_pre_ping`` descarta conexiones caídas antes de usarlas a cambio de un
+# ida y vuelta por checkout; se desactiva explícitamente con ``false``.
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").strip().lower() in ("1", "true", "yes")
+# Réplica de lectura opcional (URL completa de SQLAlchemy) para las sesiones
+# de solo lectura; sin ella se lee del servidor principal.
+DB_READ_REPLICA_URL = os.getenv("DB_READ_REPLICA_URL") or None
+# Retraso de replicación tolerado: durante este tiempo tras una escritura,
+# ``get_read_db`` lee del principal y las rutas con ETag sobre esas tablas no
+# lo emiten (ver ``conditional_etag``).
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5"))
+# Driver del engine asíncrono (``database.async_engine``); usa el mismo
+# servidor, usuario y base que ``DATABASE_URL``.
+DB_ASYNC_DRIVER = os.getenv("DB_ASYNC_DRIVER", "postgresql+asyncpg")
+DB_ASYNC_POOL_SIZE = int(os.getenv("DB_ASYNC_POOL_SIZE", "20"))
+DB_ASYNC_MAX_OVERFLOW = int(os.getenv("DB_ASYNC_MAX_OVERFLOW", "10"))
 FRONTEND_ORIGINS = _load_frontend_origins()
 
 ADMIN_USERNAME = os.getenv("ADMIN_USERNAME", "Admin") or os.getenv("ADMIN_EMAIL") or "admin@example.com"
@@ -48,3 +68,23 @@ DEFAULT_USER_FULL_NAME = os.getenv("DEFAULT_USER_FULL_NAME")
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "change-me")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 JWT_ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRE_MINUTES", "5"))
+JWT_REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("JWT_REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+# Vigencia del ticket con el que ``EventSource`` abre ``GET /events``.
+JWT_STREAM_TICKET_EXPIRE_SECONDS = int(os.getenv("JWT_STREAM_TICKET_EXPIRE_SECONDS", "30"))
+# Segundos que un usuario autenticado se sirve desde memoria (0 desactiva).
+AUTH_USER_CACHE_TTL_SECONDS = float(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", "30"))
+
+# Costo de argon2; ajustarlo con ``python -m app.scripts.calibrar_argon2``. Los
+# hashes con otros parámetros se rehacen en el siguiente inicio de sesión.
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "65536"))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "4"))
+# Procesos dedicados al hashing (0 lo hace en el proceso de la API) y máximo
+# de operaciones en curso o en espera antes de responder 503.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+
+DASHBOARD_CACHE_TTL_SECONDS = float(os.getenv("DASHBOARD_CACHE_TTL_SECONDS", "30"))
+DASHBOARD_CACHE_REFRESH_MARGIN_SECONDS = float(
+    os.getenv("DASHBOARD_CACHE_REFRESH_MARGIN_SECONDS", "5")
+)
@@ -1,5 +1,7 @@
 import re
 import unicodedata
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
 
 
 BRANCH_LOCATIONS = [
@@ -17,6 +19,8 @@ BRANCH_LOCATIONS = [
     "Planta",
 ]
 
+APP_TIMEZONE = ZoneInfo("America/Bogota")
+
 
 def _normalize_sede_key(value: str) -> str:
     normalized = unicodedata.normalize("NFKD", value.strip())
@@ -39,3 +43,11 @@ def normalize_sede_name(value: str | None) -> str | None:
     if not normalized:
         return None
     return _BRANCH_LOOKUP.get(_normalize_sede_key(normalized))
+
+
+def local_day_range_to_utc_naive(target_date: date) -> tuple[datetime, datetime]:
+    local_start = datetime.combine(target_date, datetime.min.time(), tzinfo=APP_TIMEZONE)
+    local_end = local_start + timedelta(days=1)
+    utc_start = local_start.astimezone(timezone.utc).replace(tzinfo=None)
+    utc_end = local_end.astimezone(timezone.utc).replace(tzinfo=None)
+    return utc_start, utc_end
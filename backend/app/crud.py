@@ -1,6 +1,10 @@
+from datetime import datetime
 from typing import Iterable, Optional
+from sqlalchemy import case, func, or_
 from sqlalchemy.orm import Session
-from . import models
+from . import events, models
+from .security import user_claims
+from .services.db_notify import REVOCATIONS, usuario_cambiado
 
 def upsert_items(db: Session, rows: Iterable[dict]) -> list[models.Item]:
     out = []
@@ -21,11 +25,15 @@ def upsert_items(db: Session, rows: Iterable[dict]) -> list[models.Item]:
 def get_user(db: Session, user_id: int) -> Optional[models.User]:
     return db.get(models.User, user_id)
 
+# ``username`` y ``email`` se guardan normalizados (ver ``create_user``); las
+# búsquedas comparan ``lower(columna)`` para usar los índices únicos
+# ``ux_users_*_lower`` de ``db_migrations``.
+
 def get_user_by_username(db: Session, username: str) -> Optional[models.User]:
     normalized = username.strip().lower()
     return (
         db.query(models.User)
-        .filter(models.User.username.ilike(normalized))
+        .filter(func.lower(models.User.username) == normalized)
         .one_or_none()
     )
 
@@ -33,15 +41,21 @@ def get_user_by_email(db: Session, email: str) -> Optional[models.User]:
     normalized = email.strip().lower()
     return (
         db.query(models.User)
-        .filter(models.User.email.ilike(normalized))
+        .filter(func.lower(models.User.email) == normalized)
         .one_or_none()
     )
 
 def get_user_by_identifier(db: Session, identifier: str) -> Optional[models.User]:
-    user = get_user_by_username(db, identifier)
-    if user:
-        return user
-    return get_user_by_email(db, identifier)
+    """Usuario cuyo username o, si no hay, cuyo correo coincide; una sola consulta."""
+
+    normalized = identifier.strip().lower()
+    por_username = func.lower(models.User.username) == normalized
+    return (
+        db.query(models.User)
+        .filter(or_(por_username, func.lower(models.User.email) == normalized))
+        .order_by(case((por_username, 0), else_=1))
+        .first()
+    )
 
 def create_user(
     db: Session,
@@ -119,6 +133,7 @@ def update_user(
     is_branch_admin: Optional[bool] = None,
     sede: Optional[str] = None,
 ) -> models.User:
+    antes = _datos_del_token(user)
     if username is not None:
         user.username = username.strip().lower()
     if email is not None:
@@ -142,11 +157,55 @@ def update_user(
         user.is_branch_admin = is_branch_admin
     if sede is not None:
         user.sede = sede
+    if _datos_del_token(user) != antes:
+        events.record(db, usuario_cambiado(user.id))
     
     db.add(user)
     db.flush()
     db.refresh(user)
     return user
 
+def create_refresh_token(
+    db: Session, *, user_id: int, jti: str, expira_en: datetime
+) -> models.RefreshToken:
+    # De paso se borran los vencidos del usuario para que la tabla no crezca.
+    db.query(models.RefreshToken).filter(
+        models.RefreshToken.user_id == user_id,
+        models.RefreshToken.expira_en < datetime.utcnow(),
+    ).delete(synchronize_session=False)
+    token = models.RefreshToken(jti=jti, user_id=user_id, expira_en=expira_en)
+    db.add(token)
+    return token
+
+def revoke_refresh_tokens(
+    db: Session, *, user_id: Optional[int] = None, jti: Optional[str] = None
+) -> int:
+    query = db.query(models.RefreshToken).filter(models.RefreshToken.revocado_en.is_(None))
+    if user_id is not None:
+        query = query.filter(models.RefreshToken.user_id == user_id)
+    if jti is not None:
+        query = query.filter(models.RefreshToken.jti == jti)
+    revocados = query.update(
+        {models.RefreshToken.revocado_en: datetime.utcnow()}, synchronize_session=False
+    )
+    if revocados:
+        events.record(db, REVOCATIONS)
+    return revocados
+
+def revoked_refresh_jtis(db: Session) -> set[str]:
+    """``jti`` revocados que aún no vencen (los vencidos ya no validan)."""
+
+    filas = db.query(models.RefreshToken.jti).filter(
+        models.RefreshToken.revocado_en.isnot(None),
+        models.RefreshToken.expira_en > datetime.utcnow(),
+    )
+    return {jti for (jti,) in filas}
+
+def _datos_del_token(user: models.User) -> tuple:
+    # Lo que viaja en el access token, más el estado: si cambia, los tokens
+    # ya emitidos para el usuario dejan de valer sin consultar la base.
+    return user_claims(user), user.is_active
+
 def delete_user(db: Session, user: models.User) -> None:
+    events.record(db, usuario_cambiado(user.id))
     db.delete(user)
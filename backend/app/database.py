@@ -1,11 +1,114 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
-from .config import DATABASE_URL
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True, future=True)
+from .config import (
+    DATABASE_URL,
+    DB_ASYNC_DRIVER,
+    DB_ASYNC_MAX_OVERFLOW,
+    DB_ASYNC_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_READ_REPLICA_URL,
+)
+from .services.pool_metrics import pool_medido
+
+
+def _pool_kwargs(nombre: str, base=QueuePool, *, size=DB_POOL_SIZE, overflow=DB_MAX_OVERFLOW) -> dict:
+    return {
+        "poolclass": pool_medido(nombre, base),
+        "pool_size": size,
+        "max_overflow": overflow,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+engine = create_engine(DATABASE_URL, future=True, **_pool_kwargs("principal"))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, future=True)
 Base = declarative_base()
 
+# Las lecturas van a la réplica si está configurada; si no, al principal.
+read_engine = (
+    create_engine(DB_READ_REPLICA_URL, future=True, **_pool_kwargs("replica"))
+    if DB_READ_REPLICA_URL
+    else engine
+)
+
+
+class ReadOnlySession(Session):
+    """Sesión cuyas transacciones se abren ``READ ONLY`` en PostgreSQL.
+
+    Una escritura accidental desde una ruta de lectura falla en lugar de
+    ejecutarse (o de fallar solo cuando hay réplica).
+    """
+
+
+@event.listens_for(ReadOnlySession, "after_begin")
+def _transaccion_solo_lectura(session, transaction, connection) -> None:
+    if connection.dialect.name == "postgresql":
+        connection.exec_driver_sql("SET TRANSACTION READ ONLY")
+
+
+ReadSessionLocal = sessionmaker(
+    class_=ReadOnlySession, autoflush=False, bind=read_engine, future=True
+)
+
+
+def _async_url(url: str) -> URL:
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        return parsed.set(drivername="sqlite+aiosqlite")
+    query = dict(parsed.query)
+    # asyncpg no conoce ``sslmode`` de libpq; su equivalente es ``ssl``.
+    if "sslmode" in query:
+        query["ssl"] = query.pop("sslmode")
+    return parsed.set(drivername=DB_ASYNC_DRIVER, query=query)
+
+
+# Engine para las rutas de lectura ``async def``: las consultas esperan en el
+# event loop en lugar de ocupar un hilo del threadpool de AnyIO. Solo lee, así
+# que también apunta a la réplica cuando la hay.
+async_engine = create_async_engine(
+    _async_url(DB_READ_REPLICA_URL or DATABASE_URL),
+    **_pool_kwargs(
+        "async",
+        AsyncAdaptedQueuePool,
+        size=DB_ASYNC_POOL_SIZE,
+        overflow=DB_ASYNC_MAX_OVERFLOW,
+    ),
+)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    sync_session_class=ReadOnlySession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+
+def pool_status() -> dict[str, dict]:
+    """Ocupación actual de cada pool, por el mismo nombre que sus métricas."""
+
+    engines = {"principal": engine, "async": async_engine.sync_engine}
+    if read_engine is not engine:
+        engines["replica"] = read_engine
+    return {
+        nombre: {
+            "size": e.pool.size(),
+            "checked_out": e.pool.checkedout(),
+            "overflow": max(e.pool.overflow(), 0),
+        }
+        for nombre, e in engines.items()
+    }
+
+
 def get_db():
 
     db = SessionLocal()
@@ -17,3 +120,24 @@ def get_db():
         raise
     finally:
         db.close()
+
+
+def get_read_db():
+    """Sesión de solo lectura, en la réplica si hay: no confirma nada al terminar.
+
+    Justo después de una escritura en este proceso se lee del principal, para
+    que quien acaba de guardar algo lo vea en la siguiente petición.
+    """
+
+    from .services import watermarks
+
+    bind = engine if watermarks.replica_atrasada() else read_engine
+    with ReadSessionLocal(bind=bind) as db:
+        yield db
+
+
+async def get_async_db():
+    """Sesión asíncrona de solo lectura: no confirma nada al terminar."""
+
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -4,8 +4,26 @@ These are lightweight guards meant to keep schema adjustments centralized
 until a full migration tool (e.g. Alembic) is wired into the project.
 """
 from __future__ import annotations
+
+import logging
+
 from sqlalchemy import Engine, text
 
+from .security import ROLE_FLAGS
+from .services import busqueda, db_notify, inventario_saldos
+
+logger = logging.getLogger(__name__)
+
+# Índices GIN trigram sobre las expresiones que filtran las búsquedas.
+_TRIGRAM_INDEXES = (
+    ("ix_precios_lista_referencia_trgm", "precios_lista", "referencia", "activo = TRUE"),
+    ("ix_precios_lista_descripcion_trgm", "precios_lista", "descripcion", "activo = TRUE"),
+    ("ix_precios_lista_sede_trgm", "precios_lista", "sede", "activo = TRUE"),
+    ("ix_precios_lista_location_trgm", "precios_lista", "location", "activo = TRUE"),
+    ("ix_inventario_saldos_codigo_trgm", "inventario_saldos", "codigo", None),
+    ("ix_inventario_saldos_descripcion_trgm", "inventario_saldos", "descripcion", None),
+)
+
 
 def apply_startup_migrations(engine: Engine) -> None:
     """Run idempotent DDL statements expected by the application.
@@ -109,3 +127,499 @@ def apply_startup_migrations(engine: Engine) -> None:
                 "ON alertas_subcorte(taller_id)"
             )
         )
+        conn.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_talleres_detalle_taller_id "
+                "ON talleres_detalle(taller_id)"
+            )
+        )
+        conn.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_talleres_creado_en "
+                "ON talleres(creado_en)"
+            )
+        )
+        conn.execute(
+            text(
+                "CREATE TABLE IF NOT EXISTS talleres_actividad_diaria ("
+                "user_id INTEGER NOT NULL REFERENCES users(id), "
+                "sede TEXT NOT NULL, "
+                "especie VARCHAR(10) NOT NULL DEFAULT '', "
+                "local_date DATE NOT NULL, "
+                "cantidad INTEGER NOT NULL DEFAULT 0, "
+                "PRIMARY KEY (user_id, sede, especie, local_date)"
+                ")"
+            )
+        )
+        conn.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_talleres_actividad_diaria_local_date "
+                "ON talleres_actividad_diaria(local_date)"
+            )
+        )
+        _backfill_actividad_diaria(conn)
+        conn.execute(
+            text(
+                "CREATE TABLE IF NOT EXISTS dashboard_series_buckets ("
+                "granularidad VARCHAR(8) NOT NULL, "
+                "bucket_start TIMESTAMP NOT NULL, "
+                "sede TEXT NOT NULL DEFAULT '', "
+                "especie VARCHAR(10) NOT NULL DEFAULT '', "
+                "talleres INTEGER NOT NULL DEFAULT 0, "
+                "peso_inicial NUMERIC(18,4) NOT NULL DEFAULT 0, "
+                "perdida NUMERIC(18,4) NOT NULL DEFAULT 0, "
+                "PRIMARY KEY (granularidad, bucket_start, sede, especie)"
+                ")"
+            )
+        )
+        _backfill_dashboard_series(conn)
+        conn.execute(
+            text(
+                "CREATE TABLE IF NOT EXISTS inventario_saldos ("
+                "sede TEXT NOT NULL DEFAULT '', "
+                "especie VARCHAR(10) NOT NULL DEFAULT '', "
+                "codigo TEXT NOT NULL, "
+                "descripcion TEXT NOT NULL DEFAULT '', "
+                "total_peso NUMERIC(18,4) NOT NULL DEFAULT 0, "
+                "detalles INTEGER NOT NULL DEFAULT 0, "
+                "PRIMARY KEY (sede, especie, codigo)"
+                ")"
+            )
+        )
+        conn.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_inventario_saldos_sede_especie "
+                "ON inventario_saldos(LOWER(sede), especie)"
+            )
+        )
+        conn.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_inventario_saldos_orden "
+                "ON inventario_saldos(total_peso DESC, sede DESC, especie DESC, codigo DESC) "
+                "WHERE detalles > 0"
+            )
+        )
+        inventario_saldos.poblar_si_vacio(conn)
+        conn.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_precios_lista_activo_descripcion "
+                "ON precios_lista(descripcion, id) WHERE activo = TRUE"
+            )
+        )
+        conn.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_precios_lista_codigo_vigencia "
+                "ON precios_lista("
+                "ltrim(lower(regexp_replace(trim(referencia), '\\s+', '', 'g')), '0'), "
+                "lower(sede), fecha_vigencia)"
+            )
+        )
+        _enlazar_precios_items(conn)
+        _normalizar_usuarios(conn)
+        conn.execute(
+            text(
+                "CREATE OR REPLACE FUNCTION notify_table_change() RETURNS trigger AS $$ "
+                "BEGIN "
+                f"PERFORM pg_notify('{db_notify.CHANNEL}', TG_TABLE_NAME); "
+                "RETURN NULL; "
+                "END; $$ LANGUAGE plpgsql"
+            )
+        )
+        for tabla in db_notify.NOTIFY_TABLES:
+            existe = conn.execute(
+                text("SELECT 1 FROM pg_trigger WHERE tgname = :nombre"),
+                {"nombre": f"{tabla}_notify_change"},
+            ).first()
+            if existe is None:
+                conn.execute(
+                    text(
+                        f"CREATE TRIGGER {tabla}_notify_change "
+                        f"AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {tabla} "
+                        "FOR EACH STATEMENT EXECUTE PROCEDURE notify_table_change()"
+                    )
+                )
+        _notificar_revocaciones(conn)
+        _notificar_precios_activados(conn)
+        _notificar_usuarios(conn)
+        if busqueda.habilitar_trigram(conn):
+            crear_indices_trigram(conn)
+
+
+def _notificar_revocaciones(conn) -> None:
+    """Avisar a los demás procesos solo cuando se revocan refresh tokens.
+
+    Un trigger genérico sobre ``refresh_tokens`` también avisaría con cada
+    inicio de sesión y obligaría a recargar la lista de revocados.
+    """
+    conn.execute(text("DROP TRIGGER IF EXISTS refresh_tokens_notify_change ON refresh_tokens"))
+    conn.execute(
+        text(
+            "CREATE OR REPLACE FUNCTION notify_refresh_tokens_revocados() RETURNS trigger AS $$ "
+            "BEGIN "
+            f"PERFORM pg_notify('{db_notify.CHANNEL}', '{db_notify.REVOCATIONS}'); "
+            "RETURN NULL; "
+            "END; $$ LANGUAGE plpgsql"
+        )
+    )
+    existe = conn.execute(
+        text("SELECT 1 FROM pg_trigger WHERE tgname = 'refresh_tokens_notify_revocados'")
+    ).first()
+    if existe is None:
+        conn.execute(
+            text(
+                "CREATE TRIGGER refresh_tokens_notify_revocados "
+                "AFTER UPDATE OF revocado_en ON refresh_tokens "
+                "FOR EACH STATEMENT EXECUTE PROCEDURE notify_refresh_tokens_revocados()"
+            )
+        )
+
+
+def _notificar_precios_activados(conn) -> None:
+    """Avisar por ``NOTIFY`` las sedes con precios activados en cada sentencia.
+
+    Cuenta las filas insertadas activas y las actualizadas que pasan a activas
+    o cambian de precio estando activas; el relink de ``item_id`` no avisa.
+    Las tablas de transición exigen un trigger por evento.
+    """
+    conn.execute(
+        text(
+            "CREATE OR REPLACE FUNCTION notify_precios_activados() RETURNS trigger AS $$ "
+            "DECLARE sedes json; "
+            "BEGIN "
+            "IF TG_OP = 'INSERT' THEN "
+            "SELECT json_agg(DISTINCT n.sede) INTO sedes FROM nuevas n WHERE n.activo; "
+            "ELSE "
+            "SELECT json_agg(DISTINCT n.sede) INTO sedes "
+            "FROM nuevas n JOIN viejas v ON v.id = n.id "
+            "WHERE n.activo AND (v.activo IS NOT TRUE OR v.precio IS DISTINCT FROM n.precio); "
+            "END IF; "
+            "IF sedes IS NOT NULL THEN "
+            f"PERFORM pg_notify('{db_notify.PRECIOS_CHANNEL}', sedes::text); "
+            "END IF; "
+            "RETURN NULL; "
+            "END; $$ LANGUAGE plpgsql"
+        )
+    )
+    triggers = (
+        (
+            "precios_lista_notify_activados_ins",
+            "AFTER INSERT ON precios_lista REFERENCING NEW TABLE AS nuevas "
+            "FOR EACH STATEMENT EXECUTE PROCEDURE notify_precios_activados()",
+        ),
+        (
+            "precios_lista_notify_activados_upd",
+            "AFTER UPDATE ON precios_lista REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas "
+            "FOR EACH STATEMENT EXECUTE PROCEDURE notify_precios_activados()",
+        ),
+    )
+    for nombre, definicion in triggers:
+        existe = conn.execute(
+            text("SELECT 1 FROM pg_trigger WHERE tgname = :nombre"), {"nombre": nombre}
+        ).first()
+        if existe is None:
+            conn.execute(text(f"CREATE TRIGGER {nombre} {definicion}"))
+
+
+def _notificar_usuarios(conn) -> None:
+    """Avisar por ``NOTIFY`` los usuarios cuyos access tokens quedan viejos.
+
+    Solo cuentan las columnas que viajan en el token (nombre, sede, roles y
+    estado) y los usuarios borrados: rehashear la contraseña al iniciar sesión
+    no invalida los tokens de nadie. Si los ids no caben en un ``NOTIFY``
+    (8000 bytes) se manda ``null`` y se invalidan todos.
+    """
+    columnas = ("username", "sede", "is_active", *ROLE_FLAGS)
+    nuevas = ", ".join(f"n.{columna}" for columna in columnas)
+    viejas = ", ".join(f"v.{columna}" for columna in columnas)
+    conn.execute(
+        text(
+            "CREATE OR REPLACE FUNCTION notify_usuarios_cambiados() RETURNS trigger AS $$ "
+            "DECLARE ids json; "
+            "BEGIN "
+            "IF TG_OP = 'DELETE' THEN "
+            "SELECT json_agg(v.id) INTO ids FROM viejas v; "
+            "ELSE "
+            "SELECT json_agg(n.id) INTO ids FROM nuevas n JOIN viejas v ON v.id = n.id "
+            f"WHERE ({nuevas}) IS DISTINCT FROM ({viejas}); "
+            "END IF; "
+            "IF ids IS NOT NULL THEN "
+            "IF length(ids::text) > 7900 THEN ids := 'null'; END IF; "
+            f"PERFORM pg_notify('{db_notify.USUARIOS_CHANNEL}', ids::text); "
+            "END IF; "
+            "RETURN NULL; "
+            "END; $$ LANGUAGE plpgsql"
+        )
+    )
+    triggers = (
+        (
+            "users_notify_cambiados_upd",
+            "AFTER UPDATE ON users REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas "
+            "FOR EACH STATEMENT EXECUTE PROCEDURE notify_usuarios_cambiados()",
+        ),
+        (
+            "users_notify_cambiados_del",
+            "AFTER DELETE ON users REFERENCING OLD TABLE AS viejas "
+            "FOR EACH STATEMENT EXECUTE PROCEDURE notify_usuarios_cambiados()",
+        ),
+    )
+    for nombre, definicion in triggers:
+        existe = conn.execute(
+            text("SELECT 1 FROM pg_trigger WHERE tgname = :nombre"), {"nombre": nombre}
+        ).first()
+        if existe is None:
+            conn.execute(text(f"CREATE TRIGGER {nombre} {definicion}"))
+
+
+def crear_indices_trigram(conn) -> None:
+    """Crear los índices GIN trigram; requiere la extensión ``pg_trgm``."""
+    for nombre, tabla, columna, condicion in _TRIGRAM_INDEXES:
+        conn.execute(
+            text(
+                f"CREATE INDEX IF NOT EXISTS {nombre} ON {tabla} "
+                f"USING gin (LOWER({columna}) gin_trgm_ops)"
+                + (f" WHERE {condicion}" if condicion else "")
+            )
+        )
+
+
+def _enlazar_precios_items(conn) -> None:
+    """Guardar en ``precios_lista`` el ítem y la especie del mismo código.
+
+    La lista de precios se carga por fuera de la API, así que el enlace lo
+    hacen triggers: uno al insertar o cambiar la referencia de un precio y
+    otro que re-enlaza los precios afectados cuando cambia un ítem. La especie
+    se copia tal cual está en ``items``; los filtros comparan ``LOWER(especie)``.
+    """
+
+    nuevas = conn.execute(
+        text(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = 'precios_lista' AND column_name = 'item_id'"
+        )
+    ).first() is None
+    conn.execute(
+        text(
+            "ALTER TABLE IF EXISTS precios_lista "
+            "ADD COLUMN IF NOT EXISTS item_id INTEGER "
+            "REFERENCES items(id) ON DELETE SET NULL"
+        )
+    )
+    conn.execute(
+        text("ALTER TABLE IF EXISTS precios_lista ADD COLUMN IF NOT EXISTS especie VARCHAR(10)")
+    )
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_items_codigo_producto_lower "
+            "ON items(LOWER(codigo_producto))"
+        )
+    )
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_precios_lista_referencia_lower "
+            "ON precios_lista(LOWER(referencia))"
+        )
+    )
+    # La primera versión guardaba la especie en minúsculas con este índice:
+    # si todavía existe, se vuelve a copiar la especie con su formato original.
+    minusculas = conn.execute(
+        text("SELECT to_regclass('ix_precios_lista_activo_especie')")
+    ).scalar() is not None
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_precios_lista_activo_especie_lower "
+            "ON precios_lista(LOWER(especie), descripcion, id) WHERE activo = TRUE"
+        )
+    )
+    conn.execute(
+        text(
+            "CREATE OR REPLACE FUNCTION enlazar_precio_item() RETURNS trigger AS $$ "
+            "BEGIN "
+            "SELECT i.id, i.especie INTO NEW.item_id, NEW.especie "
+            "FROM items i WHERE LOWER(i.codigo_producto) = LOWER(NEW.referencia) "
+            "ORDER BY i.id LIMIT 1; "
+            "RETURN NEW; "
+            "END; $$ LANGUAGE plpgsql"
+        )
+    )
+    conn.execute(
+        text(
+            "CREATE OR REPLACE FUNCTION reenlazar_precios_item() RETURNS trigger AS $$ "
+            "DECLARE codigos TEXT[] := ARRAY[]::TEXT[]; "
+            "BEGIN "
+            "IF TG_OP <> 'INSERT' THEN codigos := codigos || LOWER(OLD.codigo_producto); END IF; "
+            "IF TG_OP <> 'DELETE' THEN codigos := codigos || LOWER(NEW.codigo_producto); END IF; "
+            "UPDATE precios_lista p SET item_id = i.id, especie = i.especie "
+            "FROM UNNEST(codigos) AS c(codigo) "
+            "LEFT JOIN LATERAL ("
+            "SELECT id, especie FROM items "
+            "WHERE LOWER(codigo_producto) = c.codigo ORDER BY id LIMIT 1"
+            ") i ON TRUE "
+            "WHERE LOWER(p.referencia) = c.codigo "
+            "AND (p.item_id IS DISTINCT FROM i.id "
+            "OR p.especie IS DISTINCT FROM i.especie); "
+            "RETURN NULL; "
+            "END; $$ LANGUAGE plpgsql"
+        )
+    )
+    triggers = (
+        (
+            "precios_lista_enlazar_item",
+            "BEFORE INSERT OR UPDATE OF referencia ON precios_lista "
+            "FOR EACH ROW EXECUTE PROCEDURE enlazar_precio_item()",
+        ),
+        (
+            "items_reenlazar_precios",
+            "AFTER INSERT OR UPDATE OF codigo_producto, especie OR DELETE ON items "
+            "FOR EACH ROW EXECUTE PROCEDURE reenlazar_precios_item()",
+        ),
+    )
+    for nombre, definicion in triggers:
+        existe = conn.execute(
+            text("SELECT 1 FROM pg_trigger WHERE tgname = :nombre"),
+            {"nombre": nombre},
+        ).first()
+        if existe is None:
+            conn.execute(text(f"CREATE TRIGGER {nombre} {definicion}"))
+
+    if nuevas:
+        conn.execute(
+            text(
+                "UPDATE precios_lista p SET item_id = i.id, especie = i.especie "
+                "FROM ("
+                "SELECT DISTINCT ON (LOWER(codigo_producto)) "
+                "id, especie, LOWER(codigo_producto) AS codigo "
+                "FROM items ORDER BY LOWER(codigo_producto), id"
+                ") i "
+                "WHERE LOWER(p.referencia) = i.codigo"
+            )
+        )
+    elif minusculas:
+        conn.execute(
+            text(
+                "UPDATE precios_lista p SET especie = i.especie "
+                "FROM items i "
+                "WHERE i.id = p.item_id AND p.especie IS DISTINCT FROM i.especie"
+            )
+        )
+    if minusculas:
+        conn.execute(text("DROP INDEX IF EXISTS ix_precios_lista_activo_especie"))
+
+
+def _normalizar_usuarios(conn) -> None:
+    """Guardar ``username`` y ``email`` en minúsculas e indexar ``lower()``.
+
+    ``crud`` ya normaliza al escribir; esto corrige filas anteriores. Una fila
+    que chocaría con otra al normalizarse se deja como está, y mientras haya
+    duplicados la columna usa un índice sin ``UNIQUE`` (``ix_users_*_lower``).
+    """
+
+    # El correo vacío pasa a NULL; el username es NOT NULL.
+    for columna, normalizado in (
+        ("username", "lower(trim(u.username))"),
+        ("email", "NULLIF(lower(trim(u.email)), '')"),
+    ):
+        conn.execute(
+            text(
+                f"UPDATE users u SET {columna} = {normalizado} "
+                f"WHERE u.{columna} IS DISTINCT FROM {normalizado} "
+                "AND NOT EXISTS ("
+                "SELECT 1 FROM users o WHERE o.id <> u.id "
+                f"AND lower(trim(o.{columna})) = lower(trim(u.{columna})))"
+            )
+        )
+        duplicados = conn.execute(
+            text(
+                f"SELECT lower({columna}) FROM users WHERE {columna} IS NOT NULL "
+                f"GROUP BY lower({columna}) HAVING count(*) > 1"
+            )
+        ).scalars().all()
+        if duplicados:
+            logger.warning(
+                "users.%s tiene valores repetidos sin distinguir mayúsculas (%s); "
+                "se indexa sin UNIQUE hasta corregirlos",
+                columna,
+                ", ".join(duplicados),
+            )
+            conn.execute(
+                text(
+                    f"CREATE INDEX IF NOT EXISTS ix_users_{columna}_lower "
+                    f"ON users(lower({columna}))"
+                )
+            )
+            continue
+        conn.execute(
+            text(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS ux_users_{columna}_lower "
+                f"ON users(lower({columna}))"
+            )
+        )
+        conn.execute(text(f"DROP INDEX IF EXISTS ix_users_{columna}_lower"))
+
+
+def _backfill_actividad_diaria(conn) -> None:
+    """Poblar el rollup de actividad una sola vez, cuando aún está vacío.
+
+    A partir de ahí las rutas de talleres lo mantienen en la misma
+    transacción de cada escritura.
+    """
+    conn.execute(
+        text(
+            "INSERT INTO talleres_actividad_diaria "
+            "(user_id, sede, especie, local_date, cantidad) "
+            "SELECT t.creado_por_id, "
+            "COALESCE(TRIM(t.sede), ''), "
+            "COALESCE(LOWER(TRIM(t.especie)), ''), "
+            "DATE(t.creado_en - INTERVAL '5 hours'), "
+            "COUNT(*) "
+            "FROM talleres t "
+            "JOIN users u ON u.id = t.creado_por_id "
+            "WHERE NOT EXISTS (SELECT 1 FROM talleres_actividad_diaria) "
+            "GROUP BY 1, 2, 3, 4 "
+            "ON CONFLICT DO NOTHING"
+        )
+    )
+
+
+def _backfill_dashboard_series(conn) -> None:
+    """Poblar las series del dashboard una sola vez, cuando aún están vacías."""
+    for granularidad in ("hour", "day"):
+        conn.execute(
+            text(
+                "INSERT INTO dashboard_series_buckets "
+                "(granularidad, bucket_start, sede, especie, talleres, peso_inicial, perdida) "
+                "SELECT :granularidad, "
+                "DATE_TRUNC(:granularidad, t.creado_en - INTERVAL '5 hours'), "
+                "COALESCE(TRIM(t.sede), ''), "
+                "COALESCE(LOWER(TRIM(t.especie)), ''), "
+                "COUNT(*), "
+                "SUM(COALESCE(t.peso_inicial, 0)), "
+                "SUM(COALESCE(t.peso_inicial, 0) - COALESCE(t.peso_final, 0) "
+                "- COALESCE(d.total_detalles, 0)) "
+                "FROM talleres t "
+                "LEFT JOIN ("
+                "SELECT taller_id, SUM(COALESCE(peso, 0)) AS total_detalles "
+                "FROM talleres_detalle GROUP BY taller_id"
+                ") d ON d.taller_id = t.id "
+                "WHERE t.creado_en IS NOT NULL "
+                "AND NOT EXISTS ("
+                "SELECT 1 FROM dashboard_series_buckets WHERE granularidad = :granularidad"
+                ") "
+                "GROUP BY 2, 3, 4 "
+                "ON CONFLICT DO NOTHING"
+            ),
+            {"granularidad": granularidad},
+        )
+
+
+def reconstruir_agregados(conn) -> None:
+    """Vaciar y volver a poblar los agregados de talleres desde ``talleres``.
+
+    Para correcciones de datos hechas fuera de las rutas (por ejemplo
+    ``app.scripts.sede_talleres``), que no pasan por ``services.rollups``.
+    """
+    for tabla in ("talleres_actividad_diaria", "dashboard_series_buckets", "inventario_saldos"):
+        conn.execute(text(f"LOCK TABLE {tabla} IN EXCLUSIVE MODE"))
+        conn.execute(text(f"DELETE FROM {tabla}"))
+    _backfill_actividad_diaria(conn)
+    _backfill_dashboard_series(conn)
+    inventario_saldos.poblar_si_vacio(conn)
@@ -1,41 +1,207 @@
-from fastapi import Depends, HTTPException, status
+import hashlib
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional, Union
+
+from fastapi import Depends, HTTPException, Query, Request, Response, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from . import crud, models, schemas
-from .config import API_PREFIX, JWT_ALGORITHM, JWT_SECRET_KEY
-from .database import get_db
+from . import crud, events, models, schemas
+from .config import (
+    API_PREFIX,
+    AUTH_USER_CACHE_TTL_SECONDS,
+    JWT_ACCESS_TOKEN_EXPIRE_MINUTES,
+    JWT_ALGORITHM,
+    JWT_SECRET_KEY,
+)
+from .database import SessionLocal, get_async_db, get_db
+from .security import ROLE_FLAGS
+from .services import db_notify, watermarks
+from .services.auth_cache import RevocationList, TokenClaimsCache, UserCache
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{API_PREFIX}/auth/token")
+optional_oauth2_scheme = OAuth2PasswordBearer(
+    tokenUrl=f"{API_PREFIX}/auth/token", auto_error=False
+)
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db),
-) -> models.User:
-    
-    credential_exception = HTTPException(
+token_claims = TokenClaimsCache()
+user_cache = UserCache(AUTH_USER_CACHE_TTL_SECONDS)
+
+
+def _cargar_revocados() -> set[str]:
+    with SessionLocal() as db:
+        return crud.revoked_refresh_jtis(db)
+
+
+revocaciones = RevocationList(
+    _cargar_revocados, vida_tokens=JWT_ACCESS_TOKEN_EXPIRE_MINUTES * 60
+)
+
+
+@events.subscribe
+def _invalidate_user_cache(tables: frozenset[str]) -> None:
+    # Cualquier escritura confirmada en ``users`` (incluidas las que no pasan
+    # por /users) vacía la caché; ``UserCache.invalidate`` en las rutas la
+    # adelanta para la propia petición. Los claims solo se invalidan para los
+    # usuarios cuyos datos del token cambiaron (ver ``db_notify.USUARIOS``).
+    if "users" in tables:
+        user_cache.invalidate()
+    cambiados = db_notify.usuarios_cambiados(tables)
+    if cambiados is None or cambiados:
+        revocaciones.marcar_usuarios(cambiados)
+    if db_notify.REVOCATIONS in tables:
+        revocaciones.invalidate()
+
+
+def _credential_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="No se pudo validar las credenciales",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
-    try:
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
-        token_data = schemas.TokenPayload.model_validate(payload)
-    except (JWTError, ValueError):
-        raise credential_exception from None
-    
-    user = crud.get_user(db, token_data.sub)
+
+
+def _decode(token: str) -> schemas.TokenPayload:
+    claims = token_claims.get(token)
+    if claims is None:
+        try:
+            payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+            claims = schemas.TokenPayload.model_validate(payload)
+        except (JWTError, ValueError):
+            raise _credential_exception() from None
+        token_claims.put(token, claims, claims.exp)
+    return claims
+
+
+@dataclass(frozen=True)
+class TokenUser:
+    """Usuario autenticado con los claims del access token, sin fila de ``users``.
+
+    Trae lo que usan los permisos y las rutas (id, nombre, sede y roles); no
+    es una entidad ORM, así que leerlo nunca consulta la base. Quien necesite
+    el resto de las columnas carga la fila con :func:`get_current_db_user`.
+    """
+
+    id: int
+    username: Optional[str]
+    sede: Optional[str]
+    is_admin: bool = False
+    is_gerente: bool = False
+    is_coordinator: bool = False
+    is_branch_admin: bool = False
+    # Solo se emiten tokens a usuarios activos y desactivar a uno invalida
+    # sus claims (ver ``RevocationList.claims_vigentes``).
+    is_active: bool = True
+
+
+CurrentUser = Union[models.User, TokenUser]
+
+
+def _user_from_claims(claims: schemas.TokenPayload) -> TokenUser:
+    roles = set(claims.roles or ())
+    return TokenUser(
+        id=claims.sub,
+        username=claims.username,
+        sede=claims.sede,
+        **{flag: flag[3:] in roles for flag in ROLE_FLAGS},
+    )
+
+
+def access_claims(token: Optional[str]) -> schemas.TokenPayload:
+    if not token:
+        raise _credential_exception()
+    claims = _decode(token)
+    if claims.typ is not None:
+        raise _credential_exception()
+    if claims.sid and revocaciones.is_revoked(claims.sid):
+        raise _credential_exception()
+    return claims
+
+
+def _user_from_token(db: Session, token: Optional[str]) -> CurrentUser:
+    return _user_from_access_claims(db, access_claims(token))
+
+
+def _user_from_access_claims(db: Session, claims: schemas.TokenPayload) -> CurrentUser:
+    if claims.roles is not None and revocaciones.claims_vigentes(claims.sub, claims.iat):
+        return _user_from_claims(claims)
+
+    user = user_cache.get(db, claims.sub, crud.get_user)
     if user is None:
-        raise credential_exception
+        raise _credential_exception()
     
     return user
 
-def get_current_active_user(
-    current_user: models.User = Depends(get_current_user),
+
+def user_from_refresh_token(db: Session, token: str) -> tuple[models.User, str]:
+    """Usuario activo y ``jti`` de un refresh token vigente y no revocado."""
+
+    claims = _decode(token)
+    if claims.typ != "refresh" or not claims.jti or revocaciones.is_revoked(claims.jti):
+        raise _credential_exception()
+    user = user_cache.get(db, claims.sub, crud.get_user)
+    if user is None or not user.is_active:
+        raise _credential_exception()
+    return user, claims.jti
+
+def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db),
+) -> CurrentUser:
+    return _user_from_token(db, token)
+
+def user_from_access_token(db: Session, token: Optional[str]) -> tuple[CurrentUser, Optional[str]]:
+    """Usuario activo del access token y el refresh token (``sid``) de su sesión."""
+
+    claims = access_claims(token)
+    user = get_current_active_user(_user_from_access_claims(db, claims))
+    return user, claims.sid
+
+def stream_ticket_claims(ticket: Optional[str] = Query(default=None)) -> schemas.TokenPayload:
+    """Claims del ticket de ``?ticket=`` (ver ``POST /events/ticket``).
+
+    ``EventSource`` en el navegador no permite enviar cabeceras. En lugar del
+    access token, que quedaría en los logs de acceso, la query string lleva
+    un ticket que solo abre streams y vence en segundos.
+    """
+
+    if not ticket:
+        raise _credential_exception()
+    claims = _decode(ticket)
+    if claims.typ != "stream" or (claims.sid and revocaciones.is_revoked(claims.sid)):
+        raise _credential_exception()
+    return claims
+
+def get_current_stream_user(
+    claims: schemas.TokenPayload = Depends(stream_ticket_claims),
+    db: Session = Depends(get_db),
 ) -> models.User:
+    """Como ``get_current_active_user`` pero con el ticket de stream."""
+
+    user = user_cache.get(db, claims.sub, crud.get_user)
+    if user is None:
+        raise _credential_exception()
+    return get_current_active_user(user)
+
+def stream_vigente(claims: schemas.TokenPayload) -> bool:
+    """Si la sesión del ticket sigue vigente, sin consultar la base.
+
+    Para streams que se autentican una sola vez al abrirse: el access token
+    que pidió el ticket puede vencer o su sesión revocarse después (al
+    desactivar un usuario también se revocan sus sesiones).
+    """
+
+    if claims.session_exp is not None and time.time() >= claims.session_exp:
+        return False
+    return not (claims.sid and revocaciones.is_revoked(claims.sid))
+
+def get_current_active_user(
+    current_user: CurrentUser = Depends(get_current_user),
+) -> CurrentUser:
     
     if not current_user.is_active:
         raise HTTPException(
@@ -44,9 +210,26 @@ def get_current_active_user(
         )
     return current_user
 
-def get_current_admin_user(
-    current_user: models.User = Depends(get_current_active_user),
+def get_current_db_user(
+    current_user: CurrentUser = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
 ) -> models.User:
+    """Fila completa de ``users`` del usuario autenticado.
+
+    ``get_current_active_user`` puede devolver un :class:`TokenUser`; las
+    rutas que exponen columnas fuera del token usan esta dependencia.
+    """
+
+    if isinstance(current_user, models.User):
+        return current_user
+    user = user_cache.get(db, current_user.id, crud.get_user)
+    if user is None:
+        raise _credential_exception()
+    return get_current_active_user(user)
+
+def get_current_admin_user(
+    current_user: CurrentUser = Depends(get_current_active_user),
+) -> CurrentUser:
     if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -55,9 +238,21 @@ def get_current_admin_user(
         
     return current_user
 
+async def get_current_active_user_async(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db),
+) -> CurrentUser:
+    """``get_current_active_user`` para rutas ``async def``.
+
+    Reutiliza la validación síncrona con ``run_sync``: con claims vigentes no
+    hay consulta y, si hace falta, va por asyncpg sin pasar por el threadpool.
+    """
+
+    return get_current_active_user(await db.run_sync(_user_from_token, token))
+
 def get_current_user_admin(
-    current_user: models.User = Depends(get_current_active_user),
-) -> models.User:
+    current_user: CurrentUser = Depends(get_current_active_user),
+) -> CurrentUser:
     if not (current_user.is_admin or current_user.is_branch_admin):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -66,8 +261,8 @@ def get_current_user_admin(
     return current_user
 
 def get_current_manager_user(
-    current_user: models.User = Depends(get_current_active_user),
-) -> models.User:
+    current_user: CurrentUser = Depends(get_current_active_user),
+) -> CurrentUser:
     if not (current_user.is_admin or current_user.is_gerente or current_user.is_coordinator):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -77,11 +272,89 @@ def get_current_manager_user(
 
 
 def get_current_coordinator_user(
-    current_user: models.User = Depends(get_current_active_user),
-) -> models.User:
+    current_user: CurrentUser = Depends(get_current_active_user),
+) -> CurrentUser:
     if not (current_user.is_coordinator or current_user.is_admin):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Solo coordinadores o super administradores pueden realizar esta accion",
         )
     return current_user
+
+
+def _user_scope(user: CurrentUser) -> str:
+    roles = "".join(
+        "1" if flag else "0"
+        for flag in (user.is_admin, user.is_gerente, user.is_coordinator, user.is_branch_admin)
+    )
+    return f"{roles}:{(user.sede or '').strip().lower()}"
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate in ("*", etag):
+            return True
+    return False
+
+
+def conditional_etag(
+    *tables: str,
+    vary: Optional[Callable[[], object]] = None,
+    por_usuario: bool = True,
+    usuario: Callable[..., CurrentUser] = get_current_active_user,
+) -> Callable[..., None]:
+    """Dependencia que responde ``304`` si el cliente ya tiene la versión actual.
+
+    El ETag combina la ruta, los parámetros de consulta, el alcance del usuario
+    (roles y sede), las marcas de agua de ``tables`` y, si se indica, el valor
+    de ``vary`` para respuestas que además dependen del reloj. Se calcula antes
+    de ejecutar la consulta, así que una escritura concurrente solo puede
+    provocar una respuesta completa de más, nunca un ``304`` desactualizado.
+    Declárala después de la dependencia de autenticación de la ruta y pásale
+    esa misma en ``usuario`` (FastAPI la resuelve una sola vez); en rutas
+    públicas usa ``por_usuario=False``. Con réplica de lectura no se emite
+    ETag mientras ``tables`` puedan estar atrasadas en ella.
+    """
+
+    def check(request: Request, response: Response, scope: str) -> None:
+        if watermarks.replica_atrasada(tables):
+            # Lo que devuelva la réplica puede ser anterior a las marcas de
+            # agua: un ETag ahora fijaría en el cliente una respuesta atrasada.
+            response.headers["Cache-Control"] = "private, no-cache"
+            return
+        clave = repr(
+            (
+                request.url.path,
+                sorted(request.query_params.multi_items()),
+                scope,
+                watermarks.epoch,
+                watermarks.current(tables),
+                vary() if vary is not None else None,
+            )
+        )
+        etag = f'"{hashlib.sha1(clave.encode()).hexdigest()}"'
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, etag):
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response.headers.update(headers)
+
+    # ``async def`` porque solo calcula un hash: no vale un salto al threadpool.
+    if not por_usuario:
+        async def public_dependency(request: Request, response: Response) -> None:
+            check(request, response, "")
+
+        return public_dependency
+
+    async def dependency(
+        request: Request,
+        response: Response,
+        current_user: CurrentUser = Depends(usuario),
+    ) -> None:
+        check(request, response, _user_scope(current_user))
+
+    return dependency
@@ -0,0 +1,153 @@
+"""In-process notifications about committed database changes.
+
+Every ORM session records which tables it touched while flushing (and
+which tables bulk/core statements executed through it targeted). Once the
+transaction commits, the set of table names is handed to the registered
+listeners. Rolled back transactions never notify.
+
+Changes to a few entities the UI cares about (talleres and alertas) are
+also summarised as compact :class:`ChangeNotice` objects and delivered to
+notice listeners after the same commit. Price list notices come from a
+database trigger instead (see :mod:`app.services.db_notify`), since the
+price list is loaded outside the ORM.
+
+Listeners run synchronously in the committing thread, so they must be
+cheap: bump a counter, drop a cache entry or wake a background worker.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from dataclasses import asdict, dataclass
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ChangeNotice:
+    type: str
+    id: Optional[int] = None
+    sede: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+TablesListener = Callable[[frozenset[str]], None]
+NoticeListener = Callable[[list[ChangeNotice]], None]
+
+_CHANGED_TABLES_KEY = "changed_tables"
+_NOTICES_KEY = "change_notices"
+_listeners: list[TablesListener] = []
+_notice_listeners: list[NoticeListener] = []
+_listeners_lock = threading.Lock()
+
+
+def subscribe(listener: TablesListener) -> TablesListener:
+    """Register ``listener`` to be called with the tables changed by each commit."""
+
+    with _listeners_lock:
+        _listeners.append(listener)
+    return listener
+
+
+def publish(tables: Iterable[str]) -> None:
+    changed = frozenset(tables)
+    if not changed:
+        return
+    with _listeners_lock:
+        listeners = list(_listeners)
+    for listener in listeners:
+        try:
+            listener(changed)
+        except Exception:  # pragma: no cover - listeners must never break commits
+            logger.exception("Change listener %r failed", listener)
+
+
+def subscribe_notices(listener: NoticeListener) -> NoticeListener:
+    """Register ``listener`` to be called with the notices of each commit."""
+
+    with _listeners_lock:
+        _notice_listeners.append(listener)
+    return listener
+
+
+def publish_notices(notices: list[ChangeNotice]) -> None:
+    if not notices:
+        return
+    with _listeners_lock:
+        listeners = list(_notice_listeners)
+    for listener in listeners:
+        try:
+            listener(notices)
+        except Exception:  # pragma: no cover - listeners must never break commits
+            logger.exception("Notice listener %r failed", listener)
+
+
+def _notice_for(instance, action: str) -> Optional[ChangeNotice]:
+    if isinstance(instance, models.Taller):
+        return ChangeNotice(f"taller.{action}", instance.id, instance.sede)
+    if isinstance(instance, models.AlertaSubcorte) and action == "created":
+        return ChangeNotice("alerta.created", instance.id, instance.sede)
+    return None
+
+
+def record(session: Session, name: str) -> None:
+    """Publish ``name`` with the tables of the next commit of ``session``.
+
+    For logical changes that the written table alone does not tell apart
+    (e.g. revoking a refresh token versus issuing one).
+    """
+
+    _record(session, name)
+
+
+def _record(session: Session, table_name: str | None) -> None:
+    if table_name:
+        session.info.setdefault(_CHANGED_TABLES_KEY, set()).add(table_name)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flushed_tables(session: Session, flush_context) -> None:
+    notices: list[ChangeNotice] = session.info.setdefault(_NOTICES_KEY, [])
+    for action, instances in (
+        ("created", session.new),
+        ("updated", session.dirty),
+        ("deleted", session.deleted),
+    ):
+        for instance in instances:
+            table = getattr(instance, "__table__", None)
+            _record(session, table.name if table is not None else None)
+            notice = _notice_for(instance, action)
+            if notice is not None and notice not in notices:
+                notices.append(notice)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_executed_tables(orm_execute_state) -> None:
+    if not (
+        orm_execute_state.is_insert
+        or orm_execute_state.is_update
+        or orm_execute_state.is_delete
+    ):
+        return
+    table = getattr(orm_execute_state.statement, "table", None)
+    _record(orm_execute_state.session, getattr(table, "name", None))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed_tables(session: Session) -> None:
+    publish(session.info.pop(_CHANGED_TABLES_KEY, ()))
+    publish_notices(session.info.pop(_NOTICES_KEY, []))
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_rolled_back_tables(session: Session, previous_transaction) -> None:
+    session.info.pop(_CHANGED_TABLES_KEY, None)
+    session.info.pop(_NOTICES_KEY, None)
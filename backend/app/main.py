@@ -10,7 +10,7 @@ import logging
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
-from . import crud
+from . import crud, events  # noqa: F401 - registra los listeners de sesión
 from .config import (
     ADMIN_EMAIL,
     ADMIN_FULL_NAME,
@@ -25,14 +25,28 @@ from .config import (
     PROMOTE_ADMIN_EMAIL,
 )
 from .constants import BRANCH_LOCATIONS
-from .database import Base, SessionLocal, engine
+from .database import Base, SessionLocal, async_engine, engine
 from .db_migrations import apply_startup_migrations
-from .routers import auth, upload, items, users, talleres, inventario, dashboard, alertas
-from .security import get_password_hash
+from .routers import (
+    alertas,
+    auth,
+    dashboard,
+    eventos,
+    export,
+    inventario,
+    items,
+    reportes,
+    talleres,
+    upload,
+    users,
+)
+from .security import get_password_hash, start_password_pool, stop_password_pool
+from .services.db_notify import TableChangeListener
 
 logger = logging.getLogger(__name__)
 
 app = FastAPI(title="MercaMorfosis Backend")
+table_change_listener = TableChangeListener(engine)
 
 app.add_middleware(
     CORSMiddleware,
@@ -40,6 +54,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
 @app.get("/")
@@ -66,8 +81,9 @@ def _ensure_default_admin() -> None:
                     existing_admin.is_admin = True
                     updated = True
 
-                if ADMIN_EMAIL and existing_admin.email != ADMIN_EMAIL:
-                    existing_admin.email = ADMIN_EMAIL
+                admin_email = ADMIN_EMAIL.strip().lower() if ADMIN_EMAIL else None
+                if admin_email and existing_admin.email != admin_email:
+                    existing_admin.email = admin_email
                     updated = True
 
                 if ADMIN_FULL_NAME and existing_admin.full_name != ADMIN_FULL_NAME:
@@ -161,7 +177,8 @@ def _ensure_branch_operators() -> None:
     if not DEFAULT_USER_PASSWORD:
         return
     
-    hashed_password = get_password_hash(DEFAULT_USER_PASSWORD)
+    # Se calcula solo si falta algún usuario: argon2 es caro a propósito.
+    hashed_password: str | None = None
     created_users: list[str] = []
     
     with SessionLocal() as db:
@@ -171,7 +188,9 @@ def _ensure_branch_operators() -> None:
                 existing_user = crud.get_user_by_username(db, username)
                 if existing_user:
                     continue
-            
+
+                if hashed_password is None:
+                    hashed_password = get_password_hash(DEFAULT_USER_PASSWORD)
                 crud.create_user(
                     db,
                     username=username,
@@ -209,6 +228,23 @@ def _startup():
     _ensure_default_operator()
     _promote_user_to_admin(PROMOTE_ADMIN_EMAIL)
     _ensure_branch_operators()
+    start_password_pool()
+    dashboard.resumen_cache.start()
+    table_change_listener.start()
+    items.catalogo.start()
+
+
+@app.on_event("shutdown")
+async def _dispose_async_engine():
+    await async_engine.dispose()
+
+
+@app.on_event("shutdown")
+def _shutdown():
+    stop_password_pool()
+    table_change_listener.stop()
+    items.catalogo.stop()
+    dashboard.resumen_cache.stop()
 
 
 
@@ -220,4 +256,7 @@ app.include_router(users.router, prefix=API_PREFIX)
 app.include_router(talleres.router, prefix=API_PREFIX)
 app.include_router(inventario.router, prefix=API_PREFIX)
 app.include_router(dashboard.router, prefix=API_PREFIX)
-app.include_router(alertas.router, prefix=API_PREFIX)
\ No newline at end of file
+app.include_router(alertas.router, prefix=API_PREFIX)
+app.include_router(reportes.router, prefix=API_PREFIX)
+app.include_router(eventos.router, prefix=API_PREFIX)
+app.include_router(export.router, prefix=API_PREFIX)
\ No newline at end of file
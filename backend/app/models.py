@@ -7,6 +7,7 @@ from sqlalchemy import (
     ForeignKey,
     Integer,
     Numeric,
+    PrimaryKeyConstraint,
     String,
     Text,
     TIMESTAMP,
@@ -61,6 +62,19 @@ class User(Base):
         TIMESTAMP, server_default=func.now(), onupdate=func.now(), nullable=False
     )
     
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    jti = Column(String(32), unique=True, nullable=False)
+    user_id = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    creado_en = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+    expira_en = Column(TIMESTAMP, nullable=False)
+    revocado_en = Column(TIMESTAMP, nullable=True)
+
+
 class ListaPrecios(Base):
     __tablename__ = "precios_lista"
 
@@ -78,6 +92,9 @@ class ListaPrecios(Base):
     file_hash = Column(Text, nullable=True)
     ingested_at = Column(TIMESTAMP(timezone=True), nullable=True)
     activo = Column(Boolean, nullable=True)
+    # Enlazados por trigger con el ítem de mismo código (ver db_migrations).
+    item_id = Column(Integer, ForeignKey("items.id", ondelete="SET NULL"), nullable=True)
+    especie = Column(String(10), nullable=True)
     
 
 
@@ -163,3 +180,44 @@ class AlertaSubcorte(Base):
     creado_en = Column(DateTime, default=datetime.utcnow)
 
     taller = relationship("Taller", back_populates="alertas_subcorte")
+
+
+class TallerActividadDiaria(Base):
+    # Rollup de /talleres/actividad; local_date es el día en UTC-5.
+    __tablename__ = "talleres_actividad_diaria"
+    __table_args__ = (PrimaryKeyConstraint("user_id", "sede", "especie", "local_date"),)
+
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    sede = Column(Text, nullable=False)
+    especie = Column(String(10), nullable=False, default="")
+    local_date = Column(Date, nullable=False)
+    cantidad = Column(Integer, nullable=False, default=0)
+
+
+class DashboardSerieBucket(Base):
+    # Serie de talleres por hora/día local (UTC-5); granularidad es "hour" o "day".
+    __tablename__ = "dashboard_series_buckets"
+    __table_args__ = (
+        PrimaryKeyConstraint("granularidad", "bucket_start", "sede", "especie"),
+    )
+
+    granularidad = Column(String(8), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    sede = Column(Text, nullable=False, default="")
+    especie = Column(String(10), nullable=False, default="")
+    talleres = Column(Integer, nullable=False, default=0)
+    peso_inicial = Column(Numeric(18, 4), nullable=False, default=0)
+    perdida = Column(Numeric(18, 4), nullable=False, default=0)
+
+
+class InventarioSaldo(Base):
+    # Saldo acumulado de /inventario por sede, especie y código; sede '' = sin sede.
+    __tablename__ = "inventario_saldos"
+    __table_args__ = (PrimaryKeyConstraint("sede", "especie", "codigo"),)
+
+    sede = Column(Text, nullable=False, default="")
+    especie = Column(String(10), nullable=False, default="")
+    codigo = Column(Text, nullable=False)
+    descripcion = Column(Text, nullable=False, default="")
+    total_peso = Column(Numeric(18, 4), nullable=False, default=0)
+    detalles = Column(Integer, nullable=False, default=0)
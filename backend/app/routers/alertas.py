@@ -2,8 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
 from .. import models, schemas
-from ..database import get_db
-from ..dependencies import get_current_user_admin
+from ..database import get_db, get_read_db
+from ..dependencies import conditional_etag, get_current_user_admin
 
 router = APIRouter(prefix="/alertas", tags=["alertas"])
 
@@ -29,8 +29,9 @@ def _serialize_alerta(
 
 @router.get("/subcortes", response_model=list[schemas.AlertaSubcorteOut])
 def listar_alertas_subcorte(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user_admin),
+    _: None = Depends(conditional_etag("alertas_subcorte", "users")),
 ):
     query = db.query(models.AlertaSubcorte)
     if not current_user.is_admin:
@@ -1,13 +1,29 @@
 import logging
+from typing import Optional
+
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
+from jose import JWTError, jwt
 from sqlalchemy.orm import Session
 
 from .. import crud, models
-from ..database import get_db
-from ..dependencies import get_current_active_user
-from ..schemas import Token, UserCreate, UserOut
-from ..security import create_access_token, get_password_hash, verify_password
+from ..database import SessionLocal, get_db
+from ..config import JWT_ACCESS_TOKEN_EXPIRE_MINUTES, JWT_ALGORITHM, JWT_SECRET_KEY
+from ..dependencies import (
+    get_current_db_user,
+    optional_oauth2_scheme,
+    user_from_access_token,
+    user_from_refresh_token,
+)
+from ..schemas import RefreshRequest, Token, UserCreate, UserOut
+from ..security import (
+    create_access_token,
+    create_refresh_token,
+    get_password_hash,
+    user_claims,
+    verify_and_update_password,
+)
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 logger = logging.getLogger(__name__)
@@ -42,37 +58,108 @@ def register_user(payload: UserCreate, db: Session = Depends(get_db)) -> UserOut
     )
     return user
 
+def _credenciales(identifier: str) -> Optional[tuple[int, str]]:
+    with SessionLocal() as db:
+        user = crud.get_user_by_identifier(db, identifier)
+        return (user.id, user.hashed_password) if user else None
+
+
+def _token_response(user: models.User, refresh_token: Optional[str], sid: Optional[str]) -> Token:
+    return Token(
+        access_token=create_access_token(str(user.id), claims=user_claims(user, sid)),
+        token_type="bearer",
+        refresh_token=refresh_token,
+        expires_in=JWT_ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    )
+
+
+def _emitir_tokens(user_id: int, nuevo_hash: Optional[str]) -> Token:
+    with SessionLocal() as db:
+        user = db.get(models.User, user_id)
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="credenciales incorrectas",
+            )
+        if nuevo_hash:
+            # Parámetros de argon2 (o esquema) cambiados desde que se creó el hash.
+            user.hashed_password = nuevo_hash
+        if not user.is_active:
+            # Sin claims ni refresh token: las rutas lo rechazan como antes.
+            db.commit()
+            return Token(access_token=create_access_token(str(user.id)), token_type="bearer")
+
+        refresh_token, jti, expira_en = create_refresh_token(str(user.id))
+        crud.create_refresh_token(db, user_id=user.id, jti=jti, expira_en=expira_en)
+        db.commit()
+        return _token_response(user, refresh_token, jti)
+
+
 @router.post("/token", response_model=Token)
-def login_for_access_token(
+async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db),
 ) -> Token:
-    user = crud.get_user_by_identifier(db, form_data.username)
-    if not user:
+    # Asíncrona para que la espera por argon2 (en el pool de procesos) no
+    # ocupe un hilo del threadpool. Las consultas usan sesiones cortas propias:
+    # con ``get_db`` cada inicio de sesión retendría una conexión mientras
+    # espera el hash y una ráfaga agotaría el pool del engine.
+    credenciales = await run_in_threadpool(_credenciales, form_data.username)
+    if credenciales is None:
         logger.warning("Login failed: user not found (%s)", form_data.username)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="credenciales incorrectas",
         )
-    if not verify_password(form_data.password, user.hashed_password):
-        logger.warning("Login failed: invalid password (user_id=%s)", user.id)
+    user_id, hashed_password = credenciales
+    valido, nuevo_hash = await verify_and_update_password(form_data.password, hashed_password)
+    if not valido:
+        logger.warning("Login failed: invalid password (user_id=%s)", user_id)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="credenciales incorrectas",
         )
-    
-    access_token = create_access_token(str(user.id))
-    return Token(access_token=access_token, token_type="bearer")
+
+    return await run_in_threadpool(_emitir_tokens, user_id, nuevo_hash)
 
 @router.post("/refresh", response_model=Token)
 def refresh_access_token(
-    current_user: models.User = Depends(get_current_active_user),
+    payload: Optional[RefreshRequest] = None,
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    db: Session = Depends(get_db),
 ) -> Token:
-    access_token = create_access_token(str(current_user.id))
-    return Token(access_token=access_token, token_type="bearer")
+    """Emitir un access token nuevo.
+
+    Con ``refresh_token`` en el cuerpo basta con que este siga vigente; se
+    valida en memoria y el usuario sale de la caché de autenticación. Sin
+    cuerpo se renueva, como antes, el access token del header.
+    """
+
+    if payload is not None:
+        user, sid = user_from_refresh_token(db, payload.refresh_token)
+        return _token_response(user, payload.refresh_token, sid)
+
+    current_user, sid = user_from_access_token(db, token)
+    return _token_response(current_user, None, sid)
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+def logout(payload: RefreshRequest, db: Session = Depends(get_db)) -> None:
+    """Revocar el refresh token y los access tokens emitidos con él."""
+
+    try:
+        claims = jwt.decode(
+            payload.refresh_token,
+            JWT_SECRET_KEY,
+            algorithms=[JWT_ALGORITHM],
+            options={"verify_exp": False},
+        )
+    except JWTError:
+        return None
+    if claims.get("typ") == "refresh" and claims.get("jti"):
+        crud.revoke_refresh_tokens(db, jti=claims["jti"])
+    return None
 
 @router.get("/me", response_model=UserOut)
-async def read_current_user(
-    current_user: models.User = Depends(get_current_active_user),
+def read_current_user(
+    current_user: models.User = Depends(get_current_db_user),
 ) -> UserOut:
     return current_user
@@ -1,47 +1,91 @@
 from datetime import date, datetime, timedelta
 from decimal import Decimal
+from typing import Literal, Optional
 
-from fastapi import APIRouter, Depends
-from sqlalchemy import func
-from sqlalchemy.orm import Session, selectinload
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import and_, func, not_, outerjoin, select
+from sqlalchemy.orm import Session
 
-from .. import models, schemas
-from ..database import get_db
-from ..dependencies import get_current_active_user
+from .. import events, models, schemas
+from ..config import DASHBOARD_CACHE_REFRESH_MARGIN_SECONDS, DASHBOARD_CACHE_TTL_SECONDS
+from ..constants import APP_TIMEZONE, normalize_sede_name
+from ..database import SessionLocal, get_read_db, pool_status
+from ..dependencies import (
+    conditional_etag,
+    get_current_active_user,
+    get_current_active_user_async,
+    get_current_admin_user,
+)
+from ..services import pool_metrics
+from ..services.snapshot_cache import SnapshotCache
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
 COMPLETION_THRESHOLD = Decimal("0.99")
 LOW_INVENTORY_THRESHOLD = Decimal("10")
 TREND_WINDOW_DAYS = 7
+SERIES_DEFAULT_RANGE = {
+    "hour": timedelta(days=2),
+    "day": timedelta(days=30),
+    "week": timedelta(weeks=26),
+}
+_RESUMEN_TABLES = frozenset(
+    {"talleres", "talleres_detalle", "items", "users", "precios_lista"}
+)
 
 
-def _to_decimal(value: Decimal | float | int | None) -> Decimal:
-    if isinstance(value, Decimal):
-        return value
-    if value is None:
-        return Decimal("0")
-    try:
-        return Decimal(str(value))
-    except Exception:  # pragma: no cover - fallback for unexpected types
-        return Decimal("0")
+def _count_talleres_por_estado(
+    db: Session,
+    *,
+    current_window_start: datetime,
+    previous_window_start: datetime,
+    today_start: datetime,
+    tomorrow_start: datetime,
+    yesterday_start: datetime,
+):
+    """Clasificar y contar los talleres por ventana en una sola sentencia.
 
+    Un taller está completado cuando ``peso_final + sum(detalles)`` alcanza
+    ``COMPLETION_THRESHOLD`` de su peso inicial; el resto cuenta como activo.
+    """
 
-def _calculate_status(taller: models.Taller) -> str:
-    peso_inicial = _to_decimal(taller.peso_inicial)
-    total_detalles = sum(_to_decimal(detalle.peso) for detalle in taller.detalles)
-    total_peso = _to_decimal(taller.peso_final) + total_detalles
-
-    if peso_inicial <= 0:
-        ratio = Decimal("0")
-    else:
-        ratio = total_peso / peso_inicial
+    detalles = (
+        select(
+            models.TallerDetalle.taller_id.label("taller_id"),
+            func.sum(func.coalesce(models.TallerDetalle.peso, 0)).label("total_detalles"),
+        )
+        .group_by(models.TallerDetalle.taller_id)
+        .subquery()
+    )
+    peso_inicial = func.coalesce(models.Taller.peso_inicial, 0)
+    total_peso = func.coalesce(models.Taller.peso_final, 0) + func.coalesce(
+        detalles.c.total_detalles, 0
+    )
+    completado = and_(peso_inicial > 0, total_peso >= peso_inicial * COMPLETION_THRESHOLD)
+    creado_en = models.Taller.creado_en
 
-    if ratio >= COMPLETION_THRESHOLD:
-        return "completado"
-    if ratio > 0:
-        return "en-proceso"
-    return "pendiente"
+    stmt = select(
+        func.count().filter(not_(completado)).label("activos_total"),
+        func.count()
+        .filter(not_(completado), creado_en >= current_window_start)
+        .label("activos_actuales"),
+        func.count()
+        .filter(
+            not_(completado),
+            creado_en >= previous_window_start,
+            creado_en < current_window_start,
+        )
+        .label("activos_previos"),
+        func.count()
+        .filter(completado, creado_en >= today_start, creado_en < tomorrow_start)
+        .label("completados_hoy"),
+        func.count()
+        .filter(completado, creado_en >= yesterday_start, creado_en < today_start)
+        .label("completados_ayer"),
+    ).select_from(
+        outerjoin(models.Taller, detalles, detalles.c.taller_id == models.Taller.id)
+    )
+    return db.execute(stmt).one()
 
 
 def _calculate_trend(current: int, previous: int) -> float | None:
@@ -52,34 +96,49 @@ def _calculate_trend(current: int, previous: int) -> float | None:
     return float((current - previous) / previous * 100)
 
 
-def _count_low_inventory(db: Session, start_dt: datetime | None, end_dt: datetime | None) -> int:
-    query = (
-        db.query(
-            func.coalesce(models.TallerDetalle.codigo_producto, models.Item.item_code).label(
-                "codigo_producto"
-            ),
-            func.sum(func.coalesce(models.TallerDetalle.peso, 0)).label("total_peso"),
+def _count_low_inventory(
+    db: Session,
+    *,
+    current_window_start: datetime,
+    current_window_end: datetime,
+    previous_window_start: datetime,
+) -> tuple[int, int, int]:
+    """Contar códigos con inventario bajo: histórico, ventana actual y previa.
+
+    Los totales por código de las tres ventanas salen de una sola pasada
+    sobre ``talleres_detalle``; un código sin movimientos en una ventana
+    queda con ``NULL`` y no cuenta en ella.
+    """
+
+    codigo = func.coalesce(models.TallerDetalle.codigo_producto, models.Item.item_code)
+    peso = func.coalesce(models.TallerDetalle.peso, 0)
+    creado_en = models.TallerDetalle.creado_en
+
+    totales = (
+        select(
+            func.sum(peso).label("total"),
+            func.sum(peso)
+            .filter(creado_en >= current_window_start, creado_en < current_window_end)
+            .label("actual"),
+            func.sum(peso)
+            .filter(creado_en >= previous_window_start, creado_en < current_window_start)
+            .label("previo"),
         )
+        .select_from(models.TallerDetalle)
         .join(models.Taller, models.Taller.id == models.TallerDetalle.taller_id)
         .outerjoin(models.Item, models.Item.id == models.TallerDetalle.item_id)
+        .group_by(codigo)
+        .subquery()
     )
 
-    if start_dt:
-        query = query.filter(models.TallerDetalle.creado_en >= start_dt)
-    if end_dt:
-        query = query.filter(models.TallerDetalle.creado_en < end_dt)
-
-    rows = query.group_by(
-        func.coalesce(models.TallerDetalle.codigo_producto, models.Item.item_code),
-    ).all()
-
-    low_count = 0
-    for row in rows:
-        total_peso = _to_decimal(getattr(row, "total_peso", Decimal("0")))
-        if total_peso <= LOW_INVENTORY_THRESHOLD:
-            low_count += 1
-
-    return low_count
+    row = db.execute(
+        select(
+            func.count().filter(totales.c.total <= LOW_INVENTORY_THRESHOLD),
+            func.count().filter(totales.c.actual <= LOW_INVENTORY_THRESHOLD),
+            func.count().filter(totales.c.previo <= LOW_INVENTORY_THRESHOLD),
+        )
+    ).one()
+    return int(row[0]), int(row[1]), int(row[2])
 
 
 def _count_active_users(
@@ -93,11 +152,7 @@ def _count_active_users(
     return int(query.scalar() or 0)
 
 
-@router.get("/resumen", response_model=schemas.DashboardStats)
-def obtener_resumen_dashboard(
-    db: Session = Depends(get_db),
-    _: models.User = Depends(get_current_active_user),
-) -> schemas.DashboardStats:
+def _build_resumen(db: Session) -> schemas.DashboardStats:
     today = date.today()
     today_start = datetime.combine(today, datetime.min.time())
     tomorrow_start = today_start + timedelta(days=1)
@@ -106,39 +161,21 @@ def obtener_resumen_dashboard(
     current_window_start = today_start - timedelta(days=TREND_WINDOW_DAYS - 1)
     previous_window_start = current_window_start - timedelta(days=TREND_WINDOW_DAYS)
 
-    talleres = (
-        db.query(models.Taller)
-        .options(selectinload(models.Taller.detalles))
-        .order_by(models.Taller.creado_en.desc())
-        .all()
+    talleres = _count_talleres_por_estado(
+        db,
+        current_window_start=current_window_start,
+        previous_window_start=previous_window_start,
+        today_start=today_start,
+        tomorrow_start=tomorrow_start,
+        yesterday_start=yesterday_start,
     )
 
-    activos_total = 0
-    activos_actuales = 0
-    activos_previos = 0
-    completados_hoy = 0
-    completados_ayer = 0
-
-    for taller in talleres:
-        estado = _calculate_status(taller)
-        creado_en = taller.creado_en
-
-        if estado != "completado":
-            activos_total += 1
-            if creado_en and creado_en >= current_window_start:
-                activos_actuales += 1
-            elif creado_en and previous_window_start <= creado_en < current_window_start:
-                activos_previos += 1
-
-        if estado == "completado" and creado_en:
-            if today_start <= creado_en < tomorrow_start:
-                completados_hoy += 1
-            elif yesterday_start <= creado_en < today_start:
-                completados_ayer += 1
-
-    inventario_bajo_total = _count_low_inventory(db, None, None)
-    inventario_bajo_actual = _count_low_inventory(db, current_window_start, tomorrow_start)
-    inventario_bajo_prev = _count_low_inventory(db, previous_window_start, current_window_start)
+    inventario_bajo_total, inventario_bajo_actual, inventario_bajo_prev = _count_low_inventory(
+        db,
+        current_window_start=current_window_start,
+        current_window_end=tomorrow_start,
+        previous_window_start=previous_window_start,
+    )
 
     usuarios_activos_total = _count_active_users(db)
     usuarios_activos_actuales = _count_active_users(db, current_window_start, tomorrow_start)
@@ -146,12 +183,12 @@ def obtener_resumen_dashboard(
 
     return schemas.DashboardStats(
         talleres_activos=schemas.DashboardMetric(
-            value=activos_total,
-            trend=_calculate_trend(activos_actuales, activos_previos),
+            value=talleres.activos_total,
+            trend=_calculate_trend(talleres.activos_actuales, talleres.activos_previos),
         ),
         completados_hoy=schemas.DashboardMetric(
-            value=completados_hoy,
-            trend=_calculate_trend(completados_hoy, completados_ayer),
+            value=talleres.completados_hoy,
+            trend=_calculate_trend(talleres.completados_hoy, talleres.completados_ayer),
         ),
         inventario_bajo=schemas.DashboardMetric(
             value=inventario_bajo_total,
@@ -161,4 +198,126 @@ def obtener_resumen_dashboard(
             value=usuarios_activos_total,
             trend=_calculate_trend(usuarios_activos_actuales, usuarios_activos_previos),
         ),
-    )
\ No newline at end of file
+    )
+
+
+def _load_resumen() -> schemas.DashboardStats:
+    with SessionLocal() as db:
+        return _build_resumen(db)
+
+
+resumen_cache: SnapshotCache[schemas.DashboardStats] = SnapshotCache(
+    "dashboard-resumen",
+    _load_resumen,
+    ttl=DASHBOARD_CACHE_TTL_SECONDS,
+    refresh_margin=DASHBOARD_CACHE_REFRESH_MARGIN_SECONDS,
+)
+
+
+@events.subscribe
+def _invalidate_resumen(tables: frozenset[str]) -> None:
+    if tables & _RESUMEN_TABLES:
+        resumen_cache.invalidate()
+
+
+@router.get("/resumen", response_model=schemas.DashboardStats)
+async def obtener_resumen_dashboard(
+    _: models.User = Depends(get_current_active_user_async),
+    __: None = Depends(
+        conditional_etag(
+            *sorted(_RESUMEN_TABLES), vary=date.today, usuario=get_current_active_user_async
+        )
+    ),
+) -> schemas.DashboardStats:
+    return await resumen_cache.aget()
+
+
+@router.get("/series", response_model=schemas.DashboardSeriesOut)
+def obtener_series_dashboard(
+    *,
+    metric: Literal["talleres", "peso", "perdida"] = "talleres",
+    bucket: Literal["hour", "day", "week"] = "day",
+    sede: Optional[str] = None,
+    especie: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: Session = Depends(get_read_db),
+    _: models.User = Depends(get_current_active_user),
+) -> schemas.DashboardSeriesOut:
+    """Serie temporal por hora, día o semana local desde los buckets agregados."""
+
+    end_date = end_date or datetime.now(APP_TIMEZONE).date()
+    start_date = start_date or end_date - SERIES_DEFAULT_RANGE[bucket]
+    if end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El rango de fechas es inválido",
+        )
+
+    sede_normalizada = None
+    if sede:
+        sede_normalizada = normalize_sede_name(sede)
+        if sede_normalizada is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="La sede no es válida. Usa una de las sedes configuradas.",
+            )
+
+    buckets = models.DashboardSerieBucket
+    valor = {
+        "talleres": buckets.talleres,
+        "peso": buckets.peso_inicial,
+        "perdida": buckets.perdida,
+    }[metric]
+    bucket_expr = (
+        func.date_trunc("week", buckets.bucket_start) if bucket == "week" else buckets.bucket_start
+    )
+    query = (
+        db.query(bucket_expr.label("bucket_start"), func.sum(valor).label("value"))
+        .filter(buckets.granularidad == ("hour" if bucket == "hour" else "day"))
+        .filter(buckets.bucket_start >= datetime.combine(start_date, datetime.min.time()))
+        .filter(
+            buckets.bucket_start
+            < datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+        )
+    )
+    if sede_normalizada:
+        query = query.filter(buckets.sede == sede_normalizada)
+    if especie:
+        query = query.filter(buckets.especie == especie.strip().lower())
+
+    rows = (
+        query.group_by(bucket_expr)
+        .having(func.sum(buckets.talleres) > 0)
+        .order_by(bucket_expr)
+        .all()
+    )
+    return schemas.DashboardSeriesOut(
+        metric=metric,
+        bucket=bucket,
+        points=[
+            schemas.DashboardSeriesPoint(bucket_start=row.bucket_start, value=row.value or 0)
+            for row in rows
+        ],
+    )
+
+
+@router.get("/cache", response_model=schemas.SnapshotCacheStats)
+def obtener_estado_cache_dashboard(
+    _: models.User = Depends(get_current_admin_user),
+) -> schemas.SnapshotCacheStats:
+    return schemas.SnapshotCacheStats(**resumen_cache.stats())
+
+
+@router.get("/pool", response_model=list[schemas.PoolStats])
+def obtener_estado_pools(
+    _: models.User = Depends(get_current_admin_user),
+) -> list[schemas.PoolStats]:
+    """Ocupación de cada pool de conexiones y cuánto se espera para obtener una."""
+
+    metricas = pool_metrics.stats()
+    return [
+        schemas.PoolStats(**estado, **metricas[nombre])
+        for nombre, estado in pool_status().items()
+        if nombre in metricas
+    ]
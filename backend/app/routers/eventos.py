@@ -0,0 +1,85 @@
+import time
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+
+from .. import models, schemas
+from ..config import JWT_STREAM_TICKET_EXPIRE_SECONDS
+from ..constants import normalize_sede_name
+from ..dependencies import (
+    access_claims,
+    get_current_active_user,
+    get_current_stream_user,
+    oauth2_scheme,
+    stream_ticket_claims,
+    stream_vigente,
+)
+from ..security import create_stream_ticket
+from ..services.broadcaster import broadcaster, format_event
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+_KEEPALIVE_SECONDS = 15.0
+_RETRY_MILLISECONDS = 5000
+# Se envía antes de cerrar un stream cuya sesión venció o fue revocada: el
+# cliente debe renovar el token y pedir otro ticket antes de reconectar (el
+# ticket de la URL ya no sirve para la reconexión automática).
+SESSION_EXPIRED_EVENT = "session-expired"
+
+
+@router.post("/ticket", response_model=schemas.StreamTicket)
+def crear_ticket_stream(
+    token: str = Depends(oauth2_scheme),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """Ticket para abrir ``GET /events?ticket=...`` con ``EventSource``."""
+
+    claims = access_claims(token)
+    return schemas.StreamTicket(
+        ticket=create_stream_ticket(str(current_user.id), claims.sid, claims.exp),
+        expires_in=JWT_STREAM_TICKET_EXPIRE_SECONDS,
+    )
+
+
+@router.get("")
+async def stream_eventos(
+    request: Request,
+    current_user: models.User = Depends(get_current_stream_user),
+    claims: schemas.TokenPayload = Depends(stream_ticket_claims),
+):
+    """Stream SSE con avisos de cambio (talleres, alertas y lista de precios).
+
+    Administradores, gerentes y coordinadores reciben los avisos de todas las
+    sedes; el resto solo los de su sede y los que no tienen sede. El stream se
+    cierra cuando vence el access token que pidió el ticket o se revoca su
+    sesión (también al desactivar al usuario).
+    """
+
+    recibe_todo = bool(
+        current_user.is_admin or current_user.is_gerente or current_user.is_coordinator
+    )
+    sede = normalize_sede_name(current_user.sede) or current_user.sede
+    vence = claims.session_exp
+
+    async def generar():
+        subscription = broadcaster.subscribe(sede=sede, recibe_todo=recibe_todo)
+        try:
+            yield f"retry: {_RETRY_MILLISECONDS}\n\n"
+            while not await request.is_disconnected():
+                if not stream_vigente(claims):
+                    yield format_event(SESSION_EXPIRED_EVENT, {})
+                    break
+                espera = _KEEPALIVE_SECONDS
+                if vence is not None:
+                    espera = max(0.0, min(espera, vence - time.time()))
+                message = await subscription.next_message(timeout=espera)
+                # Los comentarios mantienen viva la conexión a través de proxies.
+                yield message if message is not None else ": keepalive\n\n"
+        finally:
+            broadcaster.unsubscribe(subscription)
+
+    return StreamingResponse(
+        generar(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,126 @@
+from datetime import date
+from typing import Iterator, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func
+
+from .. import models
+from ..constants import local_day_range_to_utc_naive, normalize_sede_name
+from ..database import ReadSessionLocal
+from ..dependencies import get_current_manager_user
+from ..services import columnar
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+DETALLE_COLUMNAS = [
+    columnar.Columna("detalle_id", "int64"),
+    columnar.Columna("taller_id", "int64"),
+    columnar.Columna("grupo_id", "int64"),
+    columnar.Columna("nombre_taller", "string"),
+    columnar.Columna("sede", "dictionary"),
+    columnar.Columna("especie", "dictionary"),
+    columnar.Columna("codigo_principal", "string"),
+    columnar.Columna("codigo_producto", "string"),
+    columnar.Columna("nombre_subcorte", "dictionary"),
+    columnar.Columna("peso", "decimal"),
+    columnar.Columna("peso_inicial", "decimal"),
+    columnar.Columna("peso_final", "decimal"),
+    columnar.Columna("creado_en", "timestamp"),
+    columnar.Columna("creado_por", "dictionary"),
+]
+
+
+def _stream_detalles(
+    *,
+    start_dt,
+    end_dt,
+    sede: Optional[str],
+    especie: Optional[str],
+) -> Iterator[bytes]:
+    # Sesión propia: la de ``get_read_db`` se cierra antes de que empiece el envío.
+    with ReadSessionLocal() as db:
+        query = (
+            db.query(
+                models.TallerDetalle.id,
+                models.Taller.id,
+                models.Taller.taller_grupo_id,
+                models.Taller.nombre_taller,
+                models.Taller.sede,
+                func.lower(models.Taller.especie),
+                models.Taller.codigo_principal,
+                models.TallerDetalle.codigo_producto,
+                models.TallerDetalle.nombre_subcorte,
+                models.TallerDetalle.peso,
+                models.Taller.peso_inicial,
+                models.Taller.peso_final,
+                models.Taller.creado_en,
+                func.coalesce(models.User.full_name, models.User.username),
+            )
+            .join(models.Taller, models.Taller.id == models.TallerDetalle.taller_id)
+            .outerjoin(models.User, models.User.id == models.Taller.creado_por_id)
+        )
+        if start_dt is not None:
+            query = query.filter(models.Taller.creado_en >= start_dt)
+        if end_dt is not None:
+            query = query.filter(models.Taller.creado_en < end_dt)
+        if sede:
+            query = query.filter(func.lower(models.Taller.sede) == sede.lower())
+        if especie:
+            query = query.filter(func.lower(models.Taller.especie) == especie)
+
+        filas = query.order_by(models.Taller.creado_en, models.TallerDetalle.id).execution_options(
+            yield_per=columnar.BATCH_ROWS
+        )
+        yield from columnar.escribir("parquet", DETALLE_COLUMNAS, (tuple(fila) for fila in filas))
+
+
+@router.get("/talleres.parquet")
+def exportar_talleres_parquet(
+    *,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    sede: Optional[str] = None,
+    especie: Optional[str] = None,
+    _: models.User = Depends(get_current_manager_user),
+):
+    """Subcortes registrados, una fila por detalle, en Parquet para análisis."""
+
+    if start_date and end_date and end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El rango de fechas es inválido",
+        )
+
+    sede_normalizada = None
+    if sede:
+        sede_normalizada = normalize_sede_name(sede)
+        if sede_normalizada is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="La sede no es válida. Usa una de las sedes configuradas.",
+            )
+
+    especie_normalizada: Optional[str] = None
+    if especie:
+        especie_normalizada = especie.strip().lower()
+        if especie_normalizada not in {"res", "cerdo"}:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="La especie debe ser res o cerdo",
+            )
+
+    columnar.requerir_pyarrow()
+    start_dt = local_day_range_to_utc_naive(start_date)[0] if start_date else None
+    end_dt = local_day_range_to_utc_naive(end_date)[1] if end_date else None
+
+    return StreamingResponse(
+        _stream_detalles(
+            start_dt=start_dt,
+            end_dt=end_dt,
+            sede=sede_normalizada,
+            especie=especie_normalizada,
+        ),
+        media_type=columnar.MEDIA_TYPES["parquet"],
+        headers={"Content-Disposition": 'attachment; filename="talleres.parquet"'},
+    )
@@ -1,20 +1,26 @@
-from decimal import Decimal
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import func, or_
-from sqlalchemy.orm import Session
+from decimal import Decimal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from .. import models, schemas
 from ..constants import BRANCH_LOCATIONS
-from ..database import get_db
-from ..dependencies import get_current_active_user
+from ..database import get_async_db
+from ..dependencies import conditional_etag, get_current_active_user_async
+from ..responses import RespuestaJSON
+from ..services import busqueda
+from ..services.paginacion import codificar_cursor, decodificar_cursor
 
 router = APIRouter(
     prefix="/inventario",
     tags=["inventario"],
 )
 
+_RESPUESTA_INVENTARIO = RespuestaJSON(list[schemas.InventarioItem])
+
 
 def _normalize_branch(raw: Optional[str]) -> Optional[str]:
     if raw is None:
@@ -35,78 +41,83 @@ def _normalize_branch(raw: Optional[str]) -> Optional[str]:
 
 
 @router.get("", response_model=list[schemas.InventarioItem])
-def obtener_inventario_por_sede(
+async def obtener_inventario_por_sede(
+    response: Response,
     sede: Optional[str] = None,
     search: Optional[str] = None,
     especie: Optional[str] = None,
-    db: Session = Depends(get_db),
-    _: models.User = Depends(get_current_active_user),
+    sort: Optional[str] = None,
+    limit: Optional[int] = Query(default=None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    _: models.User = Depends(get_current_active_user_async),
+    __: None = Depends(
+        conditional_etag("inventario_saldos", usuario=get_current_active_user_async)
+    ),
 ):
     sede_normalizada = _normalize_branch(sede)
     especie_normalizada = especie.strip().lower() if especie else None
 
-    codigo_expr = func.coalesce(
-        models.TallerDetalle.codigo_producto,
-        models.Item.item_code,
-    )
-
-    descripcion_expr = func.coalesce(
-        models.Item.nombre,
-        models.TallerDetalle.nombre_subcorte,
-        models.TallerDetalle.codigo_producto,
-    )
-
-    total_peso_expr = func.sum(func.coalesce(models.TallerDetalle.peso, 0))
-    query = (
-        db.query(
-            codigo_expr.label("codigo_producto"),
-            descripcion_expr.label("descripcion"),
-            total_peso_expr.label("total_peso"),
-            models.Taller.sede.label("sede"),
-            models.Taller.especie.label("especie"),
-        )
-        .join(models.Taller, models.Taller.id == models.TallerDetalle.taller_id)
-        .outerjoin(models.Item, models.Item.id == models.TallerDetalle.item_id)
-    )
+    saldo = models.InventarioSaldo
+    query = select(saldo).filter(saldo.detalles > 0)
 
     if sede_normalizada:
-        query = query.filter(func.lower(models.Taller.sede) == sede_normalizada.lower())
+        query = query.filter(func.lower(saldo.sede) == sede_normalizada.lower())
 
     if search:
-        pattern = f"%{search.strip().lower()}%"
-        query = query.filter(
-            or_(
-                func.lower(codigo_expr).like(pattern),
-                func.lower(descripcion_expr).like(pattern),
-            )
-        )
+        query = query.filter(busqueda.contiene(search, saldo.codigo, saldo.descripcion))
     if especie_normalizada:
-        query = query.filter(func.lower(models.Taller.especie) == especie_normalizada)
-        
-    rows = (
-        query.group_by(
-            codigo_expr,
-            descripcion_expr,
-            models.Taller.sede,
-            models.Taller.especie,
+        query = query.filter(saldo.especie == especie_normalizada)
+
+    # Orden total y estable para paginar por clave: (total_peso, sede, especie,
+    # codigo) descendente, cubierto por ix_inventario_saldos_orden.
+    clave = (saldo.total_peso, saldo.sede, saldo.especie, saldo.codigo)
+    relevancia = sort == "relevancia" and bool(search and search.strip())
+    if relevancia:
+        if cursor:
+            raise HTTPException(
+                status_code=400,
+                detail="La paginación por cursor no está disponible con sort=relevancia",
+            )
+        query = query.order_by(
+            busqueda.relevancia(search, saldo.codigo, saldo.descripcion).desc()
         )
-        .order_by(total_peso_expr.desc())
-        .all()
-    )
-
-    inventario: list[schemas.InventarioItem] = []
-
-    for row in rows:
-        total_peso = row.total_peso if isinstance(row.total_peso, Decimal) else Decimal(row.total_peso or 0)
+    elif cursor:
+        peso, *resto = decodificar_cursor(cursor, len(clave))
+        try:
+            peso = Decimal(peso)
+            if not all(isinstance(valor, str) for valor in resto):
+                raise TypeError
+        except (ArithmeticError, TypeError, ValueError):
+            raise HTTPException(
+                status_code=400, detail="El cursor de paginación no es válido"
+            ) from None
+        query = query.filter(tuple_(*clave) < tuple_(peso, *resto))
+    query = query.order_by(*(columna.desc() for columna in clave))
+
+    if limit is None:
+        rows = (await db.scalars(query)).all()
+    else:
+        rows = (await db.scalars(query.limit(limit + 1))).all()
+        hay_mas = len(rows) > limit
+        rows = rows[:limit]
+        # Con relevancia no hay cursor: la página siguiente no se podría pedir.
+        if hay_mas and not relevancia:
+            ultima = rows[-1]
+            response.headers["X-Next-Cursor"] = codificar_cursor(
+                [str(ultima.total_peso), ultima.sede, ultima.especie, ultima.codigo]
+            )
 
-        inventario.append(
+    return _RESPUESTA_INVENTARIO(
+        [
             schemas.InventarioItem(
-                codigo_producto=row.codigo_producto or "",
-                descripcion=row.descripcion or "",
-                total_peso=total_peso,
-                sede=row.sede,
-                especie=row.especie,
+                codigo_producto=row.codigo,
+                descripcion=row.descripcion,
+                total_peso=row.total_peso,
+                sede=row.sede or None,
+                especie=row.especie or None,
             )
-        )
-
-    return inventario
\ No newline at end of file
+            for row in rows
+        ],
+        response,
+    )
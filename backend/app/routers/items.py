@@ -1,11 +1,26 @@
+import csv
+import io
+import json
+from datetime import date, datetime
 from decimal import Decimal
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy import func, or_
+from typing import Iterator, Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, func, or_, select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from ..database import get_db
-from ..models import ListaPrecios, Item
-from ..schemas import ListaPreciosOut, ItemsPageOut
+from .. import events
+from ..database import ReadSessionLocal, SessionLocal, get_async_db, get_read_db
+from ..dependencies import conditional_etag
+from ..responses import RespuestaJSON
+from ..services import busqueda, columnar, watermarks
+from ..services.catalogo_index import CatalogoAutocompletado, construir_indice
+from ..services.conteo_cache import ConteoCache
+from ..services.paginacion import codificar_cursor, decodificar_cursor
+from ..models import ListaPrecios
+from ..schemas import CatalogoSugerenciaOut, ListaPreciosOut, ItemsPageOut
 
 router = APIRouter(
     prefix="/items",
@@ -18,7 +33,33 @@ SORT_OPTIONS = {
     "precio-desc": ListaPrecios.precio.desc().nullslast(),
 }
 
-def _serialize_item(item: ListaPrecios, especie: str | None) -> ListaPreciosOut:
+# A partir de este offset la página se resuelve con un "deferred join": primero
+# los ids de la página (solo la columna id) y luego las filas completas,
+# unidas por id.
+DEEP_PAGE_OFFSET = 1000
+
+_CATALOG_TABLES = frozenset({"precios_lista", "items"})
+count_cache = ConteoCache("items-total")
+_RESPUESTA_PAGINA = RespuestaJSON(ItemsPageOut)
+_RESPUESTA_EXPORT = RespuestaJSON(list[ListaPreciosOut])
+
+
+
+def _load_catalogo():
+    with SessionLocal() as db:
+        return construir_indice(db)
+
+
+catalogo = CatalogoAutocompletado(_load_catalogo)
+
+
+@events.subscribe
+def _invalidate_catalog_caches(tables: frozenset[str]) -> None:
+    if tables & _CATALOG_TABLES:
+        count_cache.invalidate()
+        catalogo.invalidate()
+
+def _serialize_item(item: ListaPrecios) -> ListaPreciosOut:
     precio_raw = item.precio
     
     if isinstance(precio_raw, Decimal):
@@ -37,7 +78,7 @@ def _serialize_item(item: ListaPrecios, especie: str | None) -> ListaPreciosOut:
         sede=item.sede,
         descripcion=item.descripcion,
         precio=precio,
-        especie=especie,
+        especie=item.especie,
         fecha_vigencia=item.fecha_vigencia,
         fecha_activacion=item.fecha_activacion,
         unidad=item.unidad,
@@ -55,13 +96,13 @@ def _apply_filters(
     sort: str,
 ):
     if q:
-        search = f"%{q.strip().lower()}%"
         query = query.filter(
-            or_(
-                func.lower(ListaPrecios.referencia).like(search),
-                func.lower(ListaPrecios.descripcion).like(search),
-                func.lower(ListaPrecios.sede).like(search),
-                func.lower(ListaPrecios.location).like(search),
+            busqueda.contiene(
+                q,
+                ListaPrecios.referencia,
+                ListaPrecios.descripcion,
+                ListaPrecios.sede,
+                ListaPrecios.location,
             )
         )
 
@@ -76,49 +117,293 @@ def _apply_filters(
         
     if species and species.lower() != "todas":
         species_normalized = species.strip().lower()
-        query = query.filter(func.lower(Item.especie) == species_normalized)
+        query = query.filter(func.lower(ListaPrecios.especie) == species_normalized)
+    return query.order_by(*_order_by(q, sort))
+
+def _order_by(q: str | None, sort: str) -> tuple:
+    if sort == "relevancia" and q and q.strip():
+        relevancia = busqueda.relevancia(q, ListaPrecios.referencia, ListaPrecios.descripcion)
+        return (relevancia.desc(), SORT_OPTIONS["descripcion"])
     order_by = SORT_OPTIONS.get(sort, SORT_OPTIONS["descripcion"])
-    return query.order_by(order_by)
+    return (order_by, ListaPrecios.id.asc())
 
-def _base_query(db: Session):
-    return (
-        db.query(ListaPrecios, Item.especie)
-        .outerjoin(Item, func.lower(Item.item_code) == func.lower(ListaPrecios.referencia))
-        .filter(ListaPrecios.activo == True)
+def _filter_key(q: str | None, species: str | None, branch: str | None) -> tuple:
+    def _normalize(value: str | None) -> str | None:
+        value = (value or "").strip().lower()
+        return value if value and value != "todas" else None
+
+    return (_normalize(q), _normalize(species), _normalize(branch))
+
+def _cursor_values(item: ListaPrecios, sort: str) -> list:
+    if sort in ("precio-asc", "precio-desc"):
+        return [str(item.precio) if item.precio is not None else None, item.id]
+    return [item.descripcion, item.id]
+
+def _apply_cursor(query, sort: str, cursor: str):
+    """Filtrar las filas posteriores a ``cursor`` en el orden de ``sort``."""
+
+    value, last_id = decodificar_cursor(cursor, 2)
+    por_precio = sort in ("precio-asc", "precio-desc")
+    try:
+        if not isinstance(last_id, int) or not (
+            isinstance(value, str) or (por_precio and value is None)
+        ):
+            raise TypeError
+        if por_precio and value is not None:
+            value = Decimal(value)
+    except (ArithmeticError, TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El cursor de paginación no es válido",
+        ) from None
+
+    if not por_precio:
+        return query.filter(
+            tuple_(ListaPrecios.descripcion, ListaPrecios.id) > tuple_(value, last_id)
+        )
+
+    # Los precios nulos van al final en ambos sentidos.
+    precio = ListaPrecios.precio
+    if value is None:
+        return query.filter(precio.is_(None), ListaPrecios.id > last_id)
+    after = precio > value if sort == "precio-asc" else precio < value
+    return query.filter(
+        or_(after, and_(precio == value, ListaPrecios.id > last_id), precio.is_(None))
+    )
+
+async def _estimate_total(db: AsyncSession) -> int:
+    sql = _base_select().with_only_columns(ListaPrecios.id).compile(
+        dialect=db.bind.dialect, compile_kwargs={"literal_binds": True}
     )
+    plan = (await db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+def _base_query(db: Session):
+    # ``especie`` viene del ítem enlazado al cargar el precio (ver db_migrations).
+    return db.query(ListaPrecios).filter(ListaPrecios.activo == True)
+
+def _base_select():
+    # Igual que ``_base_query`` para la sesión asíncrona; ``_apply_filters`` y
+    # ``_apply_cursor`` sirven para ambas.
+    return select(ListaPrecios).filter(ListaPrecios.activo == True)
 
 @router.get("", response_model=ItemsPageOut)
-def listar_items(
-    db: Session = Depends(get_db),
+async def listar_items(
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
     q: str | None = None,
     species: str | None = None,
     branch: str | None = None,
     sort: str = "descripcion",
     page: int = Query(1, ge=1),
     page_size: int = Query(25,ge=1, le=200),
+    cursor: str | None = None,
+    count_mode: Literal["exact", "estimate"] = "exact",
+    _: None = Depends(conditional_etag("precios_lista", "items", por_usuario=False)),
 ):
-    base_query = _base_query(db)
-    filtered_query = _apply_filters(base_query, q, species, branch, sort)
-    total = filtered_query.count()
+    """Página del catálogo activo.
+
+    ``total`` sale de una caché por filtros que se vacía con cada escritura en
+    ``items`` o ``precios_lista``. Sin filtros, ``count_mode=estimate`` usa la
+    estimación del planificador. Para páginas profundas conviene seguir
+    ``next_cursor`` en lugar de incrementar ``page``.
+    """
+
+    relevancia = sort == "relevancia" and bool(q and q.strip())
+    if cursor and relevancia:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="La paginación por cursor no está disponible con sort=relevancia",
+        )
+
+    filtered_query = _apply_filters(_base_select(), q, species, branch, sort)
+
+    filter_key = _filter_key(q, species, branch)
+    total_estimated = count_mode == "estimate" and filter_key == (None, None, None)
+    if total_estimated:
+        total = await _estimate_total(db)
+    else:
+        def contar():
+            return db.scalar(
+                select(func.count()).select_from(filtered_query.order_by(None).subquery())
+            )
+
+        if watermarks.replica_atrasada(_CATALOG_TABLES):
+            # La réplica puede contar aún sin la última escritura: no cachearlo.
+            total = await contar()
+        else:
+            total = await count_cache.aget(filter_key, contar)
+
+    offset = (page - 1) * page_size
+    if cursor:
+        page_query = _apply_cursor(filtered_query, sort, cursor).limit(page_size)
+    elif offset >= DEEP_PAGE_OFFSET:
+        page_ids = (
+            filtered_query.with_only_columns(ListaPrecios.id)
+            .offset(offset)
+            .limit(page_size)
+            .subquery()
+        )
+        # Los filtros ya se aplicaron al elegir los ids: aquí solo se unen
+        # las filas de la página y se ordenan de nuevo.
+        page_query = (
+            select(ListaPrecios)
+            .join(page_ids, ListaPrecios.id == page_ids.c.id)
+            .order_by(*_order_by(q, sort))
+        )
+    else:
+        page_query = filtered_query.offset(offset).limit(page_size)
+    registros = (await db.scalars(page_query)).all()
     
-    registros = (
-        filtered_query.offset((page - 1) * page_size)
-        .limit(page_size)
-        .all()
+    items = [_serialize_item(item) for item in registros]
+    next_cursor = (
+        codificar_cursor(_cursor_values(registros[-1], sort))
+        if len(registros) == page_size and not relevancia
+        else None
     )
     
-    items = [_serialize_item(item, especie) for item, especie in registros]
-    
-    return ItemsPageOut(items=items, total=total, page=page, page_size=page_size)
+    return _RESPUESTA_PAGINA(
+        ItemsPageOut(
+            items=items,
+            total=total,
+            page=page,
+            page_size=page_size,
+            next_cursor=next_cursor,
+            total_estimated=total_estimated,
+        ),
+        response,
+    )
+
+@router.get("/autocomplete", response_model=list[CatalogoSugerenciaOut])
+def autocompletar_items(
+    q: str = Query(..., min_length=1, max_length=120),
+    especie: str | None = None,
+    limit: int = Query(10, ge=1, le=50),
+):
+    """Sugerencias por prefijo de código o texto de la descripción, desde memoria."""
+
+    especie_normalizada = (especie or "").strip().lower()
+    if especie_normalizada in ("", "todas"):
+        especie_normalizada = None
+
+    entradas = catalogo.indice().buscar(q, especie=especie_normalizada, limit=limit)
+    return [
+        CatalogoSugerenciaOut(
+            codigo_producto=entrada.codigo,
+            descripcion=entrada.descripcion,
+            especie=entrada.especie,
+            precio=float(entrada.precio) if entrada.precio is not None else None,
+            item_id=entrada.item_id,
+        )
+        for entrada in entradas
+    ]
+
+# Mismos campos y orden que ListaPreciosOut, leídos como columnas sueltas para
+# no materializar objetos ORM al exportar.
+EXPORT_COLUMNS = (
+    ("id", ListaPrecios.id, "int64"),
+    ("codigo_producto", ListaPrecios.referencia, "string"),
+    ("lista_id", ListaPrecios.lista_id, "int64"),
+    ("referencia", ListaPrecios.referencia, "string"),
+    ("location", ListaPrecios.location, "dictionary"),
+    ("sede", ListaPrecios.sede, "dictionary"),
+    ("descripcion", ListaPrecios.descripcion, "string"),
+    ("precio", ListaPrecios.precio, "decimal"),
+    ("especie", ListaPrecios.especie, "dictionary"),
+    ("fecha_vigencia", ListaPrecios.fecha_vigencia, "date"),
+    ("fecha_activacion", ListaPrecios.fecha_activacion, "date"),
+    ("unidad", ListaPrecios.unidad, "dictionary"),
+    ("fuente", ListaPrecios.source_file, "dictionary"),
+    ("file_hash", ListaPrecios.file_hash, "dictionary"),
+    ("ingested_at", ListaPrecios.ingested_at, "timestamp_tz"),
+    ("activo", ListaPrecios.activo, "bool"),
+)
+EXPORT_FIELDS = [name for name, _, _ in EXPORT_COLUMNS]
+EXPORT_CHUNK_ROWS = 1000
+
+
+def _export_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _stream_export(
+    export_format: str,
+    q: str | None,
+    species: str | None,
+    branch: str | None,
+    sort: str,
+) -> Iterator[str | bytes]:
+    """Recorrer el catálogo con un cursor del servidor, un bloque a la vez.
+
+    Abre su propia sesión porque la de ``get_read_db`` ya se cerró cuando
+    Starlette empieza a consumir el generador.
+    """
+
+    with ReadSessionLocal() as db:
+        query = _apply_filters(_base_query(db), q, species, branch, sort).with_entities(
+            *(column for _, column, _ in EXPORT_COLUMNS)
+        )
+        if export_format in columnar.MEDIA_TYPES:
+            rows = query.execution_options(yield_per=columnar.BATCH_ROWS)
+            yield from columnar.escribir(
+                export_format,
+                [columnar.Columna(name, tipo) for name, _, tipo in EXPORT_COLUMNS],
+                (tuple(row) for row in rows),
+            )
+            return
+
+        rows = query.execution_options(yield_per=EXPORT_CHUNK_ROWS)
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if export_format == "csv" else None
+        if writer is not None:
+            writer.writerow(EXPORT_FIELDS)
+
+        for index, row in enumerate(rows, start=1):
+            values = [_export_value(value) for value in row]
+            if writer is not None:
+                writer.writerow(["" if value is None else value for value in values])
+            else:
+                buffer.write(json.dumps(dict(zip(EXPORT_FIELDS, values)), ensure_ascii=False))
+                buffer.write("\n")
+            if index % EXPORT_CHUNK_ROWS == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+
+        yield buffer.getvalue()
+
 
 @router.get("/export", response_model=list[ListaPreciosOut])
 def exportar_items(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     q: str | None = None,
     species:str | None = None,
     branch: str | None = None,
     sort: str = "descripcion",
+    format: Literal["json", "csv", "ndjson", "parquet", "arrow"] = "json",
 ): 
+    if format in columnar.MEDIA_TYPES:
+        columnar.requerir_pyarrow()
+        return StreamingResponse(
+            _stream_export(format, q, species, branch, sort),
+            media_type=columnar.MEDIA_TYPES[format],
+            headers={"Content-Disposition": f'attachment; filename="items.{format}"'},
+        )
+    if format != "json":
+        media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+        return StreamingResponse(
+            _stream_export(format, q, species, branch, sort),
+            media_type=f"{media_type}; charset=utf-8",
+            headers={"Content-Disposition": f'attachment; filename="items.{format}"'},
+        )
+
     base_query = _base_query(db)
     registros = _apply_filters(base_query, q, species, branch, sort).all()
-    return [_serialize_item(item, especie) for item, especie in registros]
+    return _RESPUESTA_EXPORT([_serialize_item(item) for item in registros])
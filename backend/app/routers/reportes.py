@@ -0,0 +1,97 @@
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from ..constants import local_day_range_to_utc_naive, normalize_sede_name
+from ..database import get_read_db
+from ..dependencies import get_current_manager_user
+from ..services import valorizacion
+
+router = APIRouter(prefix="/reportes", tags=["reportes"])
+
+
+@router.get("/valorizacion", response_model=schemas.ValorizacionReporteOut)
+def obtener_reporte_valorizacion(
+    *,
+    start_date: date,
+    end_date: date,
+    sede: Optional[str] = None,
+    especie: Optional[str] = None,
+    agrupar_por: list[str] = Query(default=["sede", "especie"]),
+    db: Session = Depends(get_read_db),
+    _: models.User = Depends(get_current_manager_user),
+):
+    """Rendimiento valorizado agrupado por sede, especie y/o subcorte."""
+
+    if end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El rango de fechas es inválido",
+        )
+
+    dimensiones: list[str] = []
+    for valor in agrupar_por:
+        for dimension in valor.split(","):
+            dimension = dimension.strip().lower()
+            if not dimension:
+                continue
+            if dimension not in valorizacion.DIMENSIONES:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Solo se puede agrupar por sede, especie o subcorte",
+                )
+            if dimension not in dimensiones:
+                dimensiones.append(dimension)
+
+    sede_normalizada = None
+    if sede:
+        sede_normalizada = normalize_sede_name(sede)
+        if sede_normalizada is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="La sede no es válida. Usa una de las sedes configuradas.",
+            )
+
+    especie_normalizada: Optional[str] = None
+    if especie:
+        especie_normalizada = especie.strip().lower()
+        if especie_normalizada not in {"res", "cerdo"}:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="La especie debe ser res o cerdo",
+            )
+
+    start_dt, _ = local_day_range_to_utc_naive(start_date)
+    _, end_dt = local_day_range_to_utc_naive(end_date)
+
+    detalles = valorizacion.cargar_detalles(
+        db,
+        start_dt=start_dt,
+        end_dt=end_dt,
+        sede=sede_normalizada,
+        especie=especie_normalizada,
+    )
+    precios = valorizacion.resolver_precios(db, detalles)
+    grupos = valorizacion.agrupar(detalles, precios, dimensiones)
+
+    return schemas.ValorizacionReporteOut(
+        agrupar_por=dimensiones,
+        total_detalles=len(detalles),
+        total_peso=valorizacion.gramos_a_kg(sum(grupo.peso_g for grupo in grupos)),
+        valor_estimado=valorizacion.gramo_centavos_a_pesos(
+            sum(grupo.valor_gc for grupo in grupos)
+        ),
+        grupos=[
+            schemas.ValorizacionGrupoOut(
+                **grupo.claves,
+                detalles=grupo.detalles,
+                total_peso=valorizacion.gramos_a_kg(grupo.peso_g),
+                porcentaje_promedio=grupo.porcentaje_promedio,
+                valor_estimado=valorizacion.gramo_centavos_a_pesos(grupo.valor_gc),
+            )
+            for grupo in grupos
+        ],
+    )
@@ -1,21 +1,31 @@
 from datetime import date, datetime, timedelta, timezone
 from decimal import Decimal
-import re
-from typing import Optional
-from zoneinfo import ZoneInfo
+from typing import Iterator, Literal, Optional, Union
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import func, or_, text
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, selectinload
 
 from .. import models, schemas
-from ..constants import BRANCH_LOCATIONS
+from ..constants import APP_TIMEZONE, BRANCH_LOCATIONS, local_day_range_to_utc_naive
 from ..dependencies import (
+    conditional_etag,
     get_current_active_user,
+    get_current_active_user_async,
     get_current_admin_user,
     get_current_coordinator_user,
 )
-from ..database import get_db
+from ..database import ReadSessionLocal, get_async_db, get_db, get_read_db
+from ..responses import RespuestaJSON
+from ..services import columnar, rollups
+from ..services.precios import (
+    ContextoPrecios,
+    cargar_contexto_historico,
+    cargar_contexto_precios,
+    normalize_item_code,
+)
 
 
 router = APIRouter(
@@ -23,11 +33,13 @@ router = APIRouter(
     tags=["talleres"],
 )
 
-_WHITESPACE_RE = re.compile(r"\s+")
 _USE_PAYLOAD = object()
 _ZERO_TOLERANCE = Decimal("0.0001")
 _ALERTA_SUBCORTE_UMBRAL = Decimal("50")
-_APP_TIMEZONE = ZoneInfo("America/Bogota")
+
+_RESPUESTA_LISTADO = RespuestaJSON(list[schemas.TallerListItem])
+_RESPUESTA_CALCULO = RespuestaJSON(list[schemas.TallerCalculoRow])
+_RESPUESTA_CALCULO_BATCH = RespuestaJSON(schemas.TallerCalculoBatchOut)
 
 
 def _ensure_utc(dt: Optional[datetime]) -> Optional[datetime]:
@@ -38,37 +50,13 @@ def _ensure_utc(dt: Optional[datetime]) -> Optional[datetime]:
     return dt.astimezone(timezone.utc)
 
 
-def _local_day_range_to_utc_naive(target_date: date) -> tuple[datetime, datetime]:
-    local_start = datetime.combine(target_date, datetime.min.time(), tzinfo=_APP_TIMEZONE)
-    local_end = local_start + timedelta(days=1)
-    utc_start = local_start.astimezone(timezone.utc).replace(tzinfo=None)
-    utc_end = local_end.astimezone(timezone.utc).replace(tzinfo=None)
-    return utc_start, utc_end
-
 def _normalize_loss(value: Decimal) -> Decimal:
     return Decimal("0") if abs(value) < _ZERO_TOLERANCE else value
 
-def _normalize_item_code(codigo: str) -> str:
-    normalized = _WHITESPACE_RE.sub("", codigo.strip())
-    if normalized.isdigit():
-        trimmed = normalized.lstrip("0")
-        return trimmed or "0"
-    return normalized
-
-def _normalize_item_lookup(codigo: Optional[str]) -> Optional[str]:
-    if not codigo:
-        return None
-    return _normalize_item_code(codigo).strip().lower() or None
-
-def _normalized_db_code(col):
-    return func.lower(func.regexp_replace(func.trim(col), r"\s+", "", "g"))
-
-
-
 def _find_item_id_by_code(db: Session, codigo: Optional[str]) -> Optional[int]:
     if not codigo:
         return None
-    normalized = _normalize_item_code(codigo)
+    normalized = normalize_item_code(codigo)
     filters = [models.Item.item_code == codigo]
     if normalized != codigo:
         filters.append(func.ltrim(models.Item.item_code, "0") == normalized)
@@ -175,6 +163,15 @@ def _build_taller_from_payload(
     taller.alertas_subcorte = alertas
     return taller
 
+def _taller_load_options() -> tuple:
+    """Opciones para cargar en lote todo lo que usa ``_serialize_taller``."""
+
+    return (
+        selectinload(models.Taller.detalles),
+        selectinload(models.Taller.item_principal),
+    )
+
+
 def _serialize_taller_data(taller: models.Taller) -> dict:
     return {
         "id": taller.id,
@@ -211,6 +208,16 @@ def _serialize_taller_with_creator(
     )
 
 
+def _serialize_talleres_with_creator(
+    db: Session, talleres: list[models.Taller]
+) -> list[schemas.TallerWithCreatorOut]:
+    creador_map = _map_creadores(db, talleres)
+    return [
+        _serialize_taller_with_creator(taller, creador_map.get(taller.creado_por_id))
+        for taller in talleres
+    ]
+
+
 def _serialize_taller_grupo_with_creator(
     grupo: models.TallerGrupo,
     creador: Optional[str],
@@ -264,6 +271,8 @@ def crear_taller(
 
     try:
         db.add(taller)
+        db.flush()
+        rollups.registrar_alta(db, taller)
         db.commit()
         db.refresh(taller)
     except Exception as exc:  # pragma: no cover - defensive rollback
@@ -360,6 +369,9 @@ def crear_taller_completo(
 
     try:
         db.add(grupo)
+        db.flush()
+        for taller in grupo.materiales:
+            rollups.registrar_alta(db, taller)
         db.commit()
         db.refresh(grupo)
     except Exception as exc:  # pragma: no cover - defensive rollback
@@ -393,6 +405,8 @@ def eliminar_taller_completo(
         )
 
     try:
+        for taller in grupo.materiales:
+            rollups.registrar_baja(db, taller)
         db.delete(grupo)
         db.commit()
     except Exception as exc:  # pragma: no cover - defensive rollback
@@ -407,8 +421,9 @@ def eliminar_taller_completo(
 
 @router.get("/completos", response_model=list[schemas.TallerGrupoListItem])
 def listar_talleres_completos(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     _: models.User = Depends(get_current_active_user),
+    __: None = Depends(conditional_etag("talleres_grupo", "talleres")),
 ):
     grupos = (
         db.query(models.TallerGrupo)
@@ -433,12 +448,14 @@ def listar_talleres_completos(
 @router.get("/completos/{grupo_id}", response_model=schemas.TallerGrupoOut)
 def obtener_taller_completo(
     grupo_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     _: models.User = Depends(get_current_active_user),
 ):
     grupo = (
         db.query(models.TallerGrupo)
-        .options(selectinload(models.TallerGrupo.materiales).selectinload(models.Taller.detalles))
+        .options(
+            selectinload(models.TallerGrupo.materiales).options(*_taller_load_options())
+        )
         .filter(models.TallerGrupo.id == grupo_id)
         .one_or_none()
     )
@@ -461,24 +478,16 @@ def obtener_taller_completo(
 
     
 
-@router.get("/historial", response_model=list[schemas.TallerGrupoWithCreatorOut])
-def listar_historial_talleres(
+def _historial_query(
+    db: Session,
     *,
-    search: Optional[str] = None,
-    sede: Optional[str] = None,
-    especie: Optional[str] = None,
-    start_date: Optional[date] = None,
-    end_date: Optional[date] = None,
-    codigo_item: Optional[str] = None,
-    db: Session = Depends(get_db),
-    _: models.User = Depends(get_current_admin_user),
+    search: Optional[str],
+    sede: Optional[str],
+    especie: Optional[str],
+    start_date: Optional[date],
+    end_date: Optional[date],
+    codigo_item: Optional[str],
 ):
-    if start_date and end_date and end_date < start_date:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="El rango de fechas es inválido",
-        )
-
     query = (
         db.query(models.TallerGrupo)
         .outerjoin(models.TallerGrupo.materiales)
@@ -540,9 +549,119 @@ def listar_historial_talleres(
     if end_dt:
         query = query.filter(models.TallerGrupo.creado_en < end_dt)
 
+    return query
+
+
+HISTORIAL_COLUMNAS = [
+    columnar.Columna("grupo_id", "int64"),
+    columnar.Columna("grupo_nombre", "string"),
+    columnar.Columna("taller_id", "int64"),
+    columnar.Columna("nombre_taller", "string"),
+    columnar.Columna("sede", "dictionary"),
+    columnar.Columna("especie", "dictionary"),
+    columnar.Columna("codigo_principal", "string"),
+    columnar.Columna("creado_en", "timestamp"),
+    columnar.Columna("creado_por", "dictionary"),
+    columnar.Columna("peso_inicial", "decimal"),
+    columnar.Columna("peso_final", "decimal"),
+    columnar.Columna("porcentaje_perdida", "decimal"),
+    columnar.Columna("subcortes", "int64"),
+    columnar.Columna("peso_subcortes", "decimal"),
+]
+
+
+def _stream_historial_columnar(formato: str, filtros: dict) -> Iterator[bytes]:
+    """Una fila por taller de los grupos que cumplen los filtros del historial.
+
+    Usa su propia sesión: la de ``get_read_db`` ya se cerró cuando empieza el envío.
+    """
+
+    with ReadSessionLocal() as db:
+        grupo_ids = (
+            _historial_query(db, **filtros)
+            .with_entities(models.TallerGrupo.id)
+            .distinct()
+            .subquery()
+        )
+        detalles = (
+            db.query(
+                models.TallerDetalle.taller_id.label("taller_id"),
+                func.count(models.TallerDetalle.id).label("subcortes"),
+                func.sum(models.TallerDetalle.peso).label("peso"),
+            )
+            .group_by(models.TallerDetalle.taller_id)
+            .subquery()
+        )
+        filas = (
+            db.query(
+                models.TallerGrupo.id,
+                models.TallerGrupo.nombre_taller,
+                models.Taller.id,
+                models.Taller.nombre_taller,
+                func.coalesce(models.Taller.sede, models.TallerGrupo.sede),
+                func.lower(func.coalesce(models.Taller.especie, models.TallerGrupo.especie)),
+                models.Taller.codigo_principal,
+                models.TallerGrupo.creado_en,
+                func.coalesce(models.User.full_name, models.User.username),
+                models.Taller.peso_inicial,
+                models.Taller.peso_final,
+                models.Taller.porcentaje_perdida,
+                func.coalesce(detalles.c.subcortes, 0),
+                detalles.c.peso,
+            )
+            .join(models.Taller, models.Taller.taller_grupo_id == models.TallerGrupo.id)
+            .outerjoin(models.User, models.User.id == models.TallerGrupo.creado_por_id)
+            .outerjoin(detalles, detalles.c.taller_id == models.Taller.id)
+            .filter(models.TallerGrupo.id.in_(db.query(grupo_ids.c.id)))
+            .order_by(models.TallerGrupo.creado_en.desc(), models.Taller.id)
+            .execution_options(yield_per=columnar.BATCH_ROWS)
+        )
+        yield from columnar.escribir(
+            formato, HISTORIAL_COLUMNAS, (tuple(fila) for fila in filas)
+        )
+
+
+@router.get("/historial", response_model=list[schemas.TallerGrupoWithCreatorOut])
+def listar_historial_talleres(
+    *,
+    search: Optional[str] = None,
+    sede: Optional[str] = None,
+    especie: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    codigo_item: Optional[str] = None,
+    format: Literal["json", "parquet", "arrow"] = "json",
+    db: Session = Depends(get_read_db),
+    _: models.User = Depends(get_current_admin_user),
+):
+    if start_date and end_date and end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El rango de fechas es inválido",
+        )
+
+    filtros = {
+        "search": search,
+        "sede": sede,
+        "especie": especie,
+        "start_date": start_date,
+        "end_date": end_date,
+        "codigo_item": codigo_item,
+    }
+    if format != "json":
+        columnar.requerir_pyarrow()
+        return StreamingResponse(
+            _stream_historial_columnar(format, filtros),
+            media_type=columnar.MEDIA_TYPES[format],
+            headers={
+                "Content-Disposition": f'attachment; filename="talleres_historial.{format}"'
+            },
+        )
+
+    query = _historial_query(db, **filtros)
     grupos = (
         query.options(
-            selectinload(models.TallerGrupo.materiales).selectinload(models.Taller.detalles)
+            selectinload(models.TallerGrupo.materiales).options(*_taller_load_options())
         )
         .order_by(models.TallerGrupo.creado_en.desc())
         .distinct()
@@ -559,26 +678,32 @@ def listar_historial_talleres(
     ]
     
 @router.get("", response_model=list[schemas.TallerListItem])
-def listar_talleres(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_active_user),
+async def listar_talleres(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_active_user_async),
 ):
     """Listar los talleres con la sumatoria de sus subcortes."""
 
-    talleres = (
-        db.query(models.Taller)
-        .options(selectinload(models.Taller.detalles))
-        .order_by(models.Taller.creado_en.desc())
-        .all()
+    pesos_detalle = (
+        select(
+            models.TallerDetalle.taller_id.label("taller_id"),
+            func.sum(models.TallerDetalle.peso).label("peso"),
+        )
+        .group_by(models.TallerDetalle.taller_id)
+        .subquery()
     )
+    talleres = (
+        await db.execute(
+            select(models.Taller, pesos_detalle.c.peso)
+            .outerjoin(pesos_detalle, pesos_detalle.c.taller_id == models.Taller.id)
+            .order_by(models.Taller.creado_en.desc())
+        )
+    ).all()
 
     listado: list[schemas.TallerListItem] = []
 
-    for taller in talleres:
-        total_detalles = sum(
-            (detalle.peso or Decimal("0")) for detalle in taller.detalles
-        )
-        total_peso = (taller.peso_final or Decimal("0")) + total_detalles
+    for taller, total_detalles in talleres:
+        total_peso = (taller.peso_final or Decimal("0")) + (total_detalles or Decimal("0"))
 
         listado.append(
             schemas.TallerListItem(
@@ -597,132 +722,44 @@ def listar_talleres(
             )
         )
 
-    return listado
+    return _RESPUESTA_LISTADO(listado)
+
+def _fecha_local(dt: Optional[datetime]) -> date:
+    if dt is None:
+        return datetime.now(APP_TIMEZONE).date()
+    return _ensure_utc(dt).astimezone(APP_TIMEZONE).date()
 
-@router.get("/{taller_id}/calculo", response_model=list[schemas.TallerCalculoRow])
-def obtener_calculo_taller(
-    taller_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_active_user),
-):
-    taller = db.get(models.Taller, taller_id)
-    if taller is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="El taller solicitado no existe",
-        )
 
+def _build_calculo_rows(
+    taller: models.Taller,
+    contexto: ContextoPrecios,
+    as_of: Union[Literal["taller"], date, None] = None,
+) -> list[schemas.TallerCalculoRow]:
     peso_inicial = Decimal(taller.peso_inicial or Decimal("0"))
     if peso_inicial < 0:
         peso_inicial = Decimal("0")
 
-    calculo: list[schemas.TallerCalculoRow] = []
-    codigos_producto = {
-        detalle.codigo_producto
-        for detalle in taller.detalles
-        if detalle.codigo_producto
-    }
-    codigos_normalizados = {
-        normalized
-        for codigo in codigos_producto
-        if (normalized := _normalize_item_lookup(codigo))
-    }
-    nombres_subcorte = {
-        detalle.nombre_subcorte.strip()
-        for detalle in taller.detalles
-        if detalle.nombre_subcorte and detalle.nombre_subcorte.strip()
-    }
-    items_por_codigo = {}
-    if codigos_normalizados:
-        normalized_item_code = _normalized_db_code(models.Item.item_code)
-        items_por_codigo = {
-            _normalize_item_lookup(item.item_code): item
-            for item in db.query(models.Item)
-            .filter(
-                or_(
-                    normalized_item_code.in_(codigos_normalizados),
-                    func.ltrim(normalized_item_code, "0").in_(codigos_normalizados),
-                )
-            )
-            .all()
-            if item.item_code
-        }
-        
-    def _prefer_min_precio(
-        existing: models.ListaPrecios | None, candidate: models.ListaPrecios
-    ) -> models.ListaPrecios:
-        if existing is None:
-            return candidate
-        if existing.precio is None and candidate.precio is not None:
-            return candidate
-        if existing.precio is None or candidate.precio is None:
-            return existing
-        return candidate if Decimal(candidate.precio) < Decimal(existing.precio) else existing
-    lista_precios_por_codigo: dict[str, models.ListaPrecios] = {}
-    if codigos_normalizados:
-        normalized_referencia = _normalized_db_code(models.ListaPrecios.referencia)
-        lista_precios = (
-            db.query(models.ListaPrecios)
-            .filter(models.ListaPrecios.activo.is_(True))
-            .filter(
-                or_(
-                    normalized_referencia.in_(codigos_normalizados),
-                    func.ltrim(normalized_referencia, "0").in_(codigos_normalizados),
-                )
-            )
-            .order_by(models.ListaPrecios.fecha_vigencia.desc().nullslast())
-            .all()
-        )
-        for registro in lista_precios:
-            key = _normalize_item_lookup(registro.referencia)
-            lista_precios_por_codigo[key] = _prefer_min_precio(
-                lista_precios_por_codigo.get(key), registro
-            )
+    fecha_precios: Optional[date] = None
+    if as_of == "taller":
+        fecha_precios = _fecha_local(taller.creado_en)
+    elif as_of is not None:
+        fecha_precios = as_of
 
-    lista_precios_por_nombre: dict[str, models.ListaPrecios] = {}
-    if nombres_subcorte:
-        nombres_normalizados = {nombre.strip().lower() for nombre in nombres_subcorte if nombre.strip()}
-        if nombres_normalizados:
-            lista_precios = (
-                db.query(models.ListaPrecios)
-                .filter(models.ListaPrecios.activo.is_(True))
-                .filter(
-                    or_(
-                        func.lower(models.ListaPrecios.descripcion).in_(nombres_normalizados),
-                        func.lower(models.ListaPrecios.referencia).in_(nombres_normalizados),
-                    )
-                )
-                .order_by(models.ListaPrecios.fecha_vigencia.desc().nullslast())
-                .all()
-            )
-            for registro in lista_precios:
-                descripcion_key = registro.descripcion.strip().lower() if registro.descripcion else ""
-                referencia_key = registro.referencia.strip().lower() if registro.referencia else ""
-                for key in (descripcion_key, referencia_key):
-                    if not key:
-                        continue
-                    lista_precios_por_nombre[key] = _prefer_min_precio(
-                        lista_precios_por_nombre.get(key), registro
-                    )
+    calculo: list[schemas.TallerCalculoRow] = []
     for detalle in taller.detalles:
         peso = Decimal(detalle.peso or Decimal("0"))
         porcentaje_real = (
             (peso / peso_inicial * Decimal("100")) if peso_inicial > 0 else Decimal("0")
         )
         codigo_detalle = detalle.codigo_producto.strip() if detalle.codigo_producto else ""
-        codigo_normalizado = _normalize_item_lookup(codigo_detalle) or ""
-        item = (
-            db.get(models.Item, detalle.item_id)
-            if detalle.item_id
-            else items_por_codigo.get(codigo_normalizado)
+        item, lista_precio = contexto.resolver(
+            detalle, sede=taller.sede, fecha=fecha_precios
         )
-        lista_precio = None
-        if codigo_normalizado:
-            lista_precio = lista_precios_por_codigo.get(codigo_normalizado)
-        if not lista_precio and detalle.nombre_subcorte:
-            lista_precio = lista_precios_por_nombre.get(detalle.nombre_subcorte.strip().lower())
 
-        if item and item.precio_venta is not None:
+        if fecha_precios is not None and lista_precio and lista_precio.precio is not None:
+            # El precio de venta del ítem es el actual; a una fecha manda la lista.
+            precio_venta = Decimal(lista_precio.precio)
+        elif item and item.precio_venta is not None:
             precio_venta = Decimal(item.precio_venta)
         elif lista_precio and lista_precio.precio is not None:
             precio_venta = Decimal(lista_precio.precio)
@@ -751,16 +788,100 @@ def obtener_calculo_taller(
 
     return calculo
 
+
+@router.post("/calculo/batch", response_model=schemas.TallerCalculoBatchOut)
+def obtener_calculo_talleres_batch(
+    payload: schemas.TallerCalculoBatchRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """Valorizar varios talleres con una sola carga de detalles, ítems y precios."""
+
+    if not (payload.taller_ids or payload.taller_grupo_id or payload.sede or payload.start_date):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Debes indicar talleres, un taller completo o una sede y rango de fechas",
+        )
+    if (payload.start_date is None) != (payload.end_date is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El rango de fechas debe incluir inicio y fin",
+        )
+    if payload.start_date and payload.end_date and payload.end_date < payload.start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El rango de fechas es inválido",
+        )
+
+    query = db.query(models.Taller).options(selectinload(models.Taller.detalles))
+    if payload.taller_ids:
+        query = query.filter(models.Taller.id.in_(set(payload.taller_ids)))
+    if payload.taller_grupo_id:
+        query = query.filter(models.Taller.taller_grupo_id == payload.taller_grupo_id)
+    if payload.sede:
+        query = query.filter(models.Taller.sede == payload.sede)
+    if payload.start_date and payload.end_date:
+        start_dt, _ = local_day_range_to_utc_naive(payload.start_date)
+        _, end_dt = local_day_range_to_utc_naive(payload.end_date)
+        query = query.filter(models.Taller.creado_en >= start_dt)
+        query = query.filter(models.Taller.creado_en < end_dt)
+
+    talleres = query.order_by(models.Taller.id).all()
+    cargar = cargar_contexto_historico if payload.as_of else cargar_contexto_precios
+    contexto = cargar(db, (detalle for taller in talleres for detalle in taller.detalles))
+
+    calculos: dict[int, list[schemas.TallerCalculoRow]] = {}
+    totales_por_grupo: dict[int, Decimal] = {}
+    total_general = Decimal("0")
+    for taller in talleres:
+        filas = _build_calculo_rows(taller, contexto, payload.as_of)
+        calculos[taller.id] = filas
+        total_taller = sum((fila.valor_estimado for fila in filas), Decimal("0"))
+        total_general += total_taller
+        if taller.taller_grupo_id:
+            totales_por_grupo[taller.taller_grupo_id] = (
+                totales_por_grupo.get(taller.taller_grupo_id, Decimal("0")) + total_taller
+            )
+
+    return _RESPUESTA_CALCULO_BATCH(
+        schemas.TallerCalculoBatchOut(
+            talleres=calculos,
+            totales_por_grupo=totales_por_grupo,
+            total_valor_estimado=total_general,
+        )
+    )
+
+
+@router.get("/{taller_id}/calculo", response_model=list[schemas.TallerCalculoRow])
+def obtener_calculo_taller(
+    taller_id: int,
+    as_of: Union[Literal["taller"], date, None] = None,
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    taller = db.get(models.Taller, taller_id)
+    if taller is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="El taller solicitado no existe",
+        )
+
+    if as_of is None:
+        contexto = cargar_contexto_precios(db, taller.detalles)
+    else:
+        contexto = cargar_contexto_historico(db, taller.detalles)
+    return _RESPUESTA_CALCULO(_build_calculo_rows(taller, contexto, as_of))
+
 @router.get("/actividad/detalle", response_model=list[schemas.TallerOut])
 def obtener_detalle_actividad(
     *,
     userId: int,
     fecha: date,
     especie: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_active_user),
 ):
-    start_dt, end_dt = _local_day_range_to_utc_naive(fecha)
+    start_dt, end_dt = local_day_range_to_utc_naive(fecha)
 
     especie_normalizada: Optional[str] = None
     if especie:
@@ -773,6 +894,7 @@ def obtener_detalle_actividad(
 
     query = (
         db.query(models.Taller)
+        .options(*_taller_load_options())
         .filter(models.Taller.creado_por_id == userId)
         .filter(models.Taller.creado_en >= start_dt)
         .filter(models.Taller.creado_en < end_dt)
@@ -787,13 +909,13 @@ def obtener_detalle_actividad(
 
     
 @router.get("/actividad", response_model=list[schemas.TallerActividadUsuarioOut])
-def obtener_actividad_talleres(
+async def obtener_actividad_talleres(
     *,
     startDate: date,
     endDate: date,
     especie: Optional[str] = None,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_active_user_async),
 ):
     if endDate < startDate:
         raise HTTPException(
@@ -817,15 +939,13 @@ def obtener_actividad_talleres(
         normalized = value.strip()
         return normalized or None
         
-    start_dt, _ = _local_day_range_to_utc_naive(startDate)
-    _, end_dt = _local_day_range_to_utc_naive(endDate)
-    
     usuarios_activos = (
-        db.query(models.User)
-        .filter(models.User.is_active.is_(True))
-        .order_by(models.User.sede, models.User.username)
-        .all()
-    )
+        await db.scalars(
+            select(models.User)
+            .filter(models.User.is_active.is_(True))
+            .order_by(models.User.sede, models.User.username)
+        )
+    ).all()
 
     actividad: dict[tuple[int, str | None], dict] = {}
     user_map = {user.id: user for user in usuarios_activos}
@@ -841,54 +961,45 @@ def obtener_actividad_talleres(
                 "dias": [],
             }
 
-    sede_resuelta = func.coalesce(
-        func.nullif(func.trim(models.Taller.sede), ""),
-        func.nullif(func.trim(models.User.sede), ""),
-    )
-    # creado_en is stored as UTC-naive; shift to local UTC-5 for calendar-day tracking in seguimiento.
-    created_local_expr = models.Taller.creado_en - text("INTERVAL '5 hours'")
-
+    rollup = models.TallerActividadDiaria
     rows_query = (
-        db.query(
-            models.User.id.label("user_id"),
-            sede_resuelta.label("sede"),
-            func.date(created_local_expr).label("fecha"),
-            func.count(models.Taller.id).label("cantidad"),
+        select(
+            rollup.user_id.label("user_id"),
+            rollup.sede.label("sede"),
+            rollup.local_date.label("fecha"),
+            func.sum(rollup.cantidad).label("cantidad"),
         )
-        .join(models.Taller, models.Taller.creado_por_id == models.User.id)
-        .filter(models.Taller.creado_en >= start_dt)
-        .filter(models.Taller.creado_en < end_dt)
+        .join(models.User, models.User.id == rollup.user_id)
+        .filter(rollup.local_date >= startDate)
+        .filter(rollup.local_date <= endDate)
+        .filter(rollup.cantidad > 0)
         .filter(models.User.is_active.is_(True))
-        .filter(sede_resuelta.isnot(None))
     )
 
     if especie_normalizada:
-        rows_query = rows_query.filter(
-            func.lower(models.Taller.especie) == especie_normalizada
-        )
+        rows_query = rows_query.filter(rollup.especie == especie_normalizada)
 
     rows = (
-        rows_query.group_by(
-            models.User.id,
-            sede_resuelta,
-            func.date(created_local_expr),
-        )
-        .order_by(
-            sede_resuelta,
-            models.User.username,
-            func.date(created_local_expr),
+        await db.execute(
+            rows_query.group_by(
+                rollup.user_id,
+                models.User.username,
+                rollup.sede,
+                rollup.local_date,
+            ).order_by(
+                rollup.sede,
+                models.User.username,
+                rollup.local_date,
+            )
         )
-        .all()
-    )
+    ).all()
     for row in rows:
         user = user_map.get(row.user_id)
         if user is None:
             continue
 
+        # Los talleres sin sede se agregan bajo la sede vacía.
         sede_row = _normalizar_sede(row.sede)
-        if sede_row is None:
-            continue
-
         key = (row.user_id, sede_row)
         if key not in actividad:
             actividad[key] = {
@@ -909,23 +1020,22 @@ def obtener_actividad_talleres(
 @router.get("/{taller_id}", response_model=schemas.TallerWithCreatorOut)
 def obtener_taller_por_id(
     taller_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     _: models.User = Depends(get_current_admin_user),
 ):
-    taller = db.get(models.Taller, taller_id)
+    taller = (
+        db.query(models.Taller)
+        .options(*_taller_load_options())
+        .filter(models.Taller.id == taller_id)
+        .one_or_none()
+    )
     if taller is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="El taller solicitado no existe",
         )
 
-    creador = None
-    if taller.creado_por_id:
-        creador_usuario = db.get(models.User, taller.creado_por_id)
-        if creador_usuario:
-            creador = (creador_usuario.full_name or creador_usuario.username or "").strip()
-
-    return _serialize_taller_with_creator(taller, creador)
+    return _serialize_talleres_with_creator(db, [taller])[0]
 
 
 @router.put("/{taller_id}", response_model=schemas.TallerWithCreatorOut)
@@ -959,6 +1069,8 @@ def actualizar_taller(
         db, payload.codigo_principal
     )
 
+    rollups.registrar_baja(db, taller)
+
     taller.nombre_taller = payload.nombre_taller
     taller.descripcion = payload.descripcion
     taller.sede = payload.sede or taller.sede
@@ -995,6 +1107,8 @@ def actualizar_taller(
         if taller.grupo is not None:
             db.add(taller.grupo)
         db.add(taller)
+        db.flush()
+        rollups.registrar_alta(db, taller)
         db.commit()
         db.refresh(taller)
     except Exception as exc:  # pragma: no cover - defensive rollback
@@ -1004,9 +1118,7 @@ def actualizar_taller(
             detail="No se pudo actualizar el taller",
         ) from exc
 
-    creador_map = _map_creadores(db, [taller])
-    creador = creador_map.get(taller.creado_por_id)
-    return _serialize_taller_with_creator(taller, creador)
+    return _serialize_talleres_with_creator(db, [taller])[0]
 
 
 @router.delete("/{taller_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -1023,6 +1135,7 @@ def eliminar_taller(
         )
 
     try:
+        rollups.registrar_baja(db, taller)
         db.delete(taller)
         db.commit()
     except Exception as exc:  # pragma: no cover - defensive rollback
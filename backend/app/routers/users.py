@@ -4,8 +4,8 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
 from .. import crud, models
-from ..database import get_db
-from ..dependencies import get_current_admin_user, get_current_user_admin
+from ..database import get_db, get_read_db
+from ..dependencies import get_current_admin_user, get_current_user_admin, user_cache
 from ..schemas import AdminUserOut, UserAdminCreate, UserUpdate
 from ..security import get_password_hash
 
@@ -21,7 +21,7 @@ def _is_operario(user: models.User) -> bool:
 
 @router.get("", response_model=List[AdminUserOut])
 def list_users(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_admin: models.User = Depends(get_current_user_admin),
 ) -> List[AdminUserOut]:
     if current_admin.is_admin:
@@ -156,6 +156,10 @@ def update_user(
         is_branch_admin=payload.is_branch_admin,
         sede=payload.sede,
     )
+    if payload.password or payload.is_active is False:
+        # Cierra las sesiones abiertas: sus refresh tokens dejan de servir.
+        crud.revoke_refresh_tokens(db, user_id=updated_user.id)
+    user_cache.invalidate(updated_user.id)
     return updated_user
 
 
@@ -191,3 +195,4 @@ def delete_user(
         )
         
     crud.delete_user(db, user)
+    user_cache.invalidate(user_id)
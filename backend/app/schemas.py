@@ -1,5 +1,5 @@
 from datetime import date, datetime
-from typing import Annotated, Optional
+from typing import Annotated, Literal, Optional, Union
 from decimal import Decimal
 from pydantic import BaseModel, ConfigDict, EmailStr, condecimal, field_validator
 
@@ -87,6 +87,39 @@ class DashboardStats(BaseModel):
     usuarios_activos: DashboardMetric
 
 
+class DashboardSeriesPoint(BaseModel):
+    bucket_start: datetime
+    value: Decimal
+
+
+class DashboardSeriesOut(BaseModel):
+    metric: str
+    bucket: str
+    points: list[DashboardSeriesPoint]
+
+
+class SnapshotCacheStats(BaseModel):
+    name: str
+    hits: int
+    misses: int
+    refreshes: int
+    invalidations: int
+    warm: bool
+    age_seconds: float | None = None
+
+
+class PoolStats(BaseModel):
+    name: str
+    size: int
+    checked_out: int
+    overflow: int
+    checkouts: int
+    timeouts: int
+    wait_seconds_total: float
+    wait_ms_max: float
+    wait_ms_buckets: dict[str, int]
+
+
 class UserBase(BaseModel):
     username: str
     email: Optional[EmailStr] = None
@@ -227,11 +260,34 @@ class UserUpdate(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None
+
+
+class StreamTicket(BaseModel):
+    ticket: str
+    expires_in: int
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 
 class TokenPayload(BaseModel):
     sub: int
     exp: Optional[int] = None
+    iat: Optional[int] = None
+    # "refresh" en refresh tokens y "stream" en tickets de SSE; los access
+    # tokens no lo llevan.
+    typ: Optional[str] = None
+    jti: Optional[str] = None
+    # Access tokens: refresh token de la sesión y datos para autorizar sin base.
+    sid: Optional[str] = None
+    username: Optional[str] = None
+    sede: Optional[str] = None
+    roles: Optional[list[str]] = None
+    # Tickets de stream: vencimiento del access token que los pidió.
+    session_exp: Optional[int] = None
     model_config = ConfigDict(extra="ignore")
     
     
@@ -260,6 +316,16 @@ class ItemsPageOut(BaseModel):
     total: int
     page: int
     page_size: int
+    next_cursor: str | None = None
+    total_estimated: bool = False
+
+
+class CatalogoSugerenciaOut(BaseModel):
+    codigo_producto: str
+    descripcion: str
+    especie: str | None = None
+    precio: float | None = None
+    item_id: int | None = None
 
 
 class TallerDetalleCreate(BaseModel):
@@ -512,8 +578,58 @@ class TallerCalculoRow(BaseModel):
     valor_estimado: Decimal
     
     model_config = ConfigDict(from_attributes=True)
+
+
+class TallerCalculoBatchRequest(BaseModel):
+    taller_ids: Optional[list[int]] = None
+    taller_grupo_id: Optional[int] = None
+    sede: Optional[str] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    # Fecha de los precios: un día fijo o "taller" para la fecha de cada taller.
+    as_of: Optional[Union[Literal["taller"], date]] = None
+
+    model_config = ConfigDict(extra="forbid")
+
+    @field_validator("sede")
+    @classmethod
+    def _validate_sede(cls, value: Optional[str]) -> Optional[str]:
+        if value is None:
+            return value
+
+        from .constants import normalize_sede_name
+
+        normalized = normalize_sede_name(value)
+        if value.strip() and normalized is None:
+            raise ValueError("La sede no es valida. Usa una de las sedes configuradas.")
+
+        return normalized
+
+
+class TallerCalculoBatchOut(BaseModel):
+    talleres: dict[int, list[TallerCalculoRow]]
+    totales_por_grupo: dict[int, Decimal]
+    total_valor_estimado: Decimal
     
     
+class ValorizacionGrupoOut(BaseModel):
+    sede: Optional[str] = None
+    especie: Optional[str] = None
+    subcorte: Optional[str] = None
+    detalles: int
+    total_peso: Decimal
+    porcentaje_promedio: Decimal
+    valor_estimado: Decimal
+
+
+class ValorizacionReporteOut(BaseModel):
+    agrupar_por: list[str]
+    total_detalles: int
+    total_peso: Decimal
+    valor_estimado: Decimal
+    grupos: list[ValorizacionGrupoOut]
+
+
 class InventarioItem(BaseModel):
     codigo_producto: str
     descripcion: str
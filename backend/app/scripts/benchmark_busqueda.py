@@ -0,0 +1,144 @@
+"""Mide la búsqueda del catálogo de precios con y sin índices trigram.
+
+Inserta filas sintéticas en ``precios_lista`` dentro de una transacción,
+ejecuta las consultas de ``/items`` con ``EXPLAIN ANALYZE`` y al final hace
+``ROLLBACK``: la base queda como estaba. Con ``--historial`` también revisa que
+la búsqueda de precios por código de ``cargar_contexto_historico`` use
+``ix_precios_lista_codigo_vigencia``.
+
+Uso::
+
+    python -m app.scripts.benchmark_busqueda --filas 500000 --q lomo --q 12345
+    python -m app.scripts.benchmark_busqueda --filas 500000 --historial
+"""
+import argparse
+import json
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from ..database import SessionLocal
+from ..db_migrations import crear_indices_trigram
+from ..routers.items import _apply_filters, _base_query
+from ..services import busqueda
+from ..services.precios import _historial_por_codigo
+
+_PALABRAS = (
+    "lomo", "costilla", "pierna", "brazo", "tocino", "chuleta", "pecho",
+    "falda", "morrillo", "punta", "cadera", "solomito", "murillo", "paleta",
+)
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark de búsqueda en precios_lista")
+    parser.add_argument("--filas", type=int, default=500_000, help="Filas sintéticas a insertar")
+    parser.add_argument(
+        "--q",
+        action="append",
+        dest="terminos",
+        help="Término a buscar; se puede repetir (por defecto: lomo, cost, 4321)",
+    )
+    parser.add_argument("--sort", default="descripcion", help="Orden de /items (p. ej. relevancia)")
+    parser.add_argument(
+        "--historial",
+        action="store_true",
+        help="Revisar el plan de la consulta de precios históricos por código",
+    )
+    return parser.parse_args()
+
+
+def _insertar_filas(db, filas: int) -> None:
+    palabras = "ARRAY[" + ", ".join(f"'{palabra}'" for palabra in _PALABRAS) + "]"
+    db.execute(
+        text(
+            "INSERT INTO precios_lista "
+            "(location, sede, lista_id, referencia, descripcion, precio, activo) "
+            "SELECT 'Bench ' || (n % 12), 'Bench ' || (n % 12), 1, "
+            "'B' || LPAD(n::text, 7, '0'), "
+            f"INITCAP(({palabras})[1 + n % {len(_PALABRAS)}] || ' ' || "
+            f"({palabras})[1 + (n / {len(_PALABRAS)}) % {len(_PALABRAS)}] || ' ' || n), "
+            "(n % 50000) + 1000, n % 10 <> 0 "
+            "FROM generate_series(1, :filas) AS n"
+        ),
+        {"filas": filas},
+    )
+    db.execute(text("ANALYZE precios_lista"))
+
+
+def _explain(db, sql: str) -> tuple[float, bool]:
+    plan = db.execute(text(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    texto = json.dumps(plan)
+    return plan[0]["Execution Time"], "_trgm" in texto
+
+
+def _explain_historial(db) -> tuple[float, bool]:
+    # Con parámetros y no con ``literal_binds``: el literal del patrón
+    # ``\s+`` se escaparía distinto y ya no coincidiría con el índice.
+    consulta = _historial_por_codigo([f"b{n:07d}" for n in range(1000, 1050)])
+    compilada = consulta.compile(
+        dialect=db.get_bind().dialect, compile_kwargs={"render_postcompile": True}
+    )
+    plan = (
+        db.connection()
+        .exec_driver_sql(f"EXPLAIN (ANALYZE, FORMAT JSON) {compilada}", compilada.params)
+        .scalar()
+    )
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Execution Time"], "ix_precios_lista_codigo_vigencia" in json.dumps(plan)
+
+
+def _sql(query) -> str:
+    return str(
+        query.statement.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+    )
+
+
+def main() -> None:
+    args = _parse_args()
+    terminos = args.terminos or ["lomo", "cost", "4321"]
+
+    with SessionLocal() as db:
+        busqueda.habilitar_trigram(db.connection())
+        print(f"pg_trgm disponible: {busqueda.trigram_disponible}")
+        print(f"Insertando {args.filas} filas sintéticas...")
+        _insertar_filas(db, args.filas)
+        if busqueda.trigram_disponible:
+            crear_indices_trigram(db.connection())
+
+        try:
+            for termino in terminos:
+                filtrada = _apply_filters(_base_query(db), termino, None, None, args.sort)
+                pagina = _sql(filtrada.limit(25))
+                conteo = _sql(filtrada.order_by(None).with_entities(text("count(*)")))
+
+                for nombre, sql in (("página", pagina), ("conteo", conteo)):
+                    con_indice, usa_indice = _explain(db, sql)
+                    db.execute(text("SET LOCAL enable_bitmapscan = off"))
+                    db.execute(text("SET LOCAL enable_indexscan = off"))
+                    sin_indice, _ = _explain(db, sql)
+                    db.execute(text("RESET enable_bitmapscan"))
+                    db.execute(text("RESET enable_indexscan"))
+                    print(
+                        f"q={termino!r:<10} {nombre:<7} "
+                        f"con índices {con_indice:9.1f} ms "
+                        f"({'trigram' if usa_indice else 'sin trigram'}), "
+                        f"secuencial {sin_indice:9.1f} ms"
+                    )
+
+            if args.historial:
+                duracion, usa_indice = _explain_historial(db)
+                print(
+                    f"historial por código {duracion:9.1f} ms "
+                    f"({'usa' if usa_indice else 'NO usa'} ix_precios_lista_codigo_vigencia)"
+                )
+        finally:
+            db.rollback()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Elige el ``time_cost`` de argon2 para un tiempo objetivo en esta máquina.
+
+Con la memoria y el paralelismo fijos, sube ``time_cost`` hasta que un hash
+tarda al menos ``--objetivo-ms`` y muestra las variables de entorno a copiar
+en ``.env``. Conviene correrlo en el mismo tipo de servidor que la API: los
+hashes existentes se rehacen con los nuevos parámetros en el siguiente inicio
+de sesión de cada usuario.
+
+Uso::
+
+    python -m app.scripts.calibrar_argon2 --objetivo-ms 250 --memoria 65536
+"""
+import argparse
+import statistics
+import time
+
+from passlib.hash import argon2
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Calibra los parámetros de argon2")
+    parser.add_argument("--objetivo-ms", type=float, default=250.0, help="Tiempo por hash buscado")
+    parser.add_argument("--memoria", type=int, default=65536, help="memory_cost en KiB")
+    parser.add_argument("--paralelismo", type=int, default=4, help="Hilos por hash")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Hashes medidos por punto")
+    parser.add_argument("--max-time-cost", type=int, default=20)
+    return parser.parse_args()
+
+
+def _medir_ms(time_cost: int, memoria: int, paralelismo: int, repeticiones: int) -> float:
+    hasher = argon2.using(rounds=time_cost, memory_cost=memoria, parallelism=paralelismo)
+    hasher.hash("calibracion")  # calentamiento
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        hasher.hash("calibracion")
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+
+def main() -> None:
+    args = _parse_args()
+    elegido, ms = 1, 0.0
+    for time_cost in range(1, args.max_time_cost + 1):
+        ms = _medir_ms(time_cost, args.memoria, args.paralelismo, args.repeticiones)
+        print(f"time_cost={time_cost:>2}  {ms:8.1f} ms")
+        elegido = time_cost
+        if ms >= args.objetivo_ms:
+            break
+
+    print()
+    print(f"ARGON2_TIME_COST={elegido}")
+    print(f"ARGON2_MEMORY_COST={args.memoria}")
+    print(f"ARGON2_PARALLELISM={args.paralelismo}")
+    print(
+        f"# ~{ms:.0f} ms por hash; con PASSWORD_HASH_WORKERS=N se atienden "
+        f"~{1000 / ms if ms else 0:.1f}·N inicios de sesión por segundo"
+    )
+
+
+if __name__ == "__main__":
+    main()
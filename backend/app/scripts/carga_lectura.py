@@ -0,0 +1,139 @@
+"""Prueba de carga de las rutas de lectura contra una API en marcha.
+
+Abre ``--clientes`` clientes concurrentes que piden en bucle las rutas
+indicadas durante ``--segundos`` y muestra peticiones por segundo, latencias
+y errores por ruta. Para comparar el camino síncrono con el asíncrono, correr
+la API con un solo worker (``uvicorn app.main:app --workers 1``) en cada
+versión y lanzar la misma carga. Con muchos clientes el propio generador
+puede ser el cuello de botella: ``--procesos`` reparte los clientes.
+
+Uso::
+
+    python -m app.scripts.carga_lectura --url http://localhost:8000/api \\
+        --usuario admin --clave ... --clientes 500 --segundos 30
+"""
+import argparse
+import asyncio
+import multiprocessing
+import statistics
+import time
+from collections import defaultdict
+
+import httpx
+
+RUTAS = (
+    "/talleres",
+    "/inventario?limit=100",
+    "/items?page_size=50",
+    "/dashboard/resumen",
+    "/talleres/actividad?startDate=2024-01-01&endDate=2024-12-31",
+)
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Carga concurrente sobre rutas de lectura")
+    parser.add_argument("--url", default="http://localhost:8000/api", help="Prefijo de la API")
+    parser.add_argument("--usuario", required=True)
+    parser.add_argument("--clave", required=True)
+    parser.add_argument("--clientes", type=int, default=500)
+    parser.add_argument("--segundos", type=float, default=30.0)
+    parser.add_argument("--procesos", type=int, default=1)
+    parser.add_argument(
+        "--ruta",
+        action="append",
+        dest="rutas",
+        help="Ruta a pedir; se puede repetir (por defecto las cinco de lectura)",
+    )
+    return parser.parse_args()
+
+
+def _token(url: str, usuario: str, clave: str) -> str:
+    respuesta = httpx.post(
+        f"{url}/auth/token", data={"username": usuario, "password": clave}, timeout=30
+    )
+    respuesta.raise_for_status()
+    return respuesta.json()["access_token"]
+
+
+async def _cliente(http: httpx.AsyncClient, rutas, fin: float, indice: int, resultados) -> None:
+    n = indice
+    while time.perf_counter() < fin:
+        ruta = rutas[n % len(rutas)]
+        n += 1
+        inicio = time.perf_counter()
+        try:
+            respuesta = await http.get(ruta)
+            ok = respuesta.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        resultados[ruta].append((time.perf_counter() - inicio, ok))
+
+
+async def _carga(url: str, token: str, rutas, clientes: int, segundos: float, desfase: int):
+    resultados = defaultdict(list)
+    limites = httpx.Limits(max_connections=clientes, max_keepalive_connections=clientes)
+    async with httpx.AsyncClient(
+        base_url=url,
+        headers={"Authorization": f"Bearer {token}"},
+        limits=limites,
+        timeout=120,
+    ) as http:
+        fin = time.perf_counter() + segundos
+        await asyncio.gather(
+            *(_cliente(http, rutas, fin, desfase + i, resultados) for i in range(clientes))
+        )
+    return dict(resultados)
+
+
+def _proceso(args) -> dict:
+    return asyncio.run(_carga(*args))
+
+
+def _percentil(valores: list[float], p: float) -> float:
+    return valores[min(len(valores) - 1, int(len(valores) * p))] * 1000
+
+
+def main() -> None:
+    args = _parse_args()
+    rutas = args.rutas or list(RUTAS)
+    token = _token(args.url, args.usuario, args.clave)
+
+    por_proceso = [
+        args.clientes // args.procesos + (1 if i < args.clientes % args.procesos else 0)
+        for i in range(args.procesos)
+    ]
+    trabajos = [
+        (args.url, token, rutas, clientes, args.segundos, sum(por_proceso[:i]))
+        for i, clientes in enumerate(por_proceso)
+    ]
+    inicio = time.perf_counter()
+    if args.procesos == 1:
+        partes = [_proceso(trabajos[0])]
+    else:
+        with multiprocessing.get_context("spawn").Pool(args.procesos) as pool:
+            partes = pool.map(_proceso, trabajos)
+    duracion = time.perf_counter() - inicio
+
+    resultados = defaultdict(list)
+    for parte in partes:
+        for ruta, muestras in parte.items():
+            resultados[ruta].extend(muestras)
+
+    total = sum(len(muestras) for muestras in resultados.values())
+    print(f"{args.clientes} clientes, {duracion:.1f} s: {total / duracion:.1f} req/s")
+    print(f"{'ruta':<60} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errores':>8}")
+    for ruta in rutas:
+        muestras = resultados.get(ruta, [])
+        if not muestras:
+            continue
+        tiempos = sorted(t for t, _ in muestras)
+        errores = sum(1 for _, ok in muestras if not ok)
+        print(
+            f"{ruta:<60} {len(muestras) / duracion:>8.1f} "
+            f"{statistics.median(tiempos) * 1000:>8.1f} {_percentil(tiempos, 0.95):>8.1f} "
+            f"{_percentil(tiempos, 0.99):>8.1f} {errores:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Verifica o reconstruye el libro ``inventario_saldos``.
+
+Uso::
+
+    python -m app.scripts.inventario_saldos --check
+    python -m app.scripts.inventario_saldos --rebuild
+"""
+import argparse
+
+from ..database import SessionLocal
+from ..services import inventario_saldos
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Mantenimiento de inventario_saldos")
+    accion = parser.add_mutually_exclusive_group(required=True)
+    accion.add_argument(
+        "--check",
+        action="store_true",
+        help="Compara el libro con talleres_detalle y lista las diferencias",
+    )
+    accion.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Recalcula el libro completo desde talleres_detalle",
+    )
+    return parser.parse_args()
+
+
+def check() -> int:
+    with SessionLocal() as db:
+        desfases = inventario_saldos.detectar_desfase(db)
+
+    for desfase in desfases:
+        print(
+            f"{desfase.sede or '-'} / {desfase.especie or '-'} / {desfase.codigo}: "
+            f"libro {desfase.total_peso_libro} ({desfase.detalles_libro} detalles), "
+            f"calculado {desfase.total_peso_calculado} ({desfase.detalles_calculado} detalles)"
+        )
+    if desfases:
+        print(f"{len(desfases)} claves con desfase")
+        return 1
+    print("Sin desfase")
+    return 0
+
+
+def rebuild() -> int:
+    with SessionLocal() as db:
+        filas = inventario_saldos.reconstruir(db)
+        db.commit()
+    print(f"Libro reconstruido con {filas} filas")
+    return 0
+
+
+def main() -> None:
+    args = _parse_args()
+    raise SystemExit(check() if args.check else rebuild())
+
+
+if __name__ == "__main__":
+    main()
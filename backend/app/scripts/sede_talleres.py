@@ -0,0 +1,82 @@
+"""Completa la sede de los talleres que quedaron sin ella.
+
+Los agregados de talleres usan la sede guardada en el taller; los que no
+tienen sede se agrupan bajo la sede vacía. Este script copia en esos talleres
+la sede actual de su creador y recalcula los agregados. No corre en el
+arranque: se ejecuta a mano, una vez, después de revisar el listado.
+
+Uso::
+
+    python -m app.scripts.sede_talleres --check
+    python -m app.scripts.sede_talleres --apply
+"""
+import argparse
+
+from sqlalchemy import text
+
+from ..database import engine
+from ..db_migrations import reconstruir_agregados
+
+_SIN_SEDE_SQL = (
+    "FROM talleres t "
+    "JOIN users u ON u.id = t.creado_por_id "
+    "WHERE NULLIF(TRIM(t.sede), '') IS NULL "
+    "AND NULLIF(TRIM(u.sede), '') IS NOT NULL"
+)
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Sede de talleres sin sede")
+    accion = parser.add_mutually_exclusive_group(required=True)
+    accion.add_argument(
+        "--check",
+        action="store_true",
+        help="Lista cuántos talleres sin sede tomarían la de su creador",
+    )
+    accion.add_argument(
+        "--apply",
+        action="store_true",
+        help="Copia la sede del creador y recalcula los agregados",
+    )
+    return parser.parse_args()
+
+
+def check() -> int:
+    with engine.connect() as conn:
+        filas = conn.execute(
+            text(
+                "SELECT TRIM(u.sede) AS sede, COUNT(*) AS talleres "
+                f"{_SIN_SEDE_SQL} GROUP BY 1 ORDER BY 1"
+            )
+        ).all()
+
+    for fila in filas:
+        print(f"{fila.sede}: {fila.talleres} talleres")
+    print(f"{sum(fila.talleres for fila in filas)} talleres sin sede")
+    return 0
+
+
+def apply() -> int:
+    with engine.begin() as conn:
+        result = conn.execute(
+            text(
+                "UPDATE talleres t SET sede = TRIM(u.sede) "
+                "FROM users u "
+                "WHERE u.id = t.creado_por_id "
+                "AND NULLIF(TRIM(t.sede), '') IS NULL "
+                "AND NULLIF(TRIM(u.sede), '') IS NOT NULL"
+            )
+        )
+        if result.rowcount:
+            reconstruir_agregados(conn)
+    print(f"Sede asignada a {result.rowcount} talleres")
+    return 0
+
+
+def main() -> None:
+    args = _parse_args()
+    raise SystemExit(check() if args.check else apply())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,227 @@
+import asyncio
+import logging
+import multiprocessing
+import secrets
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Callable, Optional
 
+from fastapi import HTTPException, status
 from jose import jwt
 from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
 
-from .config import JWT_ACCESS_TOKEN_EXPIRE_MINUTES, JWT_ALGORITHM, JWT_SECRET_KEY
+from .config import (
+    ARGON2_MEMORY_COST,
+    ARGON2_PARALLELISM,
+    ARGON2_TIME_COST,
+    JWT_ACCESS_TOKEN_EXPIRE_MINUTES,
+    JWT_ALGORITHM,
+    JWT_REFRESH_TOKEN_EXPIRE_DAYS,
+    JWT_SECRET_KEY,
+    JWT_STREAM_TICKET_EXPIRE_SECONDS,
+    PASSWORD_HASH_MAX_PENDING,
+    PASSWORD_HASH_WORKERS,
+)
+
+logger = logging.getLogger(__name__)
 
 # Cambiado bcrypt → argon2 para compatibilidad con Python 3.13
 pwd_context = CryptContext(
     schemes=["argon2", "bcrypt"],
     default="argon2",
     deprecated="auto",
+    argon2__rounds=ARGON2_TIME_COST,
+    argon2__memory_cost=ARGON2_MEMORY_COST,
+    argon2__parallelism=ARGON2_PARALLELISM,
 )
 
+# Argon2 ocupa CPU y memoria a propósito. Se calcula en procesos aparte para
+# que una ráfaga de inicios de sesión no acapare el threadpool de la API, y
+# como mucho PASSWORD_HASH_MAX_PENDING operaciones esperan turno: el resto
+# recibe 503 en lugar de encolarse sin límite.
+_pool: Optional[ProcessPoolExecutor] = None
+_pending = threading.BoundedSemaphore(PASSWORD_HASH_MAX_PENDING)
+_pool_lock = threading.Lock()
+
+
+def _new_pool() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=PASSWORD_HASH_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+def start_password_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is None and PASSWORD_HASH_WORKERS > 0:
+            _pool = _new_pool()
+
+
+def stop_password_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _replace_broken_pool(broken: ProcessPoolExecutor) -> None:
+    # Si un proceso muere (p. ej. por falta de memoria) el pool queda roto
+    # para siempre; se reemplaza una sola vez aunque fallen varias peticiones.
+    global _pool
+    with _pool_lock:
+        if _pool is not broken:
+            return
+        logger.error("El pool de hashing de contraseñas se rompió; se crea uno nuevo")
+        _pool = _new_pool()
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+def _acquire_slot() -> None:
+    if not _pending.acquire(blocking=False):
+        logger.warning("Cola de hashing de contraseñas llena; se rechaza la petición")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Demasiados inicios de sesión simultáneos, intenta de nuevo en unos segundos",
+            headers={"Retry-After": "1"},
+        )
+
+
+def _submit(pool: ProcessPoolExecutor, fn: Callable[..., Any], *args: Any) -> Future:
+    """Enviar ``fn`` a ``pool`` ocupando un cupo hasta que el trabajo termine.
+
+    El cupo se libera en el callback del future y no cuando se deja de
+    esperarlo: si quien espera se cancela (el cliente cortó el login), el hash
+    sigue corriendo en el worker y tiene que seguir contando.
+    """
+
+    _acquire_slot()
+    try:
+        future = pool.submit(fn, *args)
+    except BaseException:
+        _pending.release()
+        raise
+    future.add_done_callback(lambda _: _pending.release())
+    return future
+
 
-def create_access_token(subject: str, expires_delta: Optional[timedelta] = None) -> str:
+def _run(fn: Callable[..., Any], *args: Any) -> Any:
+    for intento in range(2):
+        pool = _pool
+        if pool is None:
+            _acquire_slot()
+            try:
+                return fn(*args)
+            finally:
+                _pending.release()
+        try:
+            return _submit(pool, fn, *args).result()
+        except BrokenProcessPool:
+            if intento:
+                raise
+            _replace_broken_pool(pool)
+
+
+async def _run_async(fn: Callable[..., Any], *args: Any) -> Any:
+    for intento in range(2):
+        pool = _pool
+        if pool is None:
+            # ``run_in_threadpool`` no abandona el hilo al cancelarse: el
+            # ``finally`` corre cuando el hash terminó de verdad.
+            _acquire_slot()
+            try:
+                return await run_in_threadpool(fn, *args)
+            finally:
+                _pending.release()
+        try:
+            return await asyncio.wrap_future(_submit(pool, fn, *args))
+        except BrokenProcessPool:
+            if intento:
+                raise
+            _replace_broken_pool(pool)
+
+
+ROLE_FLAGS = ("is_admin", "is_gerente", "is_coordinator", "is_branch_admin")
+
+
+def create_access_token(
+    subject: str,
+    expires_delta: Optional[timedelta] = None,
+    *,
+    claims: Optional[dict[str, Any]] = None,
+) -> str:
     """Generate a signed JWT access token."""
-    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=JWT_ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode = {"sub": subject, "exp": expire}
+    now = datetime.utcnow()
+    expire = now + (expires_delta or timedelta(minutes=JWT_ACCESS_TOKEN_EXPIRE_MINUTES))
+    to_encode = {"sub": subject, "exp": expire, "iat": now}
+    if claims:
+        to_encode.update(claims)
+    return jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
+
+
+def user_claims(user: Any, sid: Optional[str] = None) -> dict[str, Any]:
+    """Claims con los que ``dependencies`` autoriza sin consultar ``users``."""
+
+    return {
+        "username": user.username,
+        "sede": user.sede,
+        "roles": [flag[3:] for flag in ROLE_FLAGS if getattr(user, flag)],
+        "sid": sid,
+    }
+
+
+def create_refresh_token(subject: str) -> tuple[str, str, datetime]:
+    """Refresh token firmado; devuelve ``(token, jti, expira_en)`` para registrarlo."""
+
+    now = datetime.utcnow()
+    expire = now + timedelta(days=JWT_REFRESH_TOKEN_EXPIRE_DAYS)
+    jti = secrets.token_hex(16)
+    to_encode = {"sub": subject, "exp": expire, "iat": now, "jti": jti, "typ": "refresh"}
+    return jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM), jti, expire
+
+
+def create_stream_ticket(subject: str, sid: Optional[str], session_exp: Optional[int]) -> str:
+    """Ticket de vida corta que solo sirve para abrir un stream SSE.
+
+    Lleva la sesión (``sid``) y el vencimiento del access token que lo pidió:
+    el stream se cierra cuando se revoca la sesión o vence ese token.
+    """
+
+    now = datetime.utcnow()
+    to_encode = {
+        "sub": subject,
+        "exp": now + timedelta(seconds=JWT_STREAM_TICKET_EXPIRE_SECONDS),
+        "iat": now,
+        "typ": "stream",
+        "sid": sid,
+        "session_exp": session_exp,
+    }
     return jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return _run(_verify_and_update, plain_password, hashed_password)[0]
+
+
+async def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, Optional[str]]:
+    """Verificar y, si el hash usa otros parámetros o esquema, devolver uno nuevo."""
+
+    return await _run_async(_verify_and_update, plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return _run(_hash, password)
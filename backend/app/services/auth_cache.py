@@ -0,0 +1,181 @@
+"""Cachés de proceso para autenticar peticiones sin ir a la base.
+
+- :class:`TokenClaimsCache` recuerda, por hash del token, los claims de un
+  JWT ya verificado hasta su ``exp``; un token idéntico no cambia de
+  contenido, así que no hace falta volver a verificar la firma.
+- :class:`UserCache` guarda por id una copia de las columnas del usuario
+  durante unos segundos. En cada petición se arma una instancia nueva y se
+  adjunta a la sesión con ``merge(load=False)``, sin consulta: las rutas
+  reciben un ``models.User`` normal de su propia sesión y la copia en caché
+  nunca se comparte entre hilos.
+- :class:`RevocationList` guarda los refresh tokens revocados y, por usuario,
+  el momento en que cambió lo que lleva su access token: los tokens de ese
+  usuario emitidos antes ya no se creen a sí mismos y se validan contra la
+  base. Los demás usuarios no se enteran.
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Iterable, Optional
+
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from .. import models
+
+
+class TokenClaimsCache:
+    def __init__(self, *, max_entries: int = 10_000) -> None:
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._claims: OrderedDict[bytes, tuple[float, Any]] = OrderedDict()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[Any]:
+        key = self._key(token)
+        with self._lock:
+            entrada = self._claims.get(key)
+            if entrada is None:
+                return None
+            expira, claims = entrada
+            if expira <= time.time():
+                del self._claims[key]
+                return None
+            self._claims.move_to_end(key)
+            return claims
+
+    def put(self, token: str, claims: Any, exp: Optional[int]) -> None:
+        if exp is None:
+            return
+        with self._lock:
+            self._claims[self._key(token)] = (float(exp), claims)
+            while len(self._claims) > self._max_entries:
+                self._claims.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._claims.clear()
+
+
+class UserCache:
+    """Usuarios por id con vencimiento corto, invalidables por id o completos.
+
+    Igual que :class:`~app.services.conteo_cache.ConteoCache`, un usuario
+    leído mientras ocurre una invalidación se devuelve pero no se guarda.
+    """
+
+    def __init__(self, ttl_seconds: float, *, max_entries: int = 1024) -> None:
+        self.ttl_seconds = ttl_seconds
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._values: OrderedDict[int, tuple[float, dict[str, Any]]] = OrderedDict()
+        self._generation = 0
+        self._columns = [attr.key for attr in sa_inspect(models.User).column_attrs]
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self,
+        db: Session,
+        user_id: int,
+        loader: Callable[[Session, int], Optional[models.User]],
+    ) -> Optional[models.User]:
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._values.get(user_id)
+            if entrada is not None and entrada[0] > ahora:
+                self._values.move_to_end(user_id)
+                self.hits += 1
+                valores = entrada[1]
+            else:
+                self.misses += 1
+                valores = None
+                generation = self._generation
+
+        if valores is not None:
+            usuario = models.User(**valores)
+            make_transient_to_detached(usuario)
+            return db.merge(usuario, load=False)
+
+        usuario = loader(db, user_id)
+        if usuario is None or self.ttl_seconds <= 0:
+            return usuario
+        valores = {columna: getattr(usuario, columna) for columna in self._columns}
+        with self._lock:
+            if generation == self._generation:
+                self._values[user_id] = (ahora + self.ttl_seconds, valores)
+                self._values.move_to_end(user_id)
+                while len(self._values) > self._max_entries:
+                    self._values.popitem(last=False)
+        return usuario
+
+    def invalidate(self, user_id: Optional[int] = None) -> None:
+        with self._lock:
+            self._generation += 1
+            if user_id is None:
+                self._values.clear()
+            else:
+                self._values.pop(user_id, None)
+
+
+class RevocationList:
+    """``jti`` revocados, cargados con ``loader`` la primera vez que se consultan.
+
+    ``invalidate`` descarta la copia (se recarga en la siguiente consulta) y
+    ``marcar_usuarios`` anota que cambiaron los datos del token de algunos
+    usuarios (o de todos, sin ids). El piso común arranca con la hora de
+    inicio del proceso: lo que cambió antes no se notificó aquí. Los pisos por
+    usuario más viejos que ``vida_tokens`` segundos se descartan, porque ya no
+    queda ningún token vigente emitido antes.
+    """
+
+    def __init__(self, loader: Callable[[], set[str]], *, vida_tokens: float) -> None:
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._revocados: Optional[frozenset[str]] = None
+        self._generation = 0
+        self.vida_tokens = vida_tokens
+        self._piso = time.time()
+        self._pisos: dict[int, float] = {}
+
+    def is_revoked(self, jti: str) -> bool:
+        revocados = self._revocados
+        if revocados is None:
+            with self._lock:
+                generation = self._generation
+            revocados = frozenset(self._loader())
+            with self._lock:
+                if generation == self._generation:
+                    self._revocados = revocados
+        return jti in revocados
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._revocados = None
+
+    def marcar_usuarios(self, user_ids: Optional[Iterable[int]] = None) -> None:
+        ahora = time.time()
+        with self._lock:
+            if user_ids is None:
+                self._piso = ahora
+                self._pisos.clear()
+                return
+            for user_id in user_ids:
+                self._pisos[user_id] = ahora
+            vencido = ahora - self.vida_tokens
+            for user_id in [u for u, piso in self._pisos.items() if piso < vencido]:
+                del self._pisos[user_id]
+
+    def claims_vigentes(self, user_id: int, iat: Optional[int]) -> bool:
+        """Si un token de ``user_id`` emitido en ``iat`` es posterior a su último cambio."""
+
+        if iat is None:
+            return False
+        return iat > max(self._piso, self._pisos.get(user_id, 0.0))
@@ -0,0 +1,101 @@
+"""Difusión en proceso de avisos de cambio hacia los clientes SSE.
+
+Cada conexión abierta en ``/events`` tiene una cola ``asyncio`` acotada. Los
+avisos llegan desde los hilos que hacen ``commit`` (ver :mod:`app.events`) y
+se entregan a cada cola con ``call_soon_threadsafe`` en su propio event loop,
+así una conexión inactiva no cuesta más que una corrutina dormida.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+from dataclasses import dataclass, field
+from typing import Optional
+
+from .. import events
+from ..constants import normalize_sede_name
+
+_QUEUE_SIZE = 100
+# Se envía cuando una cola se llena: el cliente debe refrescar todo.
+RESYNC_EVENT = "resync"
+
+
+@dataclass(eq=False)
+class Subscription:
+    loop: asyncio.AbstractEventLoop
+    sede: Optional[str]
+    recibe_todo: bool
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(maxsize=_QUEUE_SIZE))
+    overflowed: bool = False
+
+    def accepts(self, notice: events.ChangeNotice) -> bool:
+        if self.recibe_todo or not notice.sede:
+            return True
+        return (normalize_sede_name(notice.sede) or notice.sede) == self.sede
+
+    def _put(self, message: str) -> None:
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def next_message(self, timeout: float) -> Optional[str]:
+        """Esperar el siguiente mensaje SSE; ``None`` si vence ``timeout``."""
+
+        if self.overflowed:
+            self.overflowed = False
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            return format_event(RESYNC_EVENT, {})
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+def format_event(event_type: str, data: dict) -> str:
+    return f"event: {event_type}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class Broadcaster:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._subscriptions: set[Subscription] = set()
+
+    def subscribe(self, *, sede: Optional[str], recibe_todo: bool) -> Subscription:
+        subscription = Subscription(
+            loop=asyncio.get_running_loop(), sede=sede, recibe_todo=recibe_todo
+        )
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    @property
+    def connections(self) -> int:
+        with self._lock:
+            return len(self._subscriptions)
+
+    def publish(self, notices: list[events.ChangeNotice]) -> None:
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            for notice in notices:
+                if not subscription.accepts(notice):
+                    continue
+                message = format_event(notice.type, notice.as_dict())
+                try:
+                    subscription.loop.call_soon_threadsafe(subscription._put, message)
+                except RuntimeError:  # pragma: no cover - loop already closed
+                    self.unsubscribe(subscription)
+                    break
+
+
+broadcaster = Broadcaster()
+events.subscribe_notices(broadcaster.publish)
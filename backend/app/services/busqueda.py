@@ -0,0 +1,78 @@
+"""Búsqueda por subcadena sobre columnas de texto con índices trigram.
+
+Las búsquedas filtran con ``lower(columna) LIKE '%texto%'``. Con la extensión
+``pg_trgm`` instalada, :mod:`app.db_migrations` crea índices GIN sobre esas
+mismas expresiones ``lower(...)`` y el planificador los usa directamente; sin
+ella las consultas siguen funcionando con un recorrido secuencial.
+"""
+from __future__ import annotations
+
+import logging
+
+from sqlalchemy import case, func, or_, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.sql import ColumnElement
+
+logger = logging.getLogger(__name__)
+
+# Se actualiza al arrancar, cuando las migraciones comprueban la extensión.
+trigram_disponible = False
+
+
+def habilitar_trigram(conn: Connection) -> bool:
+    """Instalar ``pg_trgm`` si es posible y recordar si quedó disponible."""
+
+    global trigram_disponible
+
+    instalada = conn.execute(
+        text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+    ).first()
+    if instalada is None:
+        try:
+            with conn.begin_nested():
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            instalada = True
+        except DBAPIError:
+            logger.warning(
+                "pg_trgm no está disponible; la búsqueda de texto usará recorridos secuenciales."
+            )
+    trigram_disponible = instalada is not None
+    return trigram_disponible
+
+
+def normalizar(q: str) -> str:
+    return q.strip().lower()
+
+
+def contiene(q: str, *columnas: ColumnElement) -> ColumnElement:
+    """Filtro ``lower(col) LIKE '%q%'`` sobre cualquiera de ``columnas``."""
+
+    patron = f"%{normalizar(q)}%"
+    return or_(*(func.lower(columna).like(patron) for columna in columnas))
+
+
+def relevancia(q: str, *columnas: ColumnElement) -> ColumnElement:
+    """Expresión para ordenar de más a menos relevante (usar con ``desc()``).
+
+    Con ``pg_trgm`` es la mayor similitud trigram entre ``q`` y las columnas.
+    Sin la extensión se aproxima: coincidencia exacta, luego prefijo y luego
+    cualquier otra coincidencia.
+    """
+
+    termino = normalizar(q)
+    if trigram_disponible:
+        return func.greatest(
+            *(func.similarity(func.lower(columna), termino) for columna in columnas)
+        )
+    return case(
+        *(
+            (func.lower(columna) == termino, 2)
+            for columna in columnas
+        ),
+        *(
+            (func.lower(columna).like(f"{termino}%"), 1)
+            for columna in columnas
+        ),
+        else_=0,
+    )
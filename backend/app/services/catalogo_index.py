@@ -0,0 +1,308 @@
+"""Índice en memoria del catálogo para autocompletar códigos y subcortes.
+
+Se construye con ``items`` y los precios activos de ``precios_lista`` y se
+reemplaza completo tras cada carga de precios: las búsquedas siempre ven un
+índice entero, el anterior o el nuevo, y nunca consultan la base.
+
+- Códigos: lista ordenada de códigos normalizados; una búsqueda por prefijo es
+  un ``bisect`` y un recorrido del rango contiguo (equivale a descender por un
+  trie, sin el costo en memoria de un nodo por carácter).
+- Descripciones: índice invertido de trigramas (arreglos ``uint32``). Las
+  entradas se numeran por largo de descripción, así que cada lista de postings
+  ya está ordenada de la más corta (más relevante) a la más larga y la
+  búsqueda puede detenerse en cuanto reúne ``limit`` resultados. Para
+  términos de menos de tres caracteres se usa el prefijo de cada palabra.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import unicodedata
+from bisect import bisect_left
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Callable, Iterator, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from .. import models
+from .precios import normalize_item_lookup
+
+logger = logging.getLogger(__name__)
+
+_NGRAM = 3
+_SCAN_BUDGET = 512
+_REBUILD_DEBOUNCE_SECONDS = 1.0
+
+
+def normalizar_texto(valor: Optional[str]) -> str:
+    if not valor:
+        return ""
+    sin_tildes = unicodedata.normalize("NFKD", valor)
+    sin_tildes = "".join(c for c in sin_tildes if not unicodedata.combining(c))
+    return " ".join(sin_tildes.lower().split())
+
+
+def _trigramas(texto: str) -> set[str]:
+    return {texto[i : i + _NGRAM] for i in range(len(texto) - _NGRAM + 1)}
+
+
+@dataclass(frozen=True, slots=True)
+class EntradaCatalogo:
+    codigo: str
+    descripcion: str
+    especie: Optional[str]
+    precio: Optional[Decimal]
+    item_id: Optional[int]
+
+
+class _Vista:
+    """Estructuras de búsqueda sobre un subconjunto de posiciones del índice."""
+
+    def __init__(self, posiciones: list[int], codigos: list[str], descripciones: list[str]) -> None:
+        por_codigo = sorted((codigos[posicion], posicion) for posicion in posiciones)
+        self.codigos = [codigo for codigo, _ in por_codigo]
+        self.codigo_posiciones = np.fromiter(
+            (posicion for _, posicion in por_codigo), dtype=np.uint32, count=len(por_codigo)
+        )
+
+        palabras: set[tuple[str, int]] = set()
+        postings: dict[str, list[int]] = {}
+        for posicion in posiciones:
+            descripcion = descripciones[posicion]
+            for palabra in descripcion.split():
+                palabras.add((palabra, posicion))
+            for gram in _trigramas(descripcion):
+                postings.setdefault(gram, []).append(posicion)
+        self.palabras = sorted(palabras)
+        self.postings = {
+            gram: np.array(lista, dtype=np.uint32) for gram, lista in postings.items()
+        }
+
+    def candidatos(self, termino: str) -> Iterator[int]:
+        """Posiciones que pueden contener ``termino``, de la más corta a la más larga.
+
+        Primero recorre directamente la lista de postings más corta, que basta
+        cuando el término es común; si tras ``_SCAN_BUDGET`` candidatos sigue
+        buscando, cruza todas las listas para descartar los que no tienen
+        todos los trigramas.
+        """
+
+        listas = []
+        for gram in _trigramas(termino):
+            lista = self.postings.get(gram)
+            if lista is None:
+                return
+            listas.append(lista)
+        listas.sort(key=len)
+
+        menor = listas[0]
+        yield from menor[:_SCAN_BUDGET].tolist()
+        if len(menor) <= _SCAN_BUDGET:
+            return
+        restantes = menor[_SCAN_BUDGET:]
+        for lista in listas[1:]:
+            restantes = restantes[np.isin(restantes, lista, assume_unique=True)]
+            if len(restantes) <= _SCAN_BUDGET:
+                break
+        yield from restantes.tolist()
+
+
+class IndiceCatalogo:
+    """Instantánea inmutable del catálogo; segura para leer desde varios hilos.
+
+    Además de la vista completa guarda una por especie, para que filtrar por
+    especie no obligue a descartar candidatos uno a uno.
+    """
+
+    def __init__(self, entradas: list[EntradaCatalogo]) -> None:
+        normalizadas = sorted(
+            ((normalizar_texto(e.descripcion), e) for e in entradas),
+            key=lambda par: (len(par[0]), par[0]),
+        )
+        self.entradas = [entrada for _, entrada in normalizadas]
+        self._descripciones = [descripcion for descripcion, _ in normalizadas]
+        codigos = [normalize_item_lookup(e.codigo) or "" for e in self.entradas]
+
+        por_especie: dict[Optional[str], list[int]] = {None: list(range(len(self.entradas)))}
+        for posicion, entrada in enumerate(self.entradas):
+            if entrada.especie:
+                por_especie.setdefault(entrada.especie, []).append(posicion)
+        self._vistas = {
+            especie: _Vista(posiciones, codigos, self._descripciones)
+            for especie, posiciones in por_especie.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.entradas)
+
+    def buscar(
+        self, q: str, *, especie: Optional[str] = None, limit: int = 10
+    ) -> list[EntradaCatalogo]:
+        termino = normalizar_texto(q)
+        vista = self._vistas.get(especie)
+        if not termino or vista is None:
+            return []
+
+        # (rango, largo de la descripción, posición): menor es más relevante.
+        encontrados: dict[int, tuple[int, int, int]] = {}
+
+        def agregar(posicion: int, rango: int) -> None:
+            clave = (rango, len(self._descripciones[posicion]), posicion)
+            actual = encontrados.get(posicion)
+            if actual is None or clave < actual:
+                encontrados[posicion] = clave
+
+        codigo = normalize_item_lookup(termino)
+        if codigo:
+            inicio = bisect_left(vista.codigos, codigo)
+            for indice in range(inicio, min(inicio + limit, len(vista.codigos))):
+                if not vista.codigos[indice].startswith(codigo):
+                    break
+                rango = 0 if vista.codigos[indice] == codigo else 1
+                agregar(int(vista.codigo_posiciones[indice]), rango)
+
+        if len(termino) < _NGRAM:
+            inicio = bisect_left(vista.palabras, (termino, -1))
+            for palabra, posicion in vista.palabras[inicio : inicio + limit * 4]:
+                if not palabra.startswith(termino):
+                    break
+                agregar(posicion, 2)
+        else:
+            self._buscar_descripcion(vista, termino, agregar, limit)
+
+        mejores = sorted(encontrados.values())[:limit]
+        return [self.entradas[posicion] for _, _, posicion in mejores]
+
+    def _buscar_descripcion(self, vista: _Vista, termino: str, agregar, limit: int) -> None:
+        descripciones = self._descripciones
+        al_inicio = 0
+        en_medio = 0
+        for posicion in vista.candidatos(termino):
+            descripcion = descripciones[posicion]
+            encontrada = descripcion.find(termino)
+            if encontrada < 0:
+                continue
+            if encontrada == 0 or descripcion[encontrada - 1] == " ":
+                agregar(posicion, 2)
+                al_inicio += 1
+                # Las posiciones van por largo: ninguna posterior puede superar a éstas.
+                if al_inicio >= limit:
+                    return
+            elif en_medio < limit:
+                agregar(posicion, 3)
+                en_medio += 1
+
+
+def construir_indice(db: Session) -> IndiceCatalogo:
+    """Leer ítems y precios activos y armar un índice nuevo."""
+
+    entradas: dict[str, dict] = {}
+
+    items = db.query(
+        models.Item.id,
+        models.Item.item_code,
+        models.Item.nombre,
+        models.Item.descripcion,
+        models.Item.especie,
+    ).filter(models.Item.activo.isnot(False))
+    for item in items.execution_options(yield_per=5000):
+        clave = normalize_item_lookup(item.item_code)
+        if clave is None:
+            continue
+        entradas[clave] = {
+            "codigo": item.item_code.strip(),
+            "descripcion": item.nombre or item.descripcion or item.item_code,
+            "especie": (item.especie or "").strip().lower() or None,
+            "precio": None,
+            "item_id": item.id,
+        }
+
+    precios = db.query(
+        models.ListaPrecios.referencia,
+        models.ListaPrecios.descripcion,
+        models.ListaPrecios.precio,
+    ).filter(models.ListaPrecios.activo.is_(True))
+    for precio in precios.execution_options(yield_per=5000):
+        clave = normalize_item_lookup(precio.referencia)
+        if clave is None:
+            continue
+        entrada = entradas.setdefault(
+            clave,
+            {
+                "codigo": precio.referencia.strip(),
+                "descripcion": precio.descripcion,
+                "especie": None,
+                "precio": None,
+                "item_id": None,
+            },
+        )
+        # Mismo criterio que el cálculo de talleres: el menor precio activo.
+        if precio.precio is not None and (
+            entrada["precio"] is None or precio.precio < entrada["precio"]
+        ):
+            entrada["precio"] = precio.precio
+
+    return IndiceCatalogo([EntradaCatalogo(**entrada) for entrada in entradas.values()])
+
+
+class CatalogoAutocompletado:
+    """Mantiene el índice vigente y lo reconstruye en segundo plano."""
+
+    def __init__(self, loader: Callable[[], IndiceCatalogo]) -> None:
+        self._loader = loader
+        self._indice: Optional[IndiceCatalogo] = None
+        self._build_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.rebuilds = 0
+
+    def indice(self) -> IndiceCatalogo:
+        indice = self._indice
+        if indice is not None:
+            return indice
+        # Solo la primera consulta antes de que termine la carga inicial espera.
+        with self._build_lock:
+            if self._indice is None:
+                self._rebuild()
+            return self._indice
+
+    def _rebuild(self) -> None:
+        indice = self._loader()
+        self._indice = indice
+        self.rebuilds += 1
+        logger.info("Índice de catálogo reconstruido con %s entradas", len(indice))
+
+    def invalidate(self) -> None:
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait()
+            # Agrupar las escrituras de una misma carga en un solo recálculo.
+            self._stopped.wait(timeout=_REBUILD_DEBOUNCE_SECONDS)
+            if self._stopped.is_set():
+                return
+            self._wakeup.clear()
+            try:
+                with self._build_lock:
+                    self._rebuild()
+            except Exception:  # pragma: no cover - keep serving the previous index
+                logger.exception("No se pudo reconstruir el índice de catálogo")
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._wakeup.set()
+        self._thread = threading.Thread(target=self._run, name="catalogo-index", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
@@ -0,0 +1,64 @@
+"""Caché LRU de conteos por conjunto de filtros, invalidada por escrituras."""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable
+
+
+class ConteoCache:
+    """Guarda ``count(*)`` por clave hasta la siguiente invalidación.
+
+    Si se invalida mientras se calcula un conteo, ese resultado se devuelve
+    pero no se guarda, para no servir totales anteriores a la escritura.
+    """
+
+    def __init__(self, name: str, *, max_entries: int = 512) -> None:
+        self.name = name
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._values: OrderedDict[Hashable, int] = OrderedDict()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, loader: Callable[[], int]) -> int:
+        with self._lock:
+            if key in self._values:
+                self._values.move_to_end(key)
+                self.hits += 1
+                return self._values[key]
+            self.misses += 1
+            generation = self._generation
+
+        value = loader()
+        self._store(generation, key, value)
+        return value
+
+    async def aget(self, key: Hashable, loader: Callable[[], Awaitable[int]]) -> int:
+        """Como :meth:`get` con un ``loader`` asíncrono."""
+
+        with self._lock:
+            if key in self._values:
+                self._values.move_to_end(key)
+                self.hits += 1
+                return self._values[key]
+            self.misses += 1
+            generation = self._generation
+
+        value = await loader()
+        self._store(generation, key, value)
+        return value
+
+    def _store(self, generation: int, key: Hashable, value: int) -> None:
+        with self._lock:
+            if generation == self._generation:
+                self._values[key] = value
+                self._values.move_to_end(key)
+                while len(self._values) > self._max_entries:
+                    self._values.popitem(last=False)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._values.clear()
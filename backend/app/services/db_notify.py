@@ -0,0 +1,152 @@
+"""Escucha ``NOTIFY`` de Postgres para cambios hechos fuera de la aplicación.
+
+La lista de precios se carga con procesos externos, así que sus escrituras
+no pasan por las sesiones ORM que alimentan :mod:`app.events`; con varios
+procesos de la API, tampoco llegan a los demás las escrituras de uno. Un trigger por
+sentencia (ver :mod:`app.db_migrations`) publica el nombre de la tabla en el
+canal :data:`CHANNEL` y este hilo lo reenvía como si fuera un ``commit`` local.
+
+Otro trigger publica en :data:`PRECIOS_CHANNEL` las sedes con precios recién
+activados (o con precio cambiado); se reenvían como avisos
+``precios.activated`` para los streams de ``/events``.
+
+Un tercero publica en :data:`USUARIOS_CHANNEL` los ids de usuarios cuyo
+nombre, sede, roles o estado cambiaron; se reenvían como
+:func:`usuario_cambiado` para invalidar solo los access tokens de esos
+usuarios (un cambio de contraseña no los invalida).
+"""
+from __future__ import annotations
+
+import json
+import logging
+import select
+import threading
+from typing import Iterable, Optional
+
+from sqlalchemy import Engine
+
+from .. import events
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "table_changes"
+PRECIOS_CHANNEL = "precios_activados"
+USUARIOS_CHANNEL = "usuarios_cambiados"
+# Tablas con trigger de notificación. ``users`` avisa a los demás procesos de
+# la API para que invaliden sus cachés de autenticación.
+NOTIFY_TABLES = ("precios_lista", "users")
+# Se publica (por ``NOTIFY`` y con :func:`app.events.record`) al revocar
+# refresh tokens; emitir uno nuevo no revoca nada y no lo publica.
+REVOCATIONS = "refresh_tokens.revocados"
+# Cambio en los datos de usuario que lleva el access token. Solo, vale para
+# todos los usuarios; con ``:<id>`` (ver :func:`usuario_cambiado`), para uno.
+USUARIOS = "users.claims"
+_POLL_SECONDS = 5.0
+_RETRY_SECONDS = 5.0
+
+
+def _avisos_precios(payload: str) -> list[events.ChangeNotice]:
+    try:
+        sedes = json.loads(payload)
+    except ValueError:
+        logger.warning("Payload inválido en %s: %r", PRECIOS_CHANNEL, payload)
+        sedes = [None]
+    return [
+        events.ChangeNotice("precios.activated", None, sede or None)
+        for sede in dict.fromkeys(sedes)
+    ]
+
+
+def usuario_cambiado(user_id: int) -> str:
+    return f"{USUARIOS}:{user_id}"
+
+
+def usuarios_cambiados(tables: Iterable[str]) -> Optional[set[int]]:
+    """Ids con :func:`usuario_cambiado` en ``tables``; ``None`` si cambiaron todos."""
+
+    prefijo = f"{USUARIOS}:"
+    ids: set[int] = set()
+    for table in tables:
+        if table == USUARIOS:
+            return None
+        if table.startswith(prefijo):
+            ids.add(int(table[len(prefijo):]))
+    return ids
+
+
+def _usuarios(payload: str) -> list[str]:
+    try:
+        ids = json.loads(payload)
+    except ValueError:
+        logger.warning("Payload inválido en %s: %r", USUARIOS_CHANNEL, payload)
+        ids = None
+    # El trigger manda ``null`` cuando la lista no cabe en un ``NOTIFY``.
+    if not isinstance(ids, list):
+        return [USUARIOS]
+    return [usuario_cambiado(int(user_id)) for user_id in ids]
+
+
+def despachar(notificaciones: Iterable[tuple[str, str]]) -> None:
+    """Reenviar pares ``(canal, payload)`` recibidos por ``LISTEN``."""
+
+    tables: set[str] = set()
+    notices: list[events.ChangeNotice] = []
+    for canal, payload in notificaciones:
+        if canal == PRECIOS_CHANNEL:
+            notices.extend(_avisos_precios(payload))
+        elif canal == USUARIOS_CHANNEL:
+            tables.update(_usuarios(payload))
+        else:
+            tables.add(payload)
+    events.publish(tables)
+    events.publish_notices(notices)
+
+
+class TableChangeListener:
+    def __init__(self, engine: Engine) -> None:
+        self._engine = engine
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _listen(self) -> None:
+        raw = self._engine.raw_connection()
+        try:
+            connection = raw.driver_connection
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+                cursor.execute(f"LISTEN {PRECIOS_CHANNEL}")
+                cursor.execute(f"LISTEN {USUARIOS_CHANNEL}")
+            while not self._stopped.is_set():
+                ready, _, _ = select.select([connection], [], [], _POLL_SECONDS)
+                if not ready:
+                    continue
+                connection.poll()
+                notificaciones = [(notify.channel, notify.payload) for notify in connection.notifies]
+                connection.notifies.clear()
+                despachar(notificaciones)
+        finally:
+            raw.invalidate()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self._listen()
+            except Exception:  # pragma: no cover - reconnect after DB hiccups
+                logger.exception("Se perdió la conexión LISTEN %s; reintentando", CHANNEL)
+                # Lo que cambió mientras tanto no se notificó: invalidar todo.
+                events.publish((*NOTIFY_TABLES, REVOCATIONS, USUARIOS))
+                self._stopped.wait(timeout=_RETRY_SECONDS)
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="db-notify", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=_POLL_SECONDS + 1)
+            self._thread = None
@@ -0,0 +1,122 @@
+"""Reconstrucción y verificación del libro ``inventario_saldos``.
+
+El libro se mantiene incrementalmente desde :mod:`app.services.rollups`; este
+módulo lo recalcula desde ``talleres_detalle`` para poblarlo la primera vez,
+repararlo o comprobar que no se haya desfasado.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from .. import models
+
+# Código y descripción de un detalle (``d``) con su ítem (``i``). Un texto
+# vacío cuenta como ausente, igual que en :func:`producto_detalle`, que es lo
+# que usa el ajuste incremental: si difirieran, el libro se desfasaría.
+CODIGO_SQL = "COALESCE(NULLIF(d.codigo_producto, ''), NULLIF(i.codigo_producto, ''), '')"
+DESCRIPCION_SQL = (
+    "COALESCE(NULLIF(i.nombre, ''), NULLIF(d.nombre_subcorte, ''), "
+    "NULLIF(d.codigo_producto, ''), '')"
+)
+
+# Misma agrupación que usaba /inventario al agregar el histórico completo. La
+# descripción es la del detalle más reciente de cada código.
+SALDOS_CALCULADOS_SQL = (
+    "SELECT COALESCE(TRIM(t.sede), '') AS sede, "
+    "COALESCE(LOWER(TRIM(t.especie)), '') AS especie, "
+    f"{CODIGO_SQL} AS codigo, "
+    f"(ARRAY_AGG({DESCRIPCION_SQL} "
+    "ORDER BY d.id DESC))[1] AS descripcion, "
+    "SUM(COALESCE(d.peso, 0)) AS total_peso, "
+    "COUNT(*) AS detalles "
+    "FROM talleres_detalle d "
+    "JOIN talleres t ON t.id = d.taller_id "
+    "LEFT JOIN items i ON i.id = d.item_id "
+    "GROUP BY 1, 2, 3"
+)
+
+_INSERTAR_SALDOS_SQL = (
+    "INSERT INTO inventario_saldos "
+    "(sede, especie, codigo, descripcion, total_peso, detalles) "
+    f"SELECT * FROM ({SALDOS_CALCULADOS_SQL}) calculados"
+)
+
+
+def producto_detalle(
+    detalle: models.TallerDetalle, item: Optional[models.Item]
+) -> tuple[str, str]:
+    """``(codigo, descripcion)`` de ``detalle``; ver :data:`CODIGO_SQL`."""
+
+    codigo = detalle.codigo_producto or (item.item_code if item else None) or ""
+    descripcion = (
+        (item.nombre if item else None)
+        or detalle.nombre_subcorte
+        or detalle.codigo_producto
+        or ""
+    )
+    return codigo, descripcion
+
+
+@dataclass(frozen=True)
+class Desfase:
+    sede: str
+    especie: str
+    codigo: str
+    total_peso_libro: Decimal
+    total_peso_calculado: Decimal
+    detalles_libro: int
+    detalles_calculado: int
+
+
+def poblar_si_vacio(conn: Connection) -> None:
+    """Poblar el libro solo si aún no tiene filas (usado en el arranque)."""
+
+    conn.execute(
+        text(
+            f"{_INSERTAR_SALDOS_SQL} "
+            "WHERE NOT EXISTS (SELECT 1 FROM inventario_saldos) "
+            "ON CONFLICT DO NOTHING"
+        )
+    )
+
+
+def reconstruir(db: Session) -> int:
+    """Recalcular todo el libro; devuelve el número de filas resultantes.
+
+    Bloquea el libro durante la reconstrucción para que las escrituras de
+    talleres concurrentes esperen y apliquen su ajuste sobre el resultado.
+    """
+
+    db.execute(text("LOCK TABLE inventario_saldos IN EXCLUSIVE MODE"))
+    db.execute(text("DELETE FROM inventario_saldos"))
+    result = db.execute(text(_INSERTAR_SALDOS_SQL))
+    return result.rowcount
+
+
+def detectar_desfase(db: Session) -> list[Desfase]:
+    """Comparar el libro con el histórico y devolver las claves que difieren."""
+
+    rows = db.execute(
+        text(
+            "SELECT COALESCE(l.sede, c.sede) AS sede, "
+            "COALESCE(l.especie, c.especie) AS especie, "
+            "COALESCE(l.codigo, c.codigo) AS codigo, "
+            "COALESCE(l.total_peso, 0) AS total_peso_libro, "
+            "COALESCE(c.total_peso, 0) AS total_peso_calculado, "
+            "COALESCE(l.detalles, 0) AS detalles_libro, "
+            "COALESCE(c.detalles, 0) AS detalles_calculado "
+            "FROM inventario_saldos l "
+            f"FULL OUTER JOIN ({SALDOS_CALCULADOS_SQL}) c "
+            "ON c.sede = l.sede AND c.especie = l.especie AND c.codigo = l.codigo "
+            "WHERE COALESCE(l.total_peso, 0) <> COALESCE(c.total_peso, 0) "
+            "OR COALESCE(l.detalles, 0) <> COALESCE(c.detalles, 0) "
+            "ORDER BY 1, 2, 3"
+        )
+    ).mappings()
+    return [Desfase(**row) for row in rows]
@@ -0,0 +1,29 @@
+"""Cursores opacos para paginación por clave (keyset)."""
+from __future__ import annotations
+
+import base64
+import json
+from typing import Any
+
+from fastapi import HTTPException, status
+
+
+def codificar_cursor(valores: list[Any]) -> str:
+    crudo = json.dumps(valores, default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(crudo).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str, longitud: int) -> list[Any]:
+    """Decodificar un cursor de ``longitud`` valores o responder ``400``."""
+
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+    except (ValueError, TypeError):
+        valores = None
+    if not isinstance(valores, list) or len(valores) != longitud:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El cursor de paginación no es válido",
+        )
+    return valores
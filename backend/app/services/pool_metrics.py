@@ -0,0 +1,81 @@
+"""Tiempo que las peticiones esperan una conexión de los pools de SQLAlchemy.
+
+:func:`pool_medido` crea una subclase del pool que mide cada checkout; los
+contadores se leen con :func:`stats` (ver ``GET /dashboard/pool``). Una espera
+alta indica que el pool es chico para la concurrencia, no que la base sea
+lenta.
+"""
+from __future__ import annotations
+
+import threading
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+# Límites superiores (ms) de los tramos del histograma de esperas.
+BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class PoolMetrics:
+    def __init__(self, nombre: str) -> None:
+        self.nombre = nombre
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self._buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def registrar(self, segundos: float, *, timeout: bool = False) -> None:
+        ms = segundos * 1000
+        indice = next((i for i, limite in enumerate(BUCKETS_MS) if ms <= limite), len(BUCKETS_MS))
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += timeout
+            self.espera_total += segundos
+            self.espera_max = max(self.espera_max, segundos)
+            self._buckets[indice] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            etiquetas = [f"le_{limite}" for limite in BUCKETS_MS] + ["inf"]
+            return {
+                "name": self.nombre,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": self.espera_total,
+                "wait_ms_max": self.espera_max * 1000,
+                "wait_ms_buckets": dict(zip(etiquetas, self._buckets)),
+            }
+
+
+_registro: dict[str, PoolMetrics] = {}
+
+
+def pool_medido(nombre: str, base: type[QueuePool] = QueuePool) -> type[QueuePool]:
+    """Subclase de ``base`` que registra la espera de cada checkout en ``nombre``.
+
+    Las métricas van en el cierre y no en la instancia porque SQLAlchemy
+    recrea el pool (``Pool.recreate``) al invalidar conexiones.
+    """
+
+    metricas = _registro.setdefault(nombre, PoolMetrics(nombre))
+
+    class PoolMedido(base):
+        def _do_get(self):
+            inicio = time.perf_counter()
+            try:
+                conexion = super()._do_get()
+            except PoolTimeoutError:
+                metricas.registrar(time.perf_counter() - inicio, timeout=True)
+                raise
+            metricas.registrar(time.perf_counter() - inicio)
+            return conexion
+
+    PoolMedido.__name__ = f"{base.__name__}Medido"
+    return PoolMedido
+
+
+def stats() -> dict[str, dict]:
+    return {nombre: metricas.stats() for nombre, metricas in _registro.items()}
@@ -0,0 +1,365 @@
+"""Resolución de ítems y precios usada por el cálculo de talleres.
+
+Agrupa en un solo lugar la normalización de códigos y las búsquedas
+por conjunto contra ``items`` y ``precios_lista`` para que el cálculo de
+un taller y los reportes por lote compartan exactamente las mismas reglas.
+
+Además de los precios activos, :class:`HistorialPrecios` resuelve el precio
+vigente a una fecha (``as_of``): el registro con la ``fecha_vigencia`` más
+reciente que no la supere, primero en la sede del taller y si no en
+cualquier sede.
+"""
+from __future__ import annotations
+
+import re
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal
+from typing import Any, Iterable, Optional
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+
+from .. import models
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_item_code(codigo: str) -> str:
+    normalized = _WHITESPACE_RE.sub("", codigo.strip())
+    if normalized.isdigit():
+        trimmed = normalized.lstrip("0")
+        return trimmed or "0"
+    return normalized
+
+
+def normalize_item_lookup(codigo: Optional[str]) -> Optional[str]:
+    if not codigo:
+        return None
+    return normalize_item_code(codigo).strip().lower() or None
+
+
+def normalized_db_code(col):
+    return func.lower(func.regexp_replace(func.trim(col), r"\s+", "", "g"))
+
+
+def lookup_db_code(col):
+    """Código normalizado sin ceros a la izquierda; expresión del índice
+    ``ix_precios_lista_codigo_vigencia``."""
+
+    return func.ltrim(normalized_db_code(col), "0")
+
+
+def prefer_min_precio(
+    existing: models.ListaPrecios | None, candidate: models.ListaPrecios
+) -> models.ListaPrecios:
+    if existing is None:
+        return candidate
+    if existing.precio is None and candidate.precio is not None:
+        return candidate
+    if existing.precio is None or candidate.precio is None:
+        return existing
+    return candidate if Decimal(candidate.precio) < Decimal(existing.precio) else existing
+
+
+class _Serie:
+    """Registros de una clave ordenados por ``fecha_vigencia``, uno por fecha."""
+
+    __slots__ = ("fechas", "registros")
+
+    def __init__(self) -> None:
+        self.fechas: list[date] = []
+        self.registros: list[Any] = []
+
+    def agregar(self, fecha: date, registro: Any) -> None:
+        if self.fechas and self.fechas[-1] == fecha:
+            # Mismo criterio que ``prefer_min_precio`` sin reconvertir a Decimal.
+            actual = self.registros[-1]
+            if registro.precio is not None and (
+                actual.precio is None or registro.precio < actual.precio
+            ):
+                self.registros[-1] = registro
+            return
+        self.fechas.append(fecha)
+        self.registros.append(registro)
+
+    def vigente(self, fecha: date) -> Optional[Any]:
+        posicion = bisect_right(self.fechas, fecha)
+        return self.registros[posicion - 1] if posicion else None
+
+
+class IndiceVigencias:
+    """Series de precios por (clave, sede) y por clave en todas las sedes.
+
+    Los registros deben agregarse en orden ascendente de ``fecha_vigencia``;
+    los que no tienen fecha valen desde siempre.
+    """
+
+    def __init__(self) -> None:
+        self._series: dict[tuple[str, Optional[str]], _Serie] = {}
+        self.claves: set[str] = set()
+
+    @staticmethod
+    def _sede(sede: Optional[str]) -> Optional[str]:
+        return (sede.strip().lower() or None) if sede else None
+
+    def agregar(self, clave: str, registro: Any) -> None:
+        fecha = registro.fecha_vigencia or date.min
+        sede = self._sede(registro.sede)
+        self.claves.add(clave)
+        for llave in ((clave, sede), (clave, None)) if sede else ((clave, None),):
+            self._series.setdefault(llave, _Serie()).agregar(fecha, registro)
+
+    def vigente(self, clave: str, sede: Optional[str], fecha: date) -> Optional[Any]:
+        sede = self._sede(sede)
+        if sede:
+            serie = self._series.get((clave, sede))
+            registro = serie.vigente(fecha) if serie else None
+            if registro is not None:
+                return registro
+        serie = self._series.get((clave, None))
+        return serie.vigente(fecha) if serie else None
+
+
+@dataclass
+class HistorialPrecios:
+    por_codigo: IndiceVigencias = field(default_factory=IndiceVigencias)
+    por_nombre: IndiceVigencias = field(default_factory=IndiceVigencias)
+
+
+@dataclass
+class ContextoPrecios:
+    """Ítems y precios activos resueltos para un conjunto de detalles."""
+
+    items_por_id: dict[int, models.Item] = field(default_factory=dict)
+    items_por_codigo: dict[str, models.Item] = field(default_factory=dict)
+    precios_por_codigo: dict[str, models.ListaPrecios] = field(default_factory=dict)
+    precios_por_nombre: dict[str, models.ListaPrecios] = field(default_factory=dict)
+    historial: Optional[HistorialPrecios] = None
+
+    def resolver(
+        self,
+        detalle: models.TallerDetalle,
+        *,
+        sede: Optional[str] = None,
+        fecha: Optional[date] = None,
+    ) -> tuple[Optional[models.Item], Optional[models.ListaPrecios]]:
+        """Ítem y precio de ``detalle``; con ``fecha``, el precio vigente a ese día."""
+
+        codigo_normalizado = normalize_item_lookup(detalle.codigo_producto) or ""
+        nombre = detalle.nombre_subcorte.strip().lower() if detalle.nombre_subcorte else ""
+        item = (
+            self.items_por_id.get(detalle.item_id)
+            if detalle.item_id
+            else self.items_por_codigo.get(codigo_normalizado)
+        )
+        if fecha is not None and self.historial is not None:
+            lista_precio = None
+            if codigo_normalizado:
+                lista_precio = self.historial.por_codigo.vigente(codigo_normalizado, sede, fecha)
+            if not lista_precio and nombre:
+                lista_precio = self.historial.por_nombre.vigente(nombre, sede, fecha)
+            return item, lista_precio
+
+        lista_precio = None
+        if codigo_normalizado:
+            lista_precio = self.precios_por_codigo.get(codigo_normalizado)
+        if not lista_precio and nombre:
+            lista_precio = self.precios_por_nombre.get(nombre)
+        return item, lista_precio
+
+
+def cargar_contexto_precios(
+    db: Session, detalles: Iterable[models.TallerDetalle]
+) -> ContextoPrecios:
+    """Resolver ítems y precios para ``detalles`` con una consulta por tabla."""
+
+    item_ids, codigos, nombres = _claves_detalles(detalles)
+    return cargar_contexto(db, item_ids=item_ids, codigos=codigos, nombres=nombres)
+
+
+def _claves_detalles(
+    detalles: Iterable[models.TallerDetalle],
+) -> tuple[set[int], set[str], set[str]]:
+    item_ids: set[int] = set()
+    codigos: set[str] = set()
+    nombres: set[str] = set()
+    for detalle in detalles:
+        if detalle.item_id:
+            item_ids.add(detalle.item_id)
+        if normalized := normalize_item_lookup(detalle.codigo_producto):
+            codigos.add(normalized)
+        if detalle.nombre_subcorte and detalle.nombre_subcorte.strip():
+            nombres.add(detalle.nombre_subcorte.strip().lower())
+    return item_ids, codigos, nombres
+
+
+def _cargar_items(
+    db: Session, contexto: ContextoPrecios, *, item_ids: set[int], codigos: set[str]
+) -> None:
+    item_filters = []
+    if item_ids:
+        item_filters.append(models.Item.id.in_(item_ids))
+    if codigos:
+        normalized_item_code = normalized_db_code(models.Item.item_code)
+        item_filters.append(normalized_item_code.in_(codigos))
+        item_filters.append(func.ltrim(normalized_item_code, "0").in_(codigos))
+    if item_filters:
+        for item in db.query(models.Item).filter(or_(*item_filters)).all():
+            contexto.items_por_id[item.id] = item
+            key = normalize_item_lookup(item.item_code)
+            if key and key in codigos:
+                contexto.items_por_codigo[key] = item
+
+
+def cargar_contexto(
+    db: Session,
+    *,
+    item_ids: set[int],
+    codigos: set[str],
+    nombres: set[str],
+) -> ContextoPrecios:
+    """Resolver ítems por id/código y precios activos por código/nombre.
+
+    ``codigos`` deben venir normalizados con :func:`normalize_item_lookup` y
+    ``nombres`` en minúsculas sin espacios externos.
+    """
+
+    contexto = ContextoPrecios()
+    _cargar_items(db, contexto, item_ids=item_ids, codigos=codigos)
+
+    precio_filters = []
+    if codigos:
+        normalized_referencia = normalized_db_code(models.ListaPrecios.referencia)
+        precio_filters.append(normalized_referencia.in_(codigos))
+        precio_filters.append(func.ltrim(normalized_referencia, "0").in_(codigos))
+    if nombres:
+        precio_filters.append(func.lower(models.ListaPrecios.descripcion).in_(nombres))
+        precio_filters.append(func.lower(models.ListaPrecios.referencia).in_(nombres))
+    if precio_filters:
+        registros = (
+            db.query(models.ListaPrecios)
+            .filter(models.ListaPrecios.activo.is_(True))
+            .filter(or_(*precio_filters))
+            .order_by(models.ListaPrecios.fecha_vigencia.desc().nullslast())
+            .all()
+        )
+        for registro in registros:
+            codigo_key = normalize_item_lookup(registro.referencia)
+            if codigo_key and codigo_key in codigos:
+                contexto.precios_por_codigo[codigo_key] = prefer_min_precio(
+                    contexto.precios_por_codigo.get(codigo_key), registro
+                )
+            descripcion_key = registro.descripcion.strip().lower() if registro.descripcion else ""
+            referencia_key = registro.referencia.strip().lower() if registro.referencia else ""
+            for key in (descripcion_key, referencia_key):
+                if not key or key not in nombres:
+                    continue
+                contexto.precios_por_nombre[key] = prefer_min_precio(
+                    contexto.precios_por_nombre.get(key), registro
+                )
+
+    return contexto
+
+
+_COLUMNAS_HISTORIAL = (
+    models.ListaPrecios.id,
+    models.ListaPrecios.referencia,
+    models.ListaPrecios.descripcion,
+    models.ListaPrecios.precio,
+    models.ListaPrecios.sede,
+    models.ListaPrecios.fecha_vigencia,
+)
+
+
+def _historial_por_codigo(codigos: Iterable[str]):
+    """Precios (activos o no) de ``codigos``, uno por código, sede y fecha.
+
+    Postgres deja el más barato de cada grupo. El filtro y las tres primeras
+    claves de ``DISTINCT ON`` son las mismas expresiones que
+    ``ix_precios_lista_codigo_vigencia`` (ver ``app.scripts.benchmark_busqueda
+    --historial``). La cuarta, el código sin quitar ceros, separa "007" de
+    "7", que en Python son claves distintas.
+    """
+
+    codigo_indice = lookup_db_code(models.ListaPrecios.referencia)
+    sede_indice = func.lower(models.ListaPrecios.sede)
+    claves = (
+        codigo_indice,
+        sede_indice,
+        models.ListaPrecios.fecha_vigencia,
+        normalized_db_code(models.ListaPrecios.referencia),
+    )
+    return (
+        select(*_COLUMNAS_HISTORIAL)
+        .where(codigo_indice.in_({codigo.lstrip("0") for codigo in codigos}))
+        .distinct(*claves)
+        .order_by(
+            *claves,
+            models.ListaPrecios.precio.asc().nullslast(),
+            models.ListaPrecios.id,
+        )
+    )
+
+
+def cargar_contexto_historico(
+    db: Session, detalles: Iterable[models.TallerDetalle]
+) -> ContextoPrecios:
+    """Como :func:`cargar_contexto_precios`, pero con el historial completo de
+    precios (activos o no) para resolver con ``ContextoPrecios.resolver(fecha=...)``.
+
+    La búsqueda por código usa ``ix_precios_lista_codigo_vigencia``; la de
+    nombre solo se hace para los subcortes cuyo código no tiene precios.
+    """
+
+    detalles = list(detalles)
+    item_ids, codigos, _ = _claves_detalles(detalles)
+    historial = HistorialPrecios()
+    contexto = ContextoPrecios(historial=historial)
+    _cargar_items(db, contexto, item_ids=item_ids, codigos=codigos)
+
+    orden = (
+        models.ListaPrecios.fecha_vigencia.asc().nullsfirst(),
+        models.ListaPrecios.id,
+    )
+    if codigos:
+        por_fecha = _historial_por_codigo(codigos).subquery()
+        registros = db.execute(
+            select(por_fecha).order_by(
+                por_fecha.c.fecha_vigencia.asc().nullsfirst(), por_fecha.c.id
+            ),
+            execution_options={"yield_per": 5000},
+        )
+        for registro in registros:
+            clave = normalize_item_lookup(registro.referencia)
+            if clave in codigos:
+                historial.por_codigo.agregar(clave, registro)
+
+    nombres = {
+        detalle.nombre_subcorte.strip().lower()
+        for detalle in detalles
+        if detalle.nombre_subcorte
+        and detalle.nombre_subcorte.strip()
+        and normalize_item_lookup(detalle.codigo_producto) not in historial.por_codigo.claves
+    }
+    if nombres:
+        registros = (
+            db.query(*_COLUMNAS_HISTORIAL)
+            .filter(
+                or_(
+                    func.lower(models.ListaPrecios.descripcion).in_(nombres),
+                    func.lower(models.ListaPrecios.referencia).in_(nombres),
+                )
+            )
+            .order_by(*orden)
+            .execution_options(yield_per=5000)
+        )
+        for registro in registros:
+            descripcion_key = registro.descripcion.strip().lower() if registro.descripcion else ""
+            referencia_key = registro.referencia.strip().lower() if registro.referencia else ""
+            for key in {descripcion_key, referencia_key}:
+                if key and key in nombres:
+                    historial.por_nombre.agregar(key, registro)
+
+    return contexto
@@ -0,0 +1,153 @@
+"""Agregados mantenidos en la misma transacción que las escrituras de talleres.
+
+Las rutas que crean, actualizan o eliminan talleres llaman a
+:func:`registrar_alta` y :func:`registrar_baja` antes de hacer ``commit`` para
+que los agregados nunca queden desfasados respecto a ``talleres``.
+"""
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from .. import models
+from . import inventario_saldos
+
+# Igual que el cálculo histórico de seguimiento: creado_en es UTC naive y el
+# día local se obtiene restando 5 horas.
+_LOCAL_OFFSET = timedelta(hours=5)
+
+
+def fecha_local(creado_en: Optional[datetime]) -> date:
+    return ((creado_en or datetime.utcnow()) - _LOCAL_OFFSET).date()
+
+
+def _sede(taller: models.Taller) -> str:
+    # Solo la sede guardada en el taller: la del creador puede cambiar entre el
+    # alta y la baja, y entonces cada una ajustaría una fila distinta. Los
+    # talleres sin sede quedan bajo la sede vacía (ver
+    # ``app.scripts.sede_talleres`` para completarla).
+    return (taller.sede or "").strip()
+
+
+def _ajustar_actividad(db: Session, taller: models.Taller, delta: int) -> None:
+    if not taller.creado_por_id:
+        return
+
+    tabla = models.TallerActividadDiaria.__table__
+    stmt = insert(tabla).values(
+        user_id=taller.creado_por_id,
+        sede=_sede(taller),
+        especie=(taller.especie or "").strip().lower(),
+        local_date=fecha_local(taller.creado_en),
+        cantidad=delta,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[tabla.c.user_id, tabla.c.sede, tabla.c.especie, tabla.c.local_date],
+        set_={"cantidad": tabla.c.cantidad + stmt.excluded.cantidad},
+    )
+    db.execute(stmt)
+
+
+def _ajustar_series(db: Session, taller: models.Taller, delta: int) -> None:
+    creado_local = (taller.creado_en or datetime.utcnow()) - _LOCAL_OFFSET
+    peso_inicial = Decimal(taller.peso_inicial or 0)
+    procesado = Decimal(taller.peso_final or 0) + sum(
+        (Decimal(detalle.peso or 0) for detalle in taller.detalles), Decimal("0")
+    )
+    perdida = peso_inicial - procesado
+    sede = _sede(taller)
+    especie = (taller.especie or "").strip().lower()
+
+    tabla = models.DashboardSerieBucket.__table__
+    buckets = (
+        ("hour", creado_local.replace(minute=0, second=0, microsecond=0)),
+        ("day", datetime.combine(creado_local.date(), datetime.min.time())),
+    )
+    stmt = insert(tabla).values(
+        [
+            {
+                "granularidad": granularidad,
+                "bucket_start": bucket_start,
+                "sede": sede,
+                "especie": especie,
+                "talleres": delta,
+                "peso_inicial": peso_inicial * delta,
+                "perdida": perdida * delta,
+            }
+            for granularidad, bucket_start in buckets
+        ]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[tabla.c.granularidad, tabla.c.bucket_start, tabla.c.sede, tabla.c.especie],
+        set_={
+            "talleres": tabla.c.talleres + stmt.excluded.talleres,
+            "peso_inicial": tabla.c.peso_inicial + stmt.excluded.peso_inicial,
+            "perdida": tabla.c.perdida + stmt.excluded.perdida,
+        },
+    )
+    db.execute(stmt)
+
+
+def _ajustar_inventario(db: Session, taller: models.Taller, delta: int) -> None:
+    if not taller.detalles:
+        return
+
+    item_ids = {detalle.item_id for detalle in taller.detalles if detalle.item_id}
+    items = (
+        {
+            item.id: item
+            for item in db.query(models.Item).filter(models.Item.id.in_(item_ids))
+        }
+        if item_ids
+        else {}
+    )
+
+    saldos: dict[str, dict] = {}
+    for detalle in taller.detalles:
+        codigo, descripcion = inventario_saldos.producto_detalle(
+            detalle, items.get(detalle.item_id)
+        )
+        saldo = saldos.setdefault(
+            codigo, {"codigo": codigo, "total_peso": Decimal("0"), "detalles": 0}
+        )
+        saldo["descripcion"] = descripcion
+        saldo["total_peso"] += Decimal(detalle.peso or 0) * delta
+        saldo["detalles"] += delta
+
+    tabla = models.InventarioSaldo.__table__
+    sede = _sede(taller)
+    especie = (taller.especie or "").strip().lower()
+    stmt = insert(tabla).values(
+        [{"sede": sede, "especie": especie, **saldo} for saldo in saldos.values()]
+    )
+    set_ = {
+        "total_peso": tabla.c.total_peso + stmt.excluded.total_peso,
+        "detalles": tabla.c.detalles + stmt.excluded.detalles,
+    }
+    if delta > 0:
+        set_["descripcion"] = stmt.excluded.descripcion
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[tabla.c.sede, tabla.c.especie, tabla.c.codigo],
+        set_=set_,
+    )
+    db.execute(stmt)
+
+
+def registrar_alta(db: Session, taller: models.Taller) -> None:
+    """Sumar ``taller`` a los agregados. Debe llamarse después de ``flush``."""
+
+    _ajustar_actividad(db, taller, 1)
+    _ajustar_series(db, taller, 1)
+    _ajustar_inventario(db, taller, 1)
+
+
+def registrar_baja(db: Session, taller: models.Taller) -> None:
+    """Restar ``taller`` de los agregados con los valores que tiene cargados."""
+
+    _ajustar_actividad(db, taller, -1)
+    _ajustar_series(db, taller, -1)
+    _ajustar_inventario(db, taller, -1)
@@ -0,0 +1,149 @@
+"""Caché de un único valor con TTL, invalidación y refresco en segundo plano."""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Callable, Generic, Optional, TypeVar
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_INVALIDATION_DEBOUNCE_SECONDS = 0.5
+
+
+class SnapshotCache(Generic[T]):
+    """Guarda el último valor calculado por ``loader`` durante ``ttl`` segundos.
+
+    Un hilo de fondo lo recalcula ``refresh_margin`` segundos antes de que
+    expire, y también en cuanto se invalida, para que las lecturas casi
+    siempre encuentren un valor caliente. Si una invalidación llega mientras
+    se calcula un valor, ese resultado se descarta.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        loader: Callable[[], T],
+        *,
+        ttl: float,
+        refresh_margin: float,
+    ) -> None:
+        self.name = name
+        self._loader = loader
+        self._ttl = ttl
+        self._refresh_margin = min(refresh_margin, ttl / 2)
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._value: Optional[T] = None
+        self._expires_at = 0.0
+        self._built_at = 0.0
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.invalidations = 0
+
+    def _current(self) -> Optional[T]:
+        if self._value is not None and time.monotonic() < self._expires_at:
+            return self._value
+        return None
+
+    def get(self) -> T:
+        with self._lock:
+            value = self._current()
+            if value is not None:
+                self.hits += 1
+                return value
+            self.misses += 1
+
+        # Solo un hilo recalcula; los demás esperan y reutilizan su resultado.
+        with self._build_lock:
+            with self._lock:
+                value = self._current()
+            if value is not None:
+                return value
+            return self._rebuild()
+
+    async def aget(self) -> T:
+        """Como :meth:`get` para rutas ``async def``: solo un fallo usa el threadpool."""
+
+        with self._lock:
+            value = self._current()
+            if value is not None:
+                self.hits += 1
+                return value
+        return await run_in_threadpool(self.get)
+
+    def _rebuild(self) -> T:
+        with self._lock:
+            generation = self._generation
+        value = self._loader()
+        now = time.monotonic()
+        with self._lock:
+            if generation == self._generation:
+                self._value = value
+                self._built_at = now
+                self._expires_at = now + self._ttl
+        return value
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._value = None
+            self._expires_at = 0.0
+            self.invalidations += 1
+        self._wakeup.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            age = time.monotonic() - self._built_at if self._value is not None else None
+            return {
+                "name": self.name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "invalidations": self.invalidations,
+                "warm": self._current() is not None,
+                "age_seconds": age,
+            }
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            with self._lock:
+                wait = self._expires_at - self._refresh_margin - time.monotonic()
+            if wait > 0 and self._wakeup.wait(timeout=wait):
+                # Agrupar ráfagas de invalidaciones en un solo recálculo.
+                self._stopped.wait(timeout=_INVALIDATION_DEBOUNCE_SECONDS)
+            if self._stopped.is_set():
+                return
+            self._wakeup.clear()
+            try:
+                with self._build_lock:
+                    self._rebuild()
+                self.refreshes += 1
+            except Exception:  # pragma: no cover - keep refreshing after DB hiccups
+                logger.exception("No se pudo refrescar la caché %s", self.name)
+                self._stopped.wait(timeout=self._refresh_margin or 1.0)
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name=f"snapshot-cache-{self.name}", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
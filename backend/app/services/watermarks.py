@@ -0,0 +1,57 @@
+"""Marcas de agua por tabla para construir ETags baratos.
+
+Cada ``commit`` que toca una tabla incrementa su contador (ver
+:mod:`app.events`). Una respuesta que solo depende de ciertas tablas puede
+identificarse por el valor de sus contadores, sin consultar la base.
+
+Los contadores viven en memoria del proceso, igual que la caché del resumen
+del dashboard: con varios workers cada uno lleva los suyos, y el ``epoch``
+aleatorio evita que un ETag emitido por otro proceso (o antes de un
+reinicio) se confunda con uno propio.
+
+También se guarda cuándo cambió cada tabla por última vez: con réplica de
+lectura, durante ``DB_REPLICA_MAX_LAG_SECONDS`` tras una escritura la réplica
+puede no tenerla todavía (ver :func:`replica_atrasada`).
+"""
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from typing import Iterable, Optional
+
+from .. import events
+from ..config import DB_READ_REPLICA_URL, DB_REPLICA_MAX_LAG_SECONDS
+
+epoch = uuid.uuid4().hex[:12]
+_lock = threading.Lock()
+_watermarks: dict[str, int] = {}
+_changed_at: dict[str, float] = {}
+
+
+@events.subscribe
+def _bump(tables: frozenset[str]) -> None:
+    now = time.monotonic()
+    with _lock:
+        for table in tables:
+            _watermarks[table] = _watermarks.get(table, 0) + 1
+            _changed_at[table] = now
+
+
+def current(tables: Iterable[str]) -> tuple[int, ...]:
+    with _lock:
+        return tuple(_watermarks.get(table, 0) for table in tables)
+
+
+def replica_atrasada(tables: Optional[Iterable[str]] = None) -> bool:
+    """``True`` si hay réplica y alguna de ``tables`` (sin ``tables``, cualquier
+    tabla) cambió hace menos del retraso tolerado, es decir, si lo leído en la
+    réplica puede ser anterior a las marcas de agua actuales."""
+
+    if not DB_READ_REPLICA_URL:
+        return False
+    limite = time.monotonic() - DB_REPLICA_MAX_LAG_SECONDS
+    with _lock:
+        if tables is None:
+            return any(cambio > limite for cambio in _changed_at.values())
+        return any(_changed_at.get(table, float("-inf")) > limite for table in tables)
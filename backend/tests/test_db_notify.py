@@ -0,0 +1,65 @@
+from app import events
+from app.events import ChangeNotice
+from app.services import db_notify
+
+
+def _escuchar():
+    tablas: list[frozenset[str]] = []
+    avisos: list[ChangeNotice] = []
+    events.subscribe(tablas.append)
+    events.subscribe_notices(avisos.extend)
+    return tablas, avisos
+
+
+def test_precios_activados_se_reenvian_como_avisos_por_sede():
+    tablas, avisos = _escuchar()
+
+    db_notify.despachar(
+        [
+            (db_notify.CHANNEL, "precios_lista"),
+            (db_notify.PRECIOS_CHANNEL, '["Floresta", "La 39", null]'),
+        ]
+    )
+
+    assert tablas == [frozenset({"precios_lista"})]
+    assert avisos == [
+        ChangeNotice("precios.activated", None, "Floresta"),
+        ChangeNotice("precios.activated", None, "La 39"),
+        ChangeNotice("precios.activated", None, None),
+    ]
+
+
+def test_cambios_de_tabla_no_generan_avisos():
+    tablas, avisos = _escuchar()
+
+    db_notify.despachar([(db_notify.CHANNEL, "users"), (db_notify.CHANNEL, "refresh_tokens")])
+
+    assert tablas == [frozenset({"users", "refresh_tokens"})]
+    assert avisos == []
+
+
+def test_payload_invalido_avisa_sin_sede():
+    _, avisos = _escuchar()
+
+    db_notify.despachar([(db_notify.PRECIOS_CHANNEL, "no-es-json")])
+
+    assert avisos == [ChangeNotice("precios.activated", None, None)]
+
+
+def test_usuarios_cambiados_se_reenvian_por_id():
+    tablas, _ = _escuchar()
+
+    db_notify.despachar(
+        [(db_notify.CHANNEL, "users"), (db_notify.USUARIOS_CHANNEL, "[3, 7]")]
+    )
+
+    assert tablas == [frozenset({"users", "users.claims:3", "users.claims:7"})]
+    assert db_notify.usuarios_cambiados(tablas[0]) == {3, 7}
+
+
+def test_usuarios_sin_ids_invalida_a_todos():
+    tablas, _ = _escuchar()
+
+    db_notify.despachar([(db_notify.USUARIOS_CHANNEL, "null")])
+
+    assert db_notify.usuarios_cambiados(tablas[0]) is None
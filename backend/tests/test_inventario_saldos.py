@@ -0,0 +1,47 @@
+from decimal import Decimal
+
+from sqlalchemy import select
+
+from app import models
+from app.services import inventario_saldos, rollups
+
+
+def test_producto_detalle_trata_vacios_como_ausentes():
+    item = models.Item(item_code="100", nombre="Lomo")
+    detalle = models.TallerDetalle(codigo_producto="", nombre_subcorte="")
+
+    assert inventario_saldos.producto_detalle(detalle, item) == ("100", "Lomo")
+    assert inventario_saldos.producto_detalle(detalle, None) == ("", "")
+
+
+def test_alta_y_baja_con_codigo_vacio_no_desfasan_el_libro(db):
+    inventario_saldos.reconstruir(db)
+    item = models.Item(item_code="T-035", nombre="Lomo de prueba")
+    db.add(item)
+    db.flush()
+    taller = models.Taller(
+        nombre_taller="Prueba libro",
+        sede="Floresta",
+        especie="res",
+        peso_inicial=Decimal("10"),
+        peso_final=Decimal("1"),
+    )
+    taller.detalles.append(
+        models.TallerDetalle(
+            item_id=item.id, codigo_producto="", nombre_subcorte="", peso=Decimal("2.5")
+        )
+    )
+    db.add(taller)
+    db.flush()
+
+    rollups.registrar_alta(db, taller)
+    assert inventario_saldos.detectar_desfase(db) == []
+    saldo = db.scalars(
+        select(models.InventarioSaldo).filter_by(sede="Floresta", especie="res", codigo="T-035")
+    ).one()
+    assert (saldo.descripcion, saldo.detalles) == ("Lomo de prueba", 1)
+
+    rollups.registrar_baja(db, taller)
+    db.delete(taller)
+    db.flush()
+    assert inventario_saldos.detectar_desfase(db) == []
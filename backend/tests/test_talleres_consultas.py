@@ -0,0 +1,76 @@
+from contextlib import contextmanager
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event
+
+from app import models
+from app.constants import local_day_range_to_utc_naive
+from app.routers.talleres import obtener_detalle_actividad
+
+FECHA = date(2024, 3, 15)
+
+
+@contextmanager
+def _contar_consultas(db):
+    sentencias: list[str] = []
+
+    def _registrar(conn, cursor, statement, parameters, context, executemany):
+        sentencias.append(statement)
+
+    conexion = db.connection()
+    event.listen(conexion, "before_cursor_execute", _registrar)
+    try:
+        yield sentencias
+    finally:
+        event.remove(conexion, "before_cursor_execute", _registrar)
+
+
+def _crear_talleres(db, cantidad: int) -> models.User:
+    usuario = models.User(username=f"detalle-{cantidad}", hashed_password="x", sede="Floresta")
+    items = [models.Item(item_code=f"D-{cantidad}-{i}", nombre="Pierna") for i in range(cantidad)]
+    db.add_all([usuario, *items])
+    db.flush()
+
+    inicio, _ = local_day_range_to_utc_naive(FECHA)
+    for indice, item in enumerate(items):
+        taller = models.Taller(
+            nombre_taller=f"Taller {indice}",
+            sede="Floresta",
+            especie="res",
+            creado_por_id=usuario.id,
+            creado_en=inicio + timedelta(hours=8, minutes=indice),
+            item_principal_id=item.id,
+            codigo_principal=item.item_code,
+            peso_inicial=Decimal("10"),
+            peso_final=Decimal("1"),
+        )
+        for subcorte in ("a", "b"):
+            taller.detalles.append(
+                models.TallerDetalle(
+                    item_id=item.id,
+                    codigo_producto=item.item_code,
+                    nombre_subcorte=subcorte,
+                    peso=Decimal("2"),
+                )
+            )
+        db.add(taller)
+    db.flush()
+    db.expunge_all()
+    return usuario
+
+
+@pytest.mark.parametrize("cantidad", [1, 12])
+def test_detalle_de_actividad_usa_tres_consultas(db, cantidad):
+    usuario = _crear_talleres(db, cantidad)
+
+    with _contar_consultas(db) as sentencias:
+        talleres = obtener_detalle_actividad(
+            userId=usuario.id, fecha=FECHA, db=db, current_user=usuario
+        )
+
+    assert len(talleres) == cantidad
+    assert all(len(taller.subcortes) == 2 for taller in talleres)
+    # Talleres, detalles e item principal, sin importar cuántos talleres haya.
+    assert len(sentencias) == 3, sentencias
@@ -21,6 +21,8 @@ import {
 } from "../types";
 import { safeStorage } from "../utils/storage";
 const TOKEN_STORAGE_KEY = "talleres.authToken";
+const REFRESH_TOKEN_STORAGE_KEY = "talleres.refreshToken";
+const TOKEN_EXPIRES_AT_STORAGE_KEY = "talleres.authTokenExpiresAt";
 
 const normalizeBaseUrl = (rawUrl: string): string => rawUrl.replace(/\/+$/, "");
 
@@ -136,12 +138,35 @@ export const setAuthToken = (token: string | null) => {
   }
 };
 
+const storeSession = (data: AuthToken) => {
+  setAuthToken(data.access_token);
+  if (data.refresh_token) {
+    safeStorage.setItem(REFRESH_TOKEN_STORAGE_KEY, data.refresh_token);
+  }
+  if (data.expires_in) {
+    safeStorage.setItem(
+      TOKEN_EXPIRES_AT_STORAGE_KEY,
+      String(Date.now() + data.expires_in * 1000)
+    );
+  } else {
+    safeStorage.removeItem(TOKEN_EXPIRES_AT_STORAGE_KEY);
+  }
+};
+
 export const logout = () => {
   setAuthToken(null);
+  safeStorage.removeItem(REFRESH_TOKEN_STORAGE_KEY);
+  safeStorage.removeItem(TOKEN_EXPIRES_AT_STORAGE_KEY);
 };
 
 export const getAuthToken = (): string | null => inMemoryToken;
 
+/** Milisegundos hasta que vence el access token; null si no se conoce. */
+export const getAuthTokenTimeLeft = (): number | null => {
+  const expiresAt = Number(safeStorage.getItem(TOKEN_EXPIRES_AT_STORAGE_KEY));
+  return expiresAt ? expiresAt - Date.now() : null;
+};
+
 api.interceptors.request.use((config: InternalAxiosRequestConfig) => {
   if (typeof config.url === "string" && config.url.startsWith("/")) {
     config.url = config.url.replace(/^\/+/, "");
@@ -343,18 +368,37 @@ export const login = async (username: string, password: string): Promise<AuthTok
     headers: { "Content-Type": "application/x-www-form-urlencoded" },
   });
 
-  setAuthToken(data.access_token);
+  storeSession(data);
   return data;
 };
 
 export const refreshToken = async (): Promise<AuthToken> => {
-  const { data } = await api.post<AuthToken>("/auth/refresh", undefined, {
-    _skipAuthRefresh: true,
-  } as RetriableRequestConfig);
-  setAuthToken(data.access_token);
+  // Con refresh token no hace falta que el access token siga vigente.
+  const refresh = safeStorage.getItem(REFRESH_TOKEN_STORAGE_KEY);
+  const { data } = await api.post<AuthToken>(
+    "/auth/refresh",
+    refresh ? { refresh_token: refresh } : undefined,
+    { _skipAuthRefresh: true } as RetriableRequestConfig
+  );
+  storeSession(data);
   return data;
 };
 
+/** Revoca el refresh token en el servidor; los errores se ignoran. */
+export const revokeSession = async (): Promise<void> => {
+  const refresh = safeStorage.getItem(REFRESH_TOKEN_STORAGE_KEY);
+  if (!refresh) {
+    return;
+  }
+  try {
+    await api.post("/auth/logout", { refresh_token: refresh }, {
+      _skipAuthRefresh: true,
+    } as RetriableRequestConfig);
+  } catch (error) {
+    console.error("No se pudo cerrar la sesión en el servidor", error);
+  }
+};
+
 export interface RegisterUserPayload {
   username: string;
   email?: string;
@@ -384,7 +428,7 @@ api.interceptors.response.use(
       !originalRequest._retry
     ) {
       const token = getAuthToken();
-      if (!token) {
+      if (!token && !safeStorage.getItem(REFRESH_TOKEN_STORAGE_KEY)) {
         logout();
         return Promise.reject(error);
       }
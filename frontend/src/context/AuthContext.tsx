@@ -10,9 +10,11 @@ import {
 } from "react";
 import {
   getAuthToken,
+  getAuthTokenTimeLeft,
   getCurrentUser,
   logout as clearAuthToken,
   refreshToken,
+  revokeSession,
 } from "../api/talleresApi";
 import type { UserProfile } from "../types";
 
@@ -28,7 +30,10 @@ const AuthContext = createContext<AuthContextValue | undefined>(undefined);
 interface AuthProviderProps {
   children: ReactNode;
 }
-const SESSION_REFRESH_INTERVAL_MS = 4 * 60 * 1000;
+// Cada minuto se revisa, sin red, si el access token está por vencer; solo
+// entonces se pide uno nuevo.
+const SESSION_CHECK_INTERVAL_MS = 60 * 1000;
+const SESSION_REFRESH_MARGIN_MS = 5 * 60 * 1000;
 
 export const AuthProvider = ({ children }: AuthProviderProps) => {
   const [user, setUser] = useState<UserProfile | null>(null);
@@ -60,6 +65,8 @@ export const AuthProvider = ({ children }: AuthProviderProps) => {
   }, [refresh]);
 
   const logout = useCallback(() => {
+    // revokeSession lee el refresh token antes de su primer await.
+    void revokeSession();
     clearAuthToken();
     setUser(null);
     setLoading(false);
@@ -76,6 +83,11 @@ export const AuthProvider = ({ children }: AuthProviderProps) => {
         return;
       }
 
+      const timeLeft = getAuthTokenTimeLeft();
+      if (timeLeft !== null && timeLeft > SESSION_REFRESH_MARGIN_MS) {
+        return;
+      }
+
       try {
         await refreshToken();
       } catch (error) {
@@ -92,7 +104,7 @@ export const AuthProvider = ({ children }: AuthProviderProps) => {
 
     const intervalId = window.setInterval(
       refreshSession,
-      SESSION_REFRESH_INTERVAL_MS
+      SESSION_CHECK_INTERVAL_MS
     );
 
     document.addEventListener("visibilitychange", handleVisibilityChange);
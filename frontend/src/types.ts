@@ -29,6 +29,8 @@ export interface ItemsPage {
 export interface AuthToken {
   access_token: string;
   token_type: string;
+  refresh_token?: string | null;
+  expires_in?: number | null;
 }
 
 export interface UserProfile {